@@ -1,14 +1,174 @@
+import csv
 import json
 import logging
-from typing import List
+import re
+from datetime import date, datetime
+from pathlib import Path
+from typing import Any, Dict, Iterator, Optional, Tuple
 
 import click
 import pandas as pd
 from rxn.utilities.logging import setup_console_logger
 
+from rxn_standardization.tables import CSV, table_format, write_table
+
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
+_NUMBER_CHARS = set("0123456789.eE+-")
+
+
+def iterate_json_array(
+    input_file: str, buffer_size: int = 1 << 16
+) -> Iterator[Dict[str, Any]]:
+    """
+    Iterate over the elements of a JSON array stored in a file, without
+    loading the whole file into memory.
+
+    Args:
+        input_file: path to a JSON file containing a top-level array.
+        buffer_size: number of characters read from the file at once.
+
+    Raises:
+        ValueError: if the file does not contain a JSON array.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+    started = False
+
+    with open(input_file, "r") as f:
+
+        def fill() -> None:
+            nonlocal buffer, position, eof
+            chunk = f.read(buffer_size)
+            buffer = buffer[position:] + chunk
+            position = 0
+            eof = chunk == ""
+
+        def next_char() -> Optional[str]:
+            """Skip the whitespace and return the next character (None at EOF)."""
+            nonlocal position
+            while True:
+                while position < len(buffer) and buffer[position].isspace():
+                    position += 1
+                if position < len(buffer):
+                    return buffer[position]
+                if eof:
+                    return None
+                fill()
+
+        if next_char() != "[":
+            raise ValueError(f'"{input_file}" does not contain a JSON array.')
+        position += 1
+
+        while True:
+            char = next_char()
+            if char == "]":
+                return
+            if started:
+                if char != ",":
+                    raise ValueError(f'Malformed JSON array in "{input_file}".')
+                position += 1
+                next_char()
+
+            # Decode the next value; if the buffer ends in the middle of it,
+            # read more and try again. A value is only accepted once the
+            # character after it is in the buffer and ends it: a number at the
+            # end of the buffer may be truncated, and "2." of "2.5" even
+            # decodes as 2 before the end of the buffer.
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buffer, position)
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                else:
+                    following = end
+                    while following < len(buffer) and buffer[following].isspace():
+                        following += 1
+                    if eof or (following < len(buffer) and buffer[following] in ",]"):
+                        break
+                    # Anything else after the value is an error, unless it may
+                    # be the rest of a number cut at the end of the buffer
+                    if following < len(buffer) and not (
+                        following == end and buffer[end] in _NUMBER_CHARS
+                    ):
+                        raise ValueError(f'Malformed JSON array in "{input_file}".')
+                fill()
+
+            position = end
+            started = True
+            yield value
+
+
+def _release_date(path: str) -> Optional[date]:
+    """Get the release date in a file name, as YYMMDD or YYYYMMDD."""
+    for digits in re.findall(r"(?<!\d)(\d{8}|\d{6})(?!\d)", Path(path).name):
+        try:
+            return datetime.strptime(
+                digits, "%Y%m%d" if len(digits) == 8 else "%y%m%d"
+            ).date()
+        except ValueError:
+            continue
+    return None
+
+
+def sort_by_release(input_files: Tuple[str, ...]) -> Tuple[str, ...]:
+    """
+    Sort annotation files by the release date in their names, f.i.
+    "catalyst-annotation-210428.json" or "catalyst-annotation-20210826.json".
+    If some names contain no date, the files are kept in the given order.
+    """
+    dates: Dict[str, date] = {}
+    for path in input_files:
+        release = _release_date(path)
+        if release is None:
+            logger.warning(
+                "No release date in some file names; the files are merged in "
+                "the given order."
+            )
+            return input_files
+        dates[path] = release
+    return tuple(sorted(input_files, key=dates.__getitem__))
+
+
+def merge_annotations(
+    input_files: Tuple[str, ...],
+) -> Dict[str, Tuple[Optional[str], Optional[str]]]:
+    """
+    Merge the annotations from several files into an index keyed by the
+    original SMILES.
+
+    The files are processed in the given order; if one SMILES is annotated
+    in several files, the decision from the last one is kept.
+
+    Returns:
+        Dictionary mapping the original SMILES to the decision and updated
+        SMILES.
+    """
+    index: Dict[str, Tuple[Optional[str], Optional[str]]] = {}
+    for input_file in input_files:
+        logger.info(f'Reading file "{input_file}"')
+        n_entries = 0
+        n_overridden = 0
+        for compound_dict in iterate_json_array(input_file):
+            n_entries += 1
+            src_smiles = compound_dict["original_smiles"]
+            if src_smiles in index:
+                n_overridden += 1
+            # using get() to avoid KeyError if key is not in dictionary
+            index[src_smiles] = (
+                compound_dict.get("decision"),
+                compound_dict.get("updated_smiles"),
+            )
+        logger.info(
+            f"Read {n_entries} annotations, {n_overridden} of which override "
+            "an annotation from a previous file."
+        )
+    return index
+
 
 @click.command()
 @click.option(
@@ -16,44 +176,50 @@ logger.addHandler(logging.NullHandler())
     "-i",
     type=str,
     required=True,
-    help="Path to the JSON data file with standardized compounds.",
+    multiple=True,
+    help="Path to the JSON data file with standardized compounds. Can be given "
+    "several times: the files are sorted by the release date in their names "
+    "(f.i. catalyst-annotation-210428.json), or kept in the given order if "
+    "some names have no date; for a compound annotated in several files, the "
+    "decision from the latest release wins.",
 )
 @click.option(
     "--output_file",
     "-o",
     type=str,
     required=True,
-    help="Path to output CSV file containing 2 columns: src, tgt.",
+    help="Path to output file containing 2 columns: src, tgt. CSV, or Parquet / Arrow IPC depending on the extension.",
 )
 def main(
-    input_file: str,
+    input_file: Tuple[str, ...],
     output_file: str,
 ) -> None:
     """
-    Extract SMILES strings from JSON file to CSV file with two columns (src, tgt).
+    Extract SMILES strings from JSON files to CSV file with two columns (src, tgt).
     """
     setup_console_logger()
 
-    src_list: List[str] = []
-    tgt_list: List[str] = []
-
-    logger.info(f'Reading file "{input_file}"')
-    with open(input_file, "r") as f:
-        data = json.load(f)
-
-    # using get() to avoid KeyError if key is not in dictionary
-    for compound_dict in data:
-        if compound_dict.get("decision") == "accept":
-            src_smiles = compound_dict["original_smiles"]
-            tgt_smiles = compound_dict["updated_smiles"]
-            if tgt_smiles is None:
-                tgt_smiles = src_smiles
-            src_list.append(src_smiles)
-            tgt_list.append(tgt_smiles)
+    index = merge_annotations(sort_by_release(input_file))
+    accepted = (
+        (src_smiles, src_smiles if tgt_smiles is None else tgt_smiles)
+        for src_smiles, (decision, tgt_smiles) in index.items()
+        if decision == "accept"
+    )
 
-    df = pd.DataFrame({"src": src_list, "tgt": tgt_list})
+    if table_format(output_file) == CSV:
+        n_accepted = 0
+        with open(output_file, "w", newline="") as f:
+            writer = csv.writer(f, lineterminator="\n")
+            writer.writerow(["src", "tgt"])
+            for row in accepted:
+                writer.writerow(row)
+                n_accepted += 1
+    else:
+        df = pd.DataFrame(list(accepted), columns=["src", "tgt"])
+        write_table(df, output_file)
+        n_accepted = len(df)
 
-    df.to_csv(output_file, index=False, header=["src", "tgt"])
+    logger.info(f'Saved {n_accepted} accepted compounds to "{output_file}"')
 
 
 if __name__ == "__main__":
@@ -1,11 +1,41 @@
 import logging
+from pathlib import Path
+from typing import Optional
 
 import click
 import pandas as pd
 from rxn.utilities.logging import setup_console_logger
 from tqdm import tqdm
 
-from rxn_standardization.utils import remove_stereochemistry
+from rxn_standardization.guard import MoleculeGuard
+from rxn_standardization.partition import (
+    PARTITION,
+    Partition,
+    open_partition,
+    partition_path,
+)
+from rxn_standardization.rejects import RejectsRecorder
+from rxn_standardization.substance_index import (
+    build_substance_index,
+    diff_substance_indices,
+    load_index_options,
+    load_substance_index,
+    merge_delta,
+    save_substance_index,
+    unique_src,
+)
+from rxn_standardization.tables import (
+    CSV,
+    iterate_table,
+    read_table,
+    table_format,
+    write_table,
+)
+from rxn_standardization.utils import (
+    process_pool,
+    remove_stereochemistry_many,
+    validate_stereochemistry_removal,
+)
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
@@ -28,19 +58,99 @@ logger.addHandler(logging.NullHandler())
     "--sid_smiles_file",
     "-ss",
     type=str,
-    help="Path to SID-SMILES ASCII file. First column is SID, second column is SMILES (non-standardized).",
+    help="Path to SID-SMILES ASCII file. First column is SID, second column is SMILES (non-standardized). Parquet / Arrow IPC files (f.i. from smiles_from_sdf.py) are also accepted.",
 )
 @click.option(
     "--output_file",
     "-o",
     type=str,
-    help="Path to output CSV file containing 2 columns: src, tgt.",
+    help="Path to output file containing 2 columns: src, tgt. CSV, or Parquet / Arrow IPC depending on the extension.",
+)
+@click.option(
+    "--rejects_file",
+    type=str,
+    default=None,
+    help="CSV file (gzip-compressed if ending with .gz) where to save the SMILES whose stereochemistry cannot be removed.",
+)
+@click.option(
+    "--fast_stereo_removal/--rdkit_stereo_removal",
+    default=False,
+    help="Whether to remove the stereo markers from the src SMILES strings directly where possible, keeping them as written instead of converting them to canonical RDKit SMILES; invalid src SMILES without stereo markers are then not detected. The tgt SMILES are always canonicalized.",
+)
+@click.option(
+    "--validate_stereo_removal",
+    type=int,
+    default=0,
+    help="Number of SMILES strings per column on which to check that the fast stereo removal gives the same molecules as RDKit; 0 to skip the check.",
+)
+@click.option(
+    "--max_atoms",
+    type=int,
+    default=None,
+    help="Molecules with more atoms are processed in a separate worker process, with a timeout (see --item_timeout).",
+)
+@click.option(
+    "--max_length",
+    type=int,
+    default=None,
+    help="Molecules with longer SMILES strings are processed in a separate worker process, with a timeout (see --item_timeout).",
+)
+@click.option(
+    "--item_timeout",
+    type=float,
+    default=30.0,
+    show_default=True,
+    help="Time, in seconds, after which the processing of a molecule above --max_atoms or --max_length is aborted; it is then left as is and recorded as rejected.",
+)
+@click.option(
+    "--guard_workers",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Number of worker processes for the molecules above --max_atoms or --max_length; they are processed while the other molecules are.",
+)
+@click.option(
+    "--index_file",
+    type=str,
+    default=None,
+    help="Index of the substances (SID, CID and hashes of the SMILES) of the previous build, for incremental processing; created if it does not exist, and updated. The output then has a sid column.",
+)
+@click.option(
+    "--previous_output",
+    type=str,
+    default=None,
+    help="Output of the previous build with --index_file, into which the added and changed substances are merged.",
+)
+@click.option(
+    "--partition",
+    type=PARTITION,
+    default=None,
+    help='Process only the K-th of N parts of the SID-SMILES file (K from 0 to N-1), and write partial outputs to merge with "rxn-std-partition merge". Duplicate src SMILES are then only removed within each part.',
+)
+@click.option(
+    "--n_jobs",
+    "-j",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Number of worker processes for the stereochemistry removal.",
 )
 def main(
     sid_map_file: str,
     cid_smiles_file: str,
     sid_smiles_file: str,
     output_file: str,
+    rejects_file: Optional[str],
+    fast_stereo_removal: bool,
+    validate_stereo_removal: int,
+    max_atoms: Optional[int],
+    max_length: Optional[int],
+    item_timeout: float,
+    guard_workers: int,
+    index_file: Optional[str],
+    previous_output: Optional[str],
+    partition: Optional[Partition],
+    n_jobs: int,
 ):
     """
     Extract src, tgt SMILES from PubChem files. 3 relevant ASCII files are downloaded from https://ftp.ncbi.nlm.nih.gov/pubchem/Substance/ (src)
@@ -48,9 +158,38 @@ def main(
     SID-Map: maps substance ids to compound ids
     CID-SMILES: maps compound ids to their SMILES
     SID-SMILES: maps substance ids to their SMILES
+
+    With --index_file, only the substances added or changed since the previous
+    build are processed, and merged into its output (--previous_output).
     """
     setup_console_logger()
 
+    # Options changing the results: the previous build cannot be reused if
+    # they differ
+    options = {"fast_stereo_removal": fast_stereo_removal}
+    incremental = index_file is not None and Path(index_file).exists()
+    if incremental:
+        assert index_file is not None
+        previous_options = load_index_options(index_file)
+        if previous_options != options:
+            logger.warning(
+                f"The processing options changed since the previous build "
+                f"({previous_options} instead of {options}); all the "
+                "substances are processed again."
+            )
+            incremental = False
+    if incremental and previous_output is None:
+        raise click.UsageError(
+            "--previous_output is required when the index file exists."
+        )
+    if index_file is not None and partition is not None:
+        raise click.UsageError("--index_file cannot be combined with --partition.")
+
+    if partition is not None:
+        output_file = str(partition_path(output_file, partition))
+        if rejects_file is not None:
+            rejects_file = str(partition_path(rejects_file, partition))
+
     sid_map = pd.concat(
         [
             chunk
@@ -86,46 +225,137 @@ def main(
             )
         ]
     )
-    sid_smiles = pd.concat(
-        [
-            chunk
-            for chunk in tqdm(
-                pd.read_csv(
-                    sid_smiles_file,
-                    header=None,
-                    names=["sid", "smiles"],
-                    dtype={"sid": int, "smiles": str},
-                    chunksize=1000,
-                ),
-                desc="Loading SID-SMILES",
+    if table_format(sid_smiles_file) == CSV:
+        with (
+            open(sid_smiles_file)
+            if partition is None
+            else open_partition(sid_smiles_file, partition)
+        ) as f:
+            sid_smiles = pd.concat(
+                [
+                    chunk
+                    for chunk in tqdm(
+                        pd.read_csv(
+                            f,
+                            header=None,
+                            names=["sid", "smiles"],
+                            dtype={"sid": int, "smiles": str},
+                            chunksize=1000,
+                        ),
+                        desc="Loading SID-SMILES",
+                    )
+                ]
             )
-        ]
-    )
+    else:
+        sid_smiles = pd.concat(
+            list(iterate_table(sid_smiles_file, partition=partition)),
+            ignore_index=True,
+        )
+        sid_smiles.columns = ["sid", "smiles"]
 
     sid_map_dict = dict(zip(sid_map.sid, sid_map.cid))
     cid_smiles_dict = dict(zip(cid_smiles.cid, cid_smiles.smiles))
     sid_smiles_dict = dict(zip(sid_smiles.sid, sid_smiles.smiles))
 
-    substance_compound_dict = {
-        sid_smiles_dict[key]: cid_smiles_dict[sid_map_dict[key]]
-        for key in sid_smiles_dict.keys()
-        if key in sid_map_dict.keys()
-    }
-    substance_compound_df = pd.DataFrame(
-        {"src": substance_compound_dict.keys(), "tgt": substance_compound_dict.values()}
-    )
-    substance_compound_df.dropna(inplace=True)
+    if index_file is None:
+        substance_compound_dict = {
+            sid_smiles_dict[key]: cid_smiles_dict[sid_map_dict[key]]
+            for key in sid_smiles_dict.keys()
+            if key in sid_map_dict.keys()
+        }
+        substance_compound_df = pd.DataFrame(
+            {
+                "src": substance_compound_dict.keys(),
+                "tgt": substance_compound_dict.values(),
+            }
+        )
+        substance_compound_df.dropna(inplace=True)
+    else:
+        sids = [key for key in sid_smiles_dict.keys() if key in sid_map_dict.keys()]
+        cids = [sid_map_dict[key] for key in sids]
+        substances = pd.DataFrame(
+            {
+                "sid": sids,
+                "cid": cids,
+                "src": [sid_smiles_dict[key] for key in sids],
+                "tgt": [cid_smiles_dict.get(cid) for cid in cids],
+            }
+        ).dropna()
+        index = build_substance_index(
+            substances["sid"], substances["cid"], substances["src"], substances["tgt"]
+        )
+        # Duplicate src SMILES: one substance is kept, as without index
+        to_process = unique_src(index).sid
+        if incremental:
+            assert index_file is not None
+            diff = diff_substance_indices(
+                unique_src(load_substance_index(index_file)), unique_src(index)
+            )
+            logger.info(
+                f"Compared to the previous build: {len(diff.added)} substances "
+                f"added, {len(diff.changed)} changed, {len(diff.removed)} removed, "
+                f"{len(diff.unchanged)} unchanged."
+            )
+            to_process = diff.to_process
+        # Copied, as the columns are replaced below
+        substance_compound_df = substances.loc[
+            substances["sid"].isin(to_process), ["sid", "src", "tgt"]
+        ].copy()
+
+    if validate_stereo_removal > 0:
+        for column in ["src", "tgt"]:
+            report = validate_stereochemistry_removal(
+                substance_compound_df[column].tolist(),
+                sample_size=validate_stereo_removal,
+            )
+            tiers = ", ".join(f"{t.value}: {n}" for t, n in report.tier_counts.items())
+            logger.info(
+                f"Fast stereo removal checked on {report.n_checked} {column} "
+                f"SMILES ({tiers}); {len(report.mismatches)} mismatches."
+            )
+            for smi, expected, actual in report.mismatches:
+                logger.warning(
+                    f'Fast stereo removal mismatch for "{smi}": '
+                    f'"{actual}" instead of "{expected}".'
+                )
 
     # Remove stereochemistry
     logger.info("Removing stereochemistry...")
-    substance_compound_df["src"] = substance_compound_df["src"].apply(
-        remove_stereochemistry
-    )
-    substance_compound_df["tgt"] = substance_compound_df["tgt"].apply(
-        remove_stereochemistry
-    )
+    with RejectsRecorder(rejects_file) as rejects, MoleculeGuard(
+        max_atoms=max_atoms,
+        max_length=max_length,
+        timeout=item_timeout,
+        n_workers=guard_workers,
+    ) as guard, process_pool(n_jobs) as pool:
+        for column in ["src", "tgt"]:
+            result = remove_stereochemistry_many(
+                substance_compound_df[column],
+                pool=pool,
+                fast=fast_stereo_removal,
+                canonical=column == "tgt",
+                guard=guard,
+            )
+            # In incremental mode, the rejects are identified by their SID
+            rejects.record_batch(
+                result,
+                column=column,
+                rows=(
+                    substance_compound_df.index
+                    if index_file is None
+                    else substance_compound_df["sid"].tolist()
+                ),
+            )
+            substance_compound_df[column] = result.results
 
-    substance_compound_df.to_csv(output_file, index=False)
+    if incremental:
+        assert previous_output is not None
+        substance_compound_df = merge_delta(
+            read_table(previous_output), substance_compound_df, diff
+        )
+    write_table(substance_compound_df, output_file)
+    # Updated last, so that an interrupted build can be run again
+    if index_file is not None:
+        save_substance_index(index, index_file, options=options)
 
 
 if __name__ == "__main__":
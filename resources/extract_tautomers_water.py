@@ -1,87 +1,100 @@
 import logging
-from typing import Any, Optional, Tuple
+import re
+from pathlib import Path
+from typing import List, Optional
 
 import click
 import pandas as pd
 from rdkit import Chem
+from rxn.chemutils.exceptions import InvalidSmiles
 from rxn.utilities.logging import setup_console_logger
 
+from rxn_standardization.tables import CSV, TABLE_FORMATS, table_suffix, write_table
+from rxn_standardization.utils import apply_many, process_pool
+
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
 
 def remove_atom_mapping(smiles: str) -> str:
+    """
+    Raises:
+        InvalidSmiles: if RDKit cannot parse the SMILES.
+    """
     mol = Chem.MolFromSmiles(smiles)
+    if mol is None:
+        raise InvalidSmiles(smiles)
     for a in mol.GetAtoms():
         a.SetAtomMapNum(0)
     return Chem.MolToSmiles(mol)
 
 
-def first_tautomer_is_src(
-    log_K: Any, tautomer_1_percent: str, preferred: str
-) -> Optional[bool]:
+def to_float(column: pd.Series) -> pd.Series:
+    """
+    Convert a Tautobase value column to floats.
+
+    Values may come with a qualifier prefix such as ">4", "<<0" or ">95";
+    the prefix is stripped. Empty or unparseable values become NaN.
+    """
+    return pd.to_numeric(
+        column.astype(str).str.strip().str.lstrip("<>~="), errors="coerce"
+    )
+
+
+def first_tautomer_is_src(df: pd.DataFrame) -> pd.Series:
     """Determine, from values given in Tautobase, which tautomer is the source
     and which is the target.
 
-    Returns:
-        True if the first tautomer should be the source, False if the second
-        tautomer should be the source, None if this cannot be determined.
-    """
-    if log_K != 0:  # if log_K is given
-        try:
-            return float(log_K) < 0
-        except ValueError:
-            try:
-                # if log_K is of format ">4"
-                return float(log_K[1:]) < 0
-            except ValueError:
-                # if log_K is of format "<<0"
-                return float(log_K[2:]) < 0
-    elif tautomer_1_percent != 0:  # if percentage of tautomer 1 is given
-        try:
-            return float(tautomer_1_percent) >= 50
-        except ValueError:
-            return float(tautomer_1_percent[1:]) >= 50
-    elif preferred != 0:  # if the preferred tautomer is specified
-        if preferred == "1":
-            return True
-        elif preferred == "2":
-            return False
-        elif preferred == "Both":
-            return None
-
-    return None
-
-
-def process_tautobase_entry(
-    smirks: str, log_K: Any, tautomer_1_percent: str, preferred: str
-) -> Optional[Tuple[str, str]]:
-    """
-    From a tautobase entry, get the source and target tautomers.
+    The major tautomer is determined by log_K if given, otherwise by the
+    percentage of tautomer 1, otherwise by the denoted preferred tautomer.
+    A log_K of 0 is a given value (the second tautomer is then the source);
+    only empty values fall back to the next column.
 
     Returns:
-        Tuple: source tautomer, target tautomer. None if this cannot be determined.
+        Nullable boolean series: True if the first tautomer should be the
+        source, False if the second tautomer should be the source, NA if this
+        cannot be determined.
     """
-    tautomer_1, tautomer_2 = smirks.split(">>")
+    log_k = to_float(df["log_K"])
+    tautomer_1_percent = to_float(df["percent_tautomer_1"])
+    preferred = df["preferred"].astype(str).str.strip()
 
-    try:
-        tautomer_1 = remove_atom_mapping(tautomer_1)
-        tautomer_2 = remove_atom_mapping(tautomer_2)
-    except AttributeError:
-        logger.warning(
-            f"Error during conversion of RDKit Mol; cannot remove atom mapping from {smirks}. Skipping this entry."
+    # Fill from the lowest to the highest priority, so that the more reliable
+    # values overwrite the less reliable ones.
+    first_is_src = pd.Series(pd.NA, index=df.index, dtype="boolean")
+    first_is_src[preferred == "2"] = False
+    first_is_src[preferred == "1"] = True
+
+    has_percent = df["percent_tautomer_1"].notna()
+    first_is_src[has_percent] = pd.NA
+    first_is_src[has_percent & tautomer_1_percent.notna()] = tautomer_1_percent >= 50
+
+    has_log_k = df["log_K"].notna()
+    first_is_src[has_log_k] = pd.NA
+    first_is_src[has_log_k & log_k.notna()] = log_k < 0
+
+    return first_is_src
+
+
+def remove_atom_mapping_in_parallel(
+    smiles: List[str], n_jobs: int, chunk_size: int
+) -> List[Optional[str]]:
+    """
+    Remove the atom mapping from a batch of SMILES, with a process pool; None
+    for the SMILES that RDKit cannot parse.
+    """
+    with process_pool(n_jobs) as pool:
+        result = apply_many(
+            remove_atom_mapping, smiles, pool=pool, chunk_size=chunk_size
         )
-        return None
+    return [
+        None if failed else smi for smi, failed in zip(result.results, result.failed)
+    ]
 
-    first_is_src = first_tautomer_is_src(
-        log_K=log_K, tautomer_1_percent=tautomer_1_percent, preferred=preferred
-    )
-    if first_is_src is None:
-        return None
-    if first_is_src:
-        return tautomer_1, tautomer_2
-    else:
-        return tautomer_2, tautomer_1
+
+def solvent_to_filename(solvent: str, output_format: str = CSV) -> str:
+    """Name of the output file for the given solvent."""
+    return re.sub(r"[^\w.-]+", "_", solvent.strip()) + table_suffix(output_format)
 
 
 @click.command()
@@ -89,73 +102,123 @@ def process_tautobase_entry(
     "--input_file",
     "-i",
     type=str,
+    required=True,
     help="Path to TXT file containing tautomers SMIRKS and information on their ratios in solution.",
 )
 @click.option(
-    "--output_file",
+    "--output_dir",
     "-o",
     type=str,
-    help="Path to output CSV file containing 2 columns: src, tgt.",
+    default=None,
+    help="Directory where to save one file per solvent, containing 2 columns: src, tgt.",
+)
+@click.option(
+    "--output_file",
+    type=str,
+    default=None,
+    help="Path to output file containing 2 columns: src, tgt, for the entries in water only (as before --output_dir).",
+)
+@click.option(
+    "--output_format",
+    type=click.Choice(TABLE_FORMATS),
+    default=CSV,
+    help="Format of the output files.",
 )
 @click.option(
     "--seed",
     type=int,
     default=42,
-    help="Random seed for shuffling the resulting file",
+    help="Random seed for shuffling the resulting files",
+)
+@click.option(
+    "--n_jobs",
+    "-j",
+    type=int,
+    default=1,
+    help="Number of processes to use for parsing the SMIRKS.",
+)
+@click.option(
+    "--chunk_size",
+    type=int,
+    default=500,
+    help="Number of SMILES sent to a worker process at once.",
 )
 def main(
     input_file: str,
-    output_file: str,
-    seed: float,
+    output_dir: Optional[str],
+    output_file: Optional[str],
+    output_format: str,
+    seed: int,
+    n_jobs: int,
+    chunk_size: int,
 ) -> None:
     """
     Extract SMILES strings from TXT file containing tautomers as SMIRKS and various columns with info on their ratios in solution.
     Not all columns are populated for each compound and major tautomer is either determined by log_K, percentage of tautomer 1,
-    or denoted preferred tautomer. A "solvent" column specifies the solvent for which the major tautomer was determined.
+    or denoted preferred tautomer. A "solvent" column specifies the solvent for which the major tautomer was determined;
+    one file is written per solvent (f.i. "Water.csv").
     """
     setup_console_logger()
 
+    if output_dir is None and output_file is None:
+        raise click.UsageError("Either --output_dir or --output_file is required.")
+
     df = pd.read_csv(
         input_file,
         delimiter="\t",
         header=0,
         usecols=[0, 2, 3, 4, 5],
         names=["smirks", "log_K", "percent_tautomer_1", "preferred", "solvent"],
+        dtype=str,
     )
-    df.fillna(0, inplace=True)  # replace NaN values with None
-    print(df)
-    src_list = []
-    tgt_list = []
-
-    for _, row in df.iterrows():
-        smirks, log_K, tautomer_1_percent, preferred, solvent = (
-            row["smirks"],
-            row["log_K"],
-            row["percent_tautomer_1"],
-            row["preferred"],
-            row["solvent"],
-        )
-
-        if solvent != "Water":
-            continue
+    df["solvent"] = df["solvent"].fillna("Unspecified")
+
+    # Determine the direction first, to avoid parsing entries that are dropped anyway
+    df["first_is_src"] = first_tautomer_is_src(df)
+    df = df[df["first_is_src"].notna()].copy()
+
+    tautomers = df["smirks"].str.split(">>", n=1, expand=True)
+    n_entries = len(df)
+    unmapped = remove_atom_mapping_in_parallel(
+        tautomers[0].tolist() + tautomers[1].tolist(),
+        n_jobs=n_jobs,
+        chunk_size=chunk_size,
+    )
+    df["tautomer_1"] = unmapped[:n_entries]
+    df["tautomer_2"] = unmapped[n_entries:]
 
-        processed = process_tautobase_entry(
-            smirks=smirks,
-            log_K=log_K,
-            tautomer_1_percent=tautomer_1_percent,
-            preferred=preferred,
+    invalid = df["tautomer_1"].isna() | df["tautomer_2"].isna()
+    for smirks in df.loc[invalid, "smirks"]:
+        logger.warning(
+            f"Error during conversion of RDKit Mol; cannot remove atom mapping from {smirks}. Skipping this entry."
         )
-        if processed is None:
-            continue
-
-        src_list.append(processed[0])
-        tgt_list.append(processed[1])
-
-    # Create and save dataframe with src, tgt values
-    new_df = pd.DataFrame({"src": src_list, "tgt": tgt_list})
-    new_df.drop_duplicates(inplace=True)
-    new_df = new_df.sample(frac=1, random_state=seed)
-    new_df.to_csv(output_file, index=False)
+    df = df[~invalid].copy()
+
+    first_is_src = df["first_is_src"].astype(bool)
+    df["src"] = df["tautomer_1"].where(first_is_src, df["tautomer_2"])
+    df["tgt"] = df["tautomer_2"].where(first_is_src, df["tautomer_1"])
+
+    # Create and save dataframes with src, tgt values
+    solvent_dfs = {
+        solvent: solvent_df[["src", "tgt"]]
+        .drop_duplicates()
+        .sample(frac=1, random_state=seed)
+        for solvent, solvent_df in df.groupby("solvent")
+    }
+    if output_file is not None:
+        water_df = solvent_dfs.get("Water", pd.DataFrame(columns=["src", "tgt"]))
+        logger.info(f'Saving {len(water_df)} entries for "Water" to "{output_file}"')
+        write_table(water_df, output_file)
+    if output_dir is not None:
+        Path(output_dir).mkdir(parents=True, exist_ok=True)
+        for solvent, new_df in solvent_dfs.items():
+            solvent_file = Path(output_dir) / solvent_to_filename(
+                solvent, output_format
+            )
+            logger.info(
+                f'Saving {len(new_df)} entries for "{solvent}" to "{solvent_file}"'
+            )
+            write_table(new_df, solvent_file)
 
 
 if __name__ == "__main__":
@@ -5,6 +5,8 @@ import pandas as pd
 from rdkit.Chem import PandasTools
 from rxn.utilities.logging import setup_console_logger
 
+from rxn_standardization.tables import write_table
+
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
@@ -20,7 +22,7 @@ logger.addHandler(logging.NullHandler())
     "--output_file",
     type=str,
     required=True,
-    help="Path to output CSV file.",
+    help="Path to output file (CSV, or Parquet / Arrow IPC depending on the extension).",
 )
 def main(
     input_file: str,
@@ -36,7 +38,7 @@ def main(
     )
 
     new_df = pd.DataFrame({"SID": df.PUBCHEM_SUBSTANCE_ID, "smiles": df.SMILES})
-    new_df.to_csv(output_file, index=False)
+    write_table(new_df, output_file)
 
 
 if __name__ == "__main__":
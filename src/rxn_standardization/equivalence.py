@@ -0,0 +1,168 @@
+"""
+Tiered check of the equivalence of SMILES strings, for scoring predictions.
+
+Two SMILES strings are equivalent if their canonical forms are identical, the
+canonical form of an invalid SMILES string being the string itself (as with
+canonicalize_many). To avoid parsing every string with RDKit, the pairs are
+resolved by the first tier that can decide:
+    1. identical (detokenized) strings are equivalent;
+    2. strings with different heavy-atom compositions, read from the tokens,
+       are not equivalent; strings whose canonical forms are already cached
+       are compared directly;
+    3. the remaining strings are canonicalized with RDKit (and cached).
+"""
+
+import re
+from collections import Counter, OrderedDict
+from enum import Enum
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from rxn.chemutils.conversion import canonicalize_smiles
+from rxn.chemutils.exceptions import InvalidSmiles
+from rxn.chemutils.tokenization import (
+    TokenizationError,
+    detokenize_smiles,
+    tokenize_smiles,
+)
+
+from rxn_standardization.utils import FailureReason
+
+# Element of an atom token; lowercase for aromatic atoms
+_ELEMENT_REGEX = re.compile(r"^\[?\d*([A-Z][a-z]?|[a-z][a-z]?|\*)")
+
+ElementKey = Tuple[Tuple[str, int], ...]
+
+
+class EquivalenceTier(str, Enum):
+    """Tier of the equivalence check that resolved a pair of SMILES strings."""
+
+    EXACT = "exact"
+    ELEMENT_KEY = "element_key"
+    CACHED = "cached"
+    RDKIT = "rdkit"
+
+
+class EquivalenceResult(NamedTuple):
+    """
+    Attributes:
+        equivalent: whether the SMILES strings are equivalent.
+        tier: tier that resolved the pair.
+        reasons: for both SMILES strings, why they could not be canonicalized,
+            if they had to be (None otherwise).
+    """
+
+    equivalent: bool
+    tier: EquivalenceTier
+    reasons: Tuple[Optional[FailureReason], Optional[FailureReason]]
+
+
+def element_key(smiles: str) -> Optional[ElementKey]:
+    """
+    Get the heavy-atom composition of a (detokenized) SMILES string from its
+    tokens, which is the same for all the SMILES strings of a molecule.
+
+    Returns:
+        The sorted (element, count) pairs; None if the SMILES string cannot be
+        tokenized.
+    """
+    try:
+        tokens = tokenize_smiles(smiles).split(" ")
+    except TokenizationError:
+        return None
+
+    counts: Dict[str, int] = Counter()
+    for token in tokens:
+        match = _ELEMENT_REGEX.match(token)
+        if match is None:
+            continue
+        element = match.group(1).capitalize()
+        # Hydrogens may be removed during canonicalization
+        if element != "H":
+            counts[element] += 1
+    return tuple(sorted(counts.items()))
+
+
+class EquivalenceEngine:
+    """
+    Tiered equivalence check of SMILES strings, with a cache of the element
+    keys and canonical forms of the last ``cache_size`` strings.
+
+    The number of pairs resolved by every tier is counted in ``tier_counts``.
+
+    Example:
+        engine = EquivalenceEngine()
+        engine.equivalent("C C O", "OCC")  # True, after parsing with RDKit
+        engine.equivalent("C C O", "C C N")  # False, from the element keys
+    """
+
+    def __init__(self, cache_size: int = 100000):
+        self.cache_size = cache_size
+        self.tier_counts: Dict[EquivalenceTier, int] = Counter()
+        self._element_keys: "OrderedDict[str, Optional[ElementKey]]" = OrderedDict()
+        self._canonical: "OrderedDict[str, Tuple[str, Optional[FailureReason]]]" = (
+            OrderedDict()
+        )
+
+    def _cached_element_key(self, smiles: str) -> Optional[ElementKey]:
+        if smiles in self._element_keys:
+            self._element_keys.move_to_end(smiles)
+            return self._element_keys[smiles]
+        key = element_key(smiles)
+        self._element_keys[smiles] = key
+        if len(self._element_keys) > self.cache_size:
+            self._element_keys.popitem(last=False)
+        return key
+
+    def canonical(self, smiles: str) -> Tuple[str, Optional[FailureReason]]:
+        """
+        Get the canonical form of a detokenized SMILES string (the string
+        itself if it is invalid), with the reason of the failure if any.
+        """
+        if smiles in self._canonical:
+            self._canonical.move_to_end(smiles)
+            return self._canonical[smiles]
+        result: Tuple[str, Optional[FailureReason]]
+        try:
+            result = canonicalize_smiles(smiles), None
+        except InvalidSmiles:
+            result = smiles, FailureReason.INVALID_SMILES
+        self._canonical[smiles] = result
+        if len(self._canonical) > self.cache_size:
+            self._canonical.popitem(last=False)
+        return result
+
+    def compare(self, smiles_a: str, smiles_b: str) -> EquivalenceResult:
+        """Check whether two (possibly tokenized) SMILES strings are equivalent."""
+        a = detokenize_smiles(smiles_a)
+        b = detokenize_smiles(smiles_b)
+
+        if a == b:
+            return self._resolved(True, EquivalenceTier.EXACT)
+
+        key_a = self._cached_element_key(a)
+        key_b = self._cached_element_key(b)
+        if key_a is not None and key_b is not None and key_a != key_b:
+            return self._resolved(False, EquivalenceTier.ELEMENT_KEY)
+
+        tier = EquivalenceTier.CACHED
+        if a not in self._canonical or b not in self._canonical:
+            tier = EquivalenceTier.RDKIT
+        canonical_a, reason_a = self.canonical(a)
+        canonical_b, reason_b = self.canonical(b)
+        return self._resolved(canonical_a == canonical_b, tier, (reason_a, reason_b))
+
+    def equivalent(self, smiles_a: str, smiles_b: str) -> bool:
+        """Check whether two (possibly tokenized) SMILES strings are equivalent."""
+        return self.compare(smiles_a, smiles_b).equivalent
+
+    def _resolved(
+        self,
+        equivalent: bool,
+        tier: EquivalenceTier,
+        reasons: Tuple[Optional[FailureReason], Optional[FailureReason]] = (
+            None,
+            None,
+        ),
+    ) -> EquivalenceResult:
+        self.tier_counts[tier] += 1
+        return EquivalenceResult(equivalent=equivalent, tier=tier, reasons=reasons)
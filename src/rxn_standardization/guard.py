@@ -0,0 +1,237 @@
+"""
+Guard against pathological molecules, for which RDKit may take seconds to
+minutes (f.i. very large or highly symmetric molecules).
+
+The molecules above the atom-count or length thresholds are processed in
+separate worker processes, with a timeout for every molecule: the worker is
+killed when the timeout expires, and the molecule is left as is, with the
+TIMEOUT failure reason (or WORKER_CRASHED if the worker exits while
+processing it).
+"""
+
+import logging
+import multiprocessing
+import re
+import time
+from collections import deque
+from multiprocessing.connection import Connection, wait
+from types import TracebackType
+from typing import Any, Callable, Deque, List, Optional, Sequence, Tuple, Type
+
+from rxn.chemutils.tokenization import detokenize_smiles
+
+from rxn_standardization.utils import FailureReason, _apply_with_reason
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Bracket atoms and atoms of the organic subset
+_ATOM_REGEX = re.compile(r"\[[^\]]*\]|Br|Cl|[BCNOPSFI]|[bcnops]")
+
+ProcessingResult = Tuple[str, Optional[FailureReason]]
+
+# The workers are started (and replaced) from the thread running the guard,
+# while other threads run: they are started from a fresh interpreter instead
+# of being forked from the multithreaded process.
+_CONTEXT = multiprocessing.get_context("spawn")
+
+
+def count_atoms(smiles: str) -> int:
+    """Count the (explicit) atoms of a SMILES string without parsing it."""
+    return len(_ATOM_REGEX.findall(smiles))
+
+
+def _worker_loop(connection: Connection) -> None:
+    # Signal that the interpreter is started and the modules imported
+    connection.send(None)
+    while True:
+        task = connection.recv()
+        if task is None:
+            break
+        fn, smiles = task
+        connection.send(_apply_with_reason(fn, smiles))
+
+
+class _Worker:
+    """Worker process executing one item at a time."""
+
+    def __init__(self) -> None:
+        self.connection, child_connection = _CONTEXT.Pipe()
+        self.process = _CONTEXT.Process(
+            target=_worker_loop, args=(child_connection,), daemon=True
+        )
+        self.process.start()
+        child_connection.close()
+        # Wait until the worker is ready, so that its start-up time does not
+        # count against the timeout of its first item
+        try:
+            self.connection.recv()
+        except EOFError:
+            self.kill()
+            raise RuntimeError("The guard worker process failed to start.")
+        # Index and deadline of the item being processed
+        self.task: Optional[Tuple[int, float]] = None
+
+    def submit(
+        self, fn: Callable[[str], str], smiles: str, index: int, timeout: float
+    ) -> None:
+        self.connection.send((fn, smiles))
+        self.task = (index, time.monotonic() + timeout)
+
+    def stop(self) -> None:
+        try:
+            self.connection.send(None)
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=1.0)
+        self.kill()
+
+    def kill(self) -> None:
+        if self.process.is_alive():
+            self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+
+class MoleculeGuard:
+    """
+    Route the large molecules to separate worker processes with per-item
+    timeouts.
+
+    The guard can be given to the batch functions of utils (canonicalize_many,
+    remove_stereochemistry_many), which run it in a background thread while
+    they process the other molecules; it must be used from the main process,
+    as it starts its own worker processes.
+
+    Example:
+        with MoleculeGuard(max_atoms=200, timeout=10.0) as guard:
+            result = canonicalize_many(smiles, guard=guard)
+    """
+
+    def __init__(
+        self,
+        max_atoms: Optional[int] = None,
+        max_length: Optional[int] = None,
+        timeout: float = 30.0,
+        n_workers: int = 1,
+    ):
+        """
+        Args:
+            max_atoms: molecules with more atoms are routed to the workers;
+                no limit if None.
+            max_length: molecules with longer (detokenized) SMILES strings are
+                routed to the workers; no limit if None.
+            timeout: time, in seconds, after which the processing of a routed
+                molecule is aborted.
+            n_workers: number of worker processes for the routed molecules.
+        """
+        if n_workers < 1:
+            raise ValueError("The guard needs at least one worker.")
+        self.max_atoms = max_atoms
+        self.max_length = max_length
+        self.timeout = timeout
+        self.n_workers = n_workers
+
+        self.n_routed = 0
+        self.n_timeouts = 0
+        self.n_crashes = 0
+        self._workers: List[_Worker] = []
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any threshold is set; without one, no molecule is routed."""
+        return self.max_atoms is not None or self.max_length is not None
+
+    def is_pathological(self, smiles: Any) -> bool:
+        """Whether a (possibly tokenized) SMILES string must be routed to the workers."""
+        if not isinstance(smiles, str):
+            return False
+        smiles = detokenize_smiles(smiles)
+        if self.max_length is not None and len(smiles) > self.max_length:
+            return True
+        return self.max_atoms is not None and count_atoms(smiles) > self.max_atoms
+
+    def run(
+        self, fn: Callable[[str], str], smiles: Sequence[str]
+    ) -> List[ProcessingResult]:
+        """
+        Apply a function to SMILES strings in the worker processes.
+
+        Args:
+            fn: function to apply; must be picklable.
+            smiles: SMILES strings to process.
+
+        Returns:
+            The result and failure reason for every SMILES string; the ones
+            that timed out or crashed their worker are left as is.
+        """
+        results: List[Optional[ProcessingResult]] = [None] * len(smiles)
+        pending: Deque[int] = deque(range(len(smiles)))
+        self.n_routed += len(smiles)
+        while len(self._workers) < min(self.n_workers, len(smiles)):
+            self._workers.append(_Worker())
+
+        while pending or any(w.task is not None for w in self._workers):
+            for worker in self._workers:
+                if worker.task is None and pending:
+                    index = pending.popleft()
+                    worker.submit(fn, smiles[index], index, self.timeout)
+
+            busy = [w for w in self._workers if w.task is not None]
+            next_deadline = min(w.task[1] for w in busy if w.task is not None)
+            ready = wait(
+                [w.connection for w in busy],
+                timeout=max(0.0, next_deadline - time.monotonic()),
+            )
+
+            for i, worker in enumerate(self._workers):
+                if worker.task is None:
+                    continue
+                index, deadline = worker.task
+                if worker.connection in ready:
+                    try:
+                        results[index] = worker.connection.recv()
+                        worker.task = None
+                        continue
+                    except EOFError:
+                        logger.warning(
+                            f'Worker process exited while processing "{smiles[index]}".'
+                        )
+                        results[index] = (smiles[index], FailureReason.WORKER_CRASHED)
+                        self.n_crashes += 1
+                elif time.monotonic() < deadline:
+                    continue
+                else:
+                    logger.debug(
+                        f'Processing of "{smiles[index]}" aborted after '
+                        f"{self.timeout}s; leaving it as is."
+                    )
+                    results[index] = (smiles[index], FailureReason.TIMEOUT)
+                    self.n_timeouts += 1
+                # Timeout, or the worker died: replace it
+                worker.kill()
+                self._workers[i] = _Worker()
+
+        assert all(result is not None for result in results)
+        return results  # type: ignore[return-value]
+
+    def close(self) -> None:
+        for worker in self._workers:
+            worker.stop()
+        self._workers = []
+        if self.n_routed:
+            logger.info(
+                f"{self.n_routed} molecules routed to the guarded workers, "
+                f"{self.n_timeouts} timed out, {self.n_crashes} crashed a worker."
+            )
+
+    def __enter__(self) -> "MoleculeGuard":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        self.close()
@@ -0,0 +1,180 @@
+"""
+Line-offset index for random access to the lines of large text files.
+
+The index is a NumPy int64 array with the start offset of every line, followed
+by the file size; it is cached next to the file ("<file>.lidx.npy"), and the
+lines are read from a memory-mapped view of the file.
+"""
+
+import logging
+import mmap
+import os
+from pathlib import Path
+from types import TracebackType
+from typing import List, Optional, Type
+
+import numpy as np
+from rxn.utilities.files import PathLike
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+INDEX_SUFFIX = ".lidx.npy"
+
+
+def line_index_path(path: PathLike) -> Path:
+    """Get the path where the line index of a file is cached."""
+    return Path(f"{path}{INDEX_SUFFIX}")
+
+
+def build_line_index(path: PathLike, block_size: int = 1 << 24) -> np.ndarray:
+    """
+    Build the line-offset index of a file.
+
+    Args:
+        path: text file to index.
+        block_size: number of bytes scanned at once.
+
+    Returns:
+        Array of size (number of lines + 1): the start offset of every line,
+        followed by the file size. The i-th line spans the bytes from
+        ``index[i]`` to ``index[i + 1]`` (including its newline character).
+    """
+    size = os.path.getsize(path)
+    offsets = [np.zeros(1, dtype=np.int64)]
+    if size > 0:
+        with open(path, "rb") as f, mmap.mmap(
+            f.fileno(), 0, access=mmap.ACCESS_READ
+        ) as mm:
+            for block_start in range(0, size, block_size):
+                block = np.frombuffer(
+                    mm,
+                    dtype=np.uint8,
+                    count=min(block_size, size - block_start),
+                    offset=block_start,
+                )
+                newlines = np.flatnonzero(block == ord("\n")).astype(np.int64)
+                offsets.append(newlines + (block_start + 1))
+                del block  # release the buffer before closing the mmap
+    index = np.concatenate(offsets)
+    if index[-1] != size:
+        # The last line has no trailing newline
+        index = np.append(index, np.int64(size))
+    return index
+
+
+def load_line_index(path: PathLike, cache: bool = True) -> np.ndarray:
+    """
+    Get the line-offset index of a file, from the cache if it is up to date.
+
+    Args:
+        path: text file to index.
+        cache: whether to read the index from, and write it to, the cache
+            file next to the indexed file.
+    """
+    cache_path = line_index_path(path)
+    if cache and cache_path.exists():
+        if os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            index = np.load(cache_path, mmap_mode="r")
+            if index[-1] == os.path.getsize(path):
+                return index
+        logger.info(f'Line index "{cache_path}" is outdated; rebuilding it.')
+
+    index = build_line_index(path)
+    if cache:
+        try:
+            np.save(cache_path, index)
+        except OSError as e:
+            logger.warning(f'Cannot cache the line index to "{cache_path}": {e}')
+    return index
+
+
+def _split_lines(data: bytes) -> List[str]:
+    """Decode consecutive lines, including the newline after the last one."""
+    text = data.decode("utf-8")
+    lines = text.split("\n")
+    if text.endswith("\n"):
+        lines.pop()
+    return [line.rstrip("\r") for line in lines]
+
+
+def read_lines(path: PathLike, offsets: np.ndarray) -> List[str]:
+    """
+    Read consecutive lines of a file from their part of its line index.
+
+    This allows sending worker processes only the offsets of their chunk of
+    lines, instead of having each of them load the index of the whole file.
+
+    Args:
+        path: indexed file.
+        offsets: start offsets of the lines, followed by the end of the last
+            one, f.i. ``index[start : stop + 1]``.
+    """
+    if len(offsets) < 2:
+        return []
+    with open(path, "rb") as f:
+        f.seek(int(offsets[0]))
+        data = f.read(int(offsets[-1] - offsets[0]))
+    return _split_lines(data)
+
+
+class LineIndexedFile:
+    """
+    Random access to the lines of a text file, with a line-offset index and
+    a memory-mapped view of the file.
+
+    Lines are returned without their trailing newline, as with
+    ``iterate_lines_from_file``.
+
+    Example:
+        with LineIndexedFile("pred.txt") as predictions:
+            n = len(predictions)
+            chunk = predictions.lines(1000, 2000)
+    """
+
+    def __init__(self, path: PathLike, cache: bool = True):
+        """
+        Args:
+            path: text file to read.
+            cache: whether to use the cached line index (see load_line_index).
+        """
+        self.path = path
+        self.offsets = load_line_index(path, cache=cache)
+        self._file = open(path, "rb")
+        self._mmap: Optional[mmap.mmap] = None
+        if self.offsets[-1] > 0:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        if not -len(self) <= i < len(self):
+            raise IndexError(f"Line {i} out of range for {len(self)} lines.")
+        i = i % len(self)
+        return self.lines(i, i + 1)[0]
+
+    def lines(self, start: int, stop: int) -> List[str]:
+        """Get the lines from ``start`` (inclusive) to ``stop`` (exclusive)."""
+        start = max(0, min(start, len(self)))
+        stop = max(start, min(stop, len(self)))
+        if start == stop or self._mmap is None:
+            return []
+        return _split_lines(self._mmap[self.offsets[start] : self.offsets[stop]])
+
+    def close(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        self._file.close()
+
+    def __enter__(self) -> "LineIndexedFile":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        self.close()
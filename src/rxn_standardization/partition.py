@@ -0,0 +1,231 @@
+"""
+Partitioning of large files into byte ranges aligned to line boundaries, so
+that several processes (possibly on several machines) can each process one
+part of a file, and merging of the partial outputs.
+"""
+
+import io
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import IO, Any, List, NamedTuple, Optional, Tuple
+
+import click
+from rxn.utilities.files import PathLike
+
+
+class Partition(NamedTuple):
+    """Partition ``part`` (zero-based) out of ``total``."""
+
+    part: int
+    total: int
+
+    def __str__(self) -> str:
+        return f"{self.part}/{self.total}"
+
+
+def parse_partition(value: str) -> Partition:
+    """
+    Parse a partition given as "K/N", with 0 <= K < N.
+
+    Raises:
+        ValueError: for an invalid format or values.
+    """
+    match = re.fullmatch(r"\s*(\d+)\s*/\s*(\d+)\s*", value)
+    if match is None:
+        raise ValueError(f'Invalid partition "{value}", expected "K/N".')
+    index, count = int(match.group(1)), int(match.group(2))
+    if not 0 <= index < count:
+        raise ValueError(f'Invalid partition "{value}", expected 0 <= K < N.')
+    return Partition(part=index, total=count)
+
+
+class PartitionParamType(click.ParamType):
+    """Click parameter type for partitions given as "K/N"."""
+
+    name = "K/N"
+
+    def convert(
+        self, value: Any, param: Optional[click.Parameter], ctx: Optional[click.Context]
+    ) -> Partition:
+        if isinstance(value, Partition):
+            return value
+        try:
+            return parse_partition(value)
+        except ValueError as e:
+            self.fail(str(e), param, ctx)
+
+
+PARTITION = PartitionParamType()
+
+
+def _align_to_line(f: IO[bytes], offset: int) -> int:
+    """Get the start of the first line starting at or after the given offset."""
+    if offset == 0:
+        return 0
+    f.seek(offset - 1)
+    f.readline()
+    return f.tell()
+
+
+def byte_range(path: PathLike, partition: Partition) -> Tuple[int, int]:
+    """
+    Get the byte range of a file for the given partition.
+
+    The file is split into ``partition.total`` ranges of similar size, whose
+    limits are moved to the next line start. Every line therefore belongs to
+    exactly one partition (some partitions may be empty for small files).
+
+    Returns:
+        Tuple: start (inclusive) and end (exclusive) offsets.
+    """
+    size = os.path.getsize(path)
+    with open(path, "rb") as f:
+        start = _align_to_line(f, size * partition.part // partition.total)
+        end = _align_to_line(f, size * (partition.part + 1) // partition.total)
+    return start, end
+
+
+class _ByteRangeReader(io.RawIOBase):
+    """Raw reader for a byte range of a file, preceded by an optional prefix."""
+
+    def __init__(self, path: PathLike, start: int, end: int, prefix: bytes = b""):
+        self._file = open(path, "rb")
+        self._file.seek(start)
+        self._remaining = end - start
+        self._prefix = prefix
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer: Any) -> int:
+        if self._prefix:
+            n = min(len(buffer), len(self._prefix))
+            buffer[:n] = self._prefix[:n]
+            self._prefix = self._prefix[n:]
+            return n
+        if self._remaining <= 0:
+            return 0
+        data = self._file.read(min(len(buffer), self._remaining))
+        buffer[: len(data)] = data
+        self._remaining -= len(data)
+        return len(data)
+
+    def close(self) -> None:
+        self._file.close()
+        super().close()
+
+
+def open_partition(
+    path: PathLike, partition: Partition, header: bool = False
+) -> io.TextIOWrapper:
+    """
+    Open the byte range of a text file for the given partition.
+
+    Args:
+        path: file to read.
+        partition: partition to read.
+        header: whether the first line of the file is a header. If True, the
+            header is returned as the first line for every partition.
+
+    Returns:
+        Text stream, to use as a context manager; can be given to
+        ``pd.read_csv`` or iterated over line by line.
+    """
+    start, end = byte_range(path, partition)
+    prefix = b""
+    if header:
+        with open(path, "rb") as f:
+            prefix = f.readline()
+        start = max(start, len(prefix))
+        end = max(end, start)
+    raw = _ByteRangeReader(path, start, end, prefix=prefix)
+    return io.TextIOWrapper(io.BufferedReader(raw), encoding="utf-8")
+
+
+def partition_path(path: PathLike, partition: Partition) -> Path:
+    """
+    Get the path of the partial output for the given partition.
+
+    The partition is inserted before the extension, so that the format of the
+    file can still be determined from it: "out.csv" -> "out.part-2-of-8.csv".
+    """
+    path = Path(path)
+    suffix = path.suffix
+    stem = path.name[: -len(suffix)] if suffix else path.name
+    return path.with_name(f"{stem}.part-{partition.part}-of-{partition.total}{suffix}")
+
+
+def find_partition_paths(path: PathLike) -> List[Path]:
+    """
+    Find the partial outputs for a file, in order.
+
+    Raises:
+        FileNotFoundError: if no partial outputs exist, or if some are missing.
+    """
+    path = Path(path)
+    suffix = path.suffix
+    stem = path.name[: -len(suffix)] if suffix else path.name
+    pattern = re.compile(re.escape(stem) + r"\.part-(\d+)-of-(\d+)" + re.escape(suffix))
+
+    counts = set()
+    for candidate in path.parent.glob(f"{stem}.part-*-of-*{suffix}"):
+        match = pattern.fullmatch(candidate.name)
+        if match is not None:
+            counts.add(int(match.group(2)))
+    if not counts:
+        raise FileNotFoundError(f'No partial outputs found for "{path}".')
+    if len(counts) > 1:
+        raise FileNotFoundError(
+            f'Partial outputs for "{path}" with different partition counts: {sorted(counts)}.'
+        )
+
+    count = counts.pop()
+    paths = [partition_path(path, Partition(i, count)) for i in range(count)]
+    missing = [str(p) for p in paths if not p.exists()]
+    if missing:
+        raise FileNotFoundError(f"Missing partial outputs: {missing}.")
+    return paths
+
+
+def merge_partitions(path: PathLike, remove_parts: bool = False) -> int:
+    """
+    Concatenate the partial outputs for a file, in order.
+
+    CSV files (".csv" extension) keep the header of the first part only;
+    Parquet and Arrow files are merged table-wise; other files are
+    concatenated as they are.
+
+    Args:
+        path: merged file to create.
+        remove_parts: whether to delete the partial outputs after merging.
+
+    Returns:
+        The number of partial outputs that were merged.
+    """
+    # Imported here to avoid a circular import (tables -> partition)
+    from rxn_standardization.tables import CSV, TableWriter, iterate_table, table_format
+
+    path = Path(path)
+    parts = find_partition_paths(path)
+    is_csv = path.suffix.lower() == ".csv"
+
+    if table_format(path) != CSV:
+        with TableWriter(path) as writer:
+            for part in parts:
+                for chunk in iterate_table(part):
+                    writer.write(chunk)
+    else:
+        with open(path, "wb") as f_out:
+            for i, part in enumerate(parts):
+                with open(part, "rb") as f_in:
+                    header = f_in.readline() if is_csv else b""
+                    if i == 0:
+                        f_out.write(header)
+                    shutil.copyfileobj(f_in, f_out)
+
+    if remove_parts:
+        for part in parts:
+            part.unlink()
+    return len(parts)
@@ -0,0 +1,880 @@
+"""
+Streaming pipeline to build datasets without intermediate files.
+
+A pipeline is a chain of stages: a source (f.i. reading an SDF file), any
+number of transforms (f.i. removing stereochemistry, tokenizing), and a sink
+(f.i. writing the train/valid/test files). The stages exchange chunks of rows
+(DataFrames) through bounded queues, and every stage runs in its own thread,
+so that reading, RDKit work and writing overlap. The RDKit transforms can
+additionally spread the SMILES of every chunk over worker processes.
+
+When a queue is full, the stage feeding it waits (backpressure): the time
+spent waiting for downstream stages, or for input from upstream stages, is
+reported for every stage with its throughput.
+"""
+
+import gzip
+import json
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+from contextlib import ExitStack
+from multiprocessing.pool import Pool
+from pathlib import Path
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+)
+
+import numpy as np
+import pandas as pd
+from rdkit import Chem
+from rxn.utilities.files import PathLike
+
+from rxn_standardization.partition import parse_partition
+from rxn_standardization.rejects import Reject, RejectsRecorder, batch_rejects
+from rxn_standardization.tables import (
+    TABLE_FORMATS,
+    TableWriter,
+    iterate_table,
+    table_suffix,
+)
+from rxn_standardization.utils import remove_stereochemistry_many, tokenize_many
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Marks the end of the stream in the queues
+_END = object()
+
+# Interval, in seconds, at which blocked stages check whether to stop
+_POLL_INTERVAL = 0.1
+
+
+class TransformResult(NamedTuple):
+    """
+    Output of a transform for one chunk.
+
+    Attributes:
+        chunk: transformed rows; the index (row number in the source) is kept.
+        rejects: items that could not be processed.
+    """
+
+    chunk: pd.DataFrame
+    rejects: List[Reject]
+
+
+class Stage:
+    """Base class for the pipeline stages."""
+
+    def __init__(self, name: Optional[str] = None, processes: int = 0):
+        """
+        Args:
+            name: name of the stage in the logs; defaults to its type.
+            processes: number of worker processes, for the transforms that
+                support them; 0 to process the chunks in the stage thread.
+        """
+        self.name = name or type(self).__name__
+        self.processes = processes
+
+    def open(self) -> None:
+        """Prepare the stage; called in the stage thread before any chunk."""
+
+    def close(self) -> None:
+        """Release the resources of the stage; called in the stage thread."""
+
+
+class Source(Stage):
+    """Stage producing the chunks."""
+
+    def iterate(self) -> Iterator[pd.DataFrame]:
+        raise NotImplementedError()
+
+
+class Transform(Stage):
+    """
+    Stage transforming the chunks.
+
+    Transforms supporting worker processes are given the pool of the stage,
+    to pass to the batch functions of utils (f.i. tokenize_many): the workers
+    then get ranges of the SMILES in shared memory instead of pickled chunks.
+    Transforms needing the whole input (f.i. to deduplicate rows) produce
+    their remaining rows in ``finish``.
+    """
+
+    supports_processes = False
+
+    def transform(
+        self, chunk: pd.DataFrame, pool: Optional[Pool] = None
+    ) -> TransformResult:
+        """
+        Args:
+            chunk: rows to transform.
+            pool: worker processes of the stage, for the transforms
+                supporting them; None to process the chunk in the stage thread.
+        """
+        raise NotImplementedError()
+
+    def finish(self) -> Iterator[TransformResult]:
+        """Produce the remaining rows, after the last chunk; called in the stage thread."""
+        return iter([])
+
+
+class Sink(Stage):
+    """Stage consuming the chunks."""
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        raise NotImplementedError()
+
+
+class StageStats:
+    """
+    Throughput and backpressure statistics for one stage.
+
+    Attributes:
+        chunks: number of chunks produced (consumed, for sinks).
+        rows_in: number of rows received.
+        rows_out: number of rows produced (written, for sinks).
+        busy_seconds: time spent processing.
+        starved_seconds: time spent waiting for input from the upstream stage.
+        blocked_seconds: time spent waiting for the downstream stage to
+            accept the output (backpressure).
+        queue_fill: mean fill fraction of the output queue when adding a chunk.
+        elapsed_seconds: total running time of the stage.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.chunks = 0
+        self.rows_in = 0
+        self.rows_out = 0
+        self.busy_seconds = 0.0
+        self.starved_seconds = 0.0
+        self.blocked_seconds = 0.0
+        self.elapsed_seconds = 0.0
+        self._queue_fill_sum = 0.0
+
+    @property
+    def queue_fill(self) -> float:
+        return self._queue_fill_sum / self.chunks if self.chunks else 0.0
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows_out / self.elapsed_seconds if self.elapsed_seconds else 0.0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "chunks": self.chunks,
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "rows_per_second": self.rows_per_second,
+            "busy_seconds": self.busy_seconds,
+            "starved_seconds": self.starved_seconds,
+            "blocked_seconds": self.blocked_seconds,
+            "queue_fill": self.queue_fill,
+            "elapsed_seconds": self.elapsed_seconds,
+        }
+
+    def __str__(self) -> str:
+        return (
+            f"{self.name}: {self.rows_out} rows in {self.chunks} chunks, "
+            f"{self.rows_per_second:.1f} rows/s; busy {self.busy_seconds:.1f}s, "
+            f"waiting for input {self.starved_seconds:.1f}s, "
+            f"blocked by downstream {self.blocked_seconds:.1f}s "
+            f"(output queue {self.queue_fill:.0%} full on average)"
+        )
+
+
+class _Cancelled(Exception):
+    """Raised in a stage thread when another stage failed."""
+
+
+class Pipeline:
+    """
+    Chain of stages connected by bounded queues.
+
+    Example:
+        pipeline = Pipeline(
+            [
+                TableSource("pubchem.csv"),
+                RemoveStereo(processes=4),
+                Tokenize(processes=4),
+                SplitSink("data/"),
+            ]
+        )
+        for stats in pipeline.run():
+            print(stats)
+    """
+
+    def __init__(
+        self,
+        stages: Sequence[Stage],
+        queue_size: int = 8,
+        rejects_file: Optional[PathLike] = None,
+    ):
+        """
+        Args:
+            stages: a source, any number of transforms, and a sink.
+            queue_size: maximal number of chunks waiting between two stages.
+            rejects_file: CSV file where to save the rejected items, see
+                RejectsRecorder.
+        """
+        if len(stages) < 2:
+            raise ValueError("A pipeline needs at least a source and a sink.")
+        if not isinstance(stages[0], Source):
+            raise ValueError(f'The first stage "{stages[0].name}" is not a source.')
+        if not isinstance(stages[-1], Sink):
+            raise ValueError(f'The last stage "{stages[-1].name}" is not a sink.')
+        for stage in stages[1:-1]:
+            if not isinstance(stage, Transform):
+                raise ValueError(f'The stage "{stage.name}" is not a transform.')
+            if stage.processes and not stage.supports_processes:
+                raise ValueError(
+                    f'The stage "{stage.name}" cannot run in worker processes.'
+                )
+        if queue_size < 1:
+            raise ValueError("The queue size must be at least 1.")
+
+        self.stages = list(stages)
+        self.queue_size = queue_size
+        self.rejects_file = rejects_file
+
+        self._stop = threading.Event()
+        self._errors: List[BaseException] = []
+        self._rejects_lock = threading.Lock()
+
+    def run(self) -> List[StageStats]:
+        """
+        Run the pipeline until the source is exhausted.
+
+        Raises:
+            The first exception raised by a stage, after stopping all of them.
+
+        Returns:
+            The statistics for every stage.
+        """
+        self._stop.clear()
+        self._errors = []
+        queues: List["queue.Queue[Any]"] = [
+            queue.Queue(maxsize=self.queue_size) for _ in self.stages[:-1]
+        ]
+        stats = [StageStats(stage.name) for stage in self.stages]
+
+        with ExitStack() as stack:
+            rejects = stack.enter_context(RejectsRecorder(self.rejects_file))
+            # Every pool starts threads of its own, so that the workers of the
+            # next pools would be forked from a multithreaded process: they
+            # are started from a fresh interpreter instead.
+            context = multiprocessing.get_context("spawn")
+            pools: List[Optional[Pool]] = [
+                (
+                    stack.enter_context(context.Pool(stage.processes))
+                    if stage.processes
+                    else None
+                )
+                for stage in self.stages
+            ]
+
+            threads = []
+            for i, stage in enumerate(self.stages):
+                input_queue = queues[i - 1] if i > 0 else None
+                output_queue = queues[i] if i < len(queues) else None
+                thread = threading.Thread(
+                    target=self._run_stage,
+                    args=(
+                        stage,
+                        stats[i],
+                        input_queue,
+                        output_queue,
+                        pools[i],
+                        rejects,
+                    ),
+                    name=f"pipeline-{stage.name}",
+                    daemon=True,
+                )
+                threads.append(thread)
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            if self._errors:
+                raise self._errors[0]
+
+        for stage_stats in stats:
+            logger.info(str(stage_stats))
+        return stats
+
+    def _run_stage(
+        self,
+        stage: Stage,
+        stats: StageStats,
+        input_queue: "Optional[queue.Queue[Any]]",
+        output_queue: "Optional[queue.Queue[Any]]",
+        pool: Optional[Pool],
+        rejects: RejectsRecorder,
+    ) -> None:
+        start = time.perf_counter()
+        try:
+            stage.open()
+            try:
+                if isinstance(stage, Source):
+                    assert output_queue is not None
+                    self._run_source(stage, stats, output_queue, rejects)
+                elif isinstance(stage, Transform):
+                    assert input_queue is not None and output_queue is not None
+                    self._run_transform(
+                        stage, stats, input_queue, output_queue, pool, rejects
+                    )
+                else:
+                    assert isinstance(stage, Sink) and input_queue is not None
+                    self._run_sink(stage, stats, input_queue)
+            finally:
+                stage.close()
+        except _Cancelled:
+            pass
+        except BaseException as e:
+            logger.error(f'Stage "{stage.name}" failed: {e}')
+            self._errors.append(e)
+            self._stop.set()
+        finally:
+            stats.elapsed_seconds = time.perf_counter() - start
+
+    def _get(self, input_queue: "queue.Queue[Any]", stats: StageStats) -> Any:
+        start = time.perf_counter()
+        try:
+            while True:
+                try:
+                    return input_queue.get(timeout=_POLL_INTERVAL)
+                except queue.Empty:
+                    if self._stop.is_set():
+                        raise _Cancelled()
+        finally:
+            stats.starved_seconds += time.perf_counter() - start
+
+    def _put(
+        self, output_queue: "queue.Queue[Any]", item: Any, stats: StageStats
+    ) -> None:
+        if item is not _END:
+            stats.chunks += 1
+            stats.rows_out += len(item)
+            stats._queue_fill_sum += output_queue.qsize() / self.queue_size
+        start = time.perf_counter()
+        try:
+            while True:
+                try:
+                    output_queue.put(item, timeout=_POLL_INTERVAL)
+                    return
+                except queue.Full:
+                    if self._stop.is_set():
+                        raise _Cancelled()
+        finally:
+            stats.blocked_seconds += time.perf_counter() - start
+
+    def _record(self, rejects: RejectsRecorder, items: List[Reject]) -> None:
+        with self._rejects_lock:
+            for reject in items:
+                rejects.record(*reject)
+
+    def _run_source(
+        self,
+        stage: Source,
+        stats: StageStats,
+        output_queue: "queue.Queue[Any]",
+        rejects: RejectsRecorder,
+    ) -> None:
+        chunks = stage.iterate()
+        try:
+            while True:
+                start = time.perf_counter()
+                chunk = next(chunks, None)
+                stats.busy_seconds += time.perf_counter() - start
+                if chunk is None:
+                    break
+                stats.rows_in += len(chunk)
+                self._put(output_queue, chunk, stats)
+            self._put(output_queue, _END, stats)
+        finally:
+            # When the pipeline is cancelled or another stage fails, close the
+            # generator right away, so that it releases its input file
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+    def _run_transform(
+        self,
+        stage: Transform,
+        stats: StageStats,
+        input_queue: "queue.Queue[Any]",
+        output_queue: "queue.Queue[Any]",
+        pool: Optional[Pool],
+        rejects: RejectsRecorder,
+    ) -> None:
+        def emit(result: TransformResult) -> None:
+            self._record(rejects, result.rejects)
+            # Transforms emitting their rows in finish give empty chunks
+            if len(result.chunk):
+                self._put(output_queue, result.chunk, stats)
+
+        while True:
+            chunk = self._get(input_queue, stats)
+            if chunk is _END:
+                break
+            stats.rows_in += len(chunk)
+            start = time.perf_counter()
+            result = stage.transform(chunk, pool)
+            stats.busy_seconds += time.perf_counter() - start
+            emit(result)
+
+        remaining = stage.finish()
+        while True:
+            start = time.perf_counter()
+            final_result = next(remaining, None)
+            stats.busy_seconds += time.perf_counter() - start
+            if final_result is None:
+                break
+            emit(final_result)
+        self._put(output_queue, _END, stats)
+
+    def _run_sink(
+        self, stage: Sink, stats: StageStats, input_queue: "queue.Queue[Any]"
+    ) -> None:
+        while True:
+            chunk = self._get(input_queue, stats)
+            if chunk is _END:
+                break
+            stats.rows_in += len(chunk)
+            start = time.perf_counter()
+            stage.write(chunk)
+            stats.busy_seconds += time.perf_counter() - start
+            stats.chunks += 1
+            stats.rows_out += len(chunk)
+
+
+class SdfSource(Source):
+    """
+    Read PubChem Substance SDF files (optionally gzip-compressed), as chunks
+    with "sid" and "smiles" columns; see smiles_from_sdf.py.
+    """
+
+    def __init__(self, input_file: str, chunk_size: int = 10000, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.input_file = input_file
+        self.chunk_size = chunk_size
+        self.n_invalid = 0
+
+    def iterate(self) -> Iterator[pd.DataFrame]:
+        opener: Callable[..., IO[bytes]] = (
+            gzip.open if self.input_file.endswith(".gz") else open  # type: ignore[assignment]
+        )
+        with opener(self.input_file, "rb") as f:
+            sids: List[int] = []
+            smiles: List[str] = []
+            n_rows = 0
+            for mol in Chem.ForwardSDMolSupplier(f):
+                if mol is None:
+                    self.n_invalid += 1
+                    continue
+                sids.append(int(mol.GetProp("PUBCHEM_SUBSTANCE_ID")))
+                smiles.append(Chem.MolToSmiles(mol))
+                if len(sids) == self.chunk_size:
+                    yield _make_chunk(n_rows, sid=sids, smiles=smiles)
+                    n_rows += len(sids)
+                    sids, smiles = [], []
+            if sids:
+                yield _make_chunk(n_rows, sid=sids, smiles=smiles)
+        if self.n_invalid:
+            logger.warning(
+                f'{self.n_invalid} molecules of "{self.input_file}" could not be read.'
+            )
+
+
+class TableSource(Source):
+    """Read a CSV, Parquet or Arrow IPC file in chunks."""
+
+    def __init__(
+        self,
+        input_file: str,
+        columns: Optional[List[str]] = None,
+        chunk_size: int = 10000,
+        partition: Optional[str] = None,
+        **kwargs: Any,
+    ):
+        """
+        Args:
+            input_file: file to read.
+            columns: columns to read; all of them if None.
+            chunk_size: number of rows per chunk, for CSV files.
+            partition: part of the file to read, as "K/N"; see partition.py.
+            kwargs: see Stage.
+        """
+        super().__init__(**kwargs)
+        self.input_file = input_file
+        self.columns = columns
+        self.chunk_size = chunk_size
+        self.partition = None if partition is None else parse_partition(partition)
+
+    def iterate(self) -> Iterator[pd.DataFrame]:
+        n_rows = 0
+        for chunk in iterate_table(
+            self.input_file,
+            columns=self.columns,
+            chunk_size=self.chunk_size,
+            partition=self.partition,
+        ):
+            chunk.index = pd.RangeIndex(n_rows, n_rows + len(chunk))
+            n_rows += len(chunk)
+            yield chunk
+
+
+def _make_chunk(first_row: int, **columns: List[Any]) -> pd.DataFrame:
+    n_rows = len(next(iter(columns.values())))
+    return pd.DataFrame(columns, index=pd.RangeIndex(first_row, first_row + n_rows))
+
+
+class PubChemPairs(Transform):
+    """
+    Map the "sid", "smiles" chunks of PubChem substances to "src", "tgt"
+    chunks with the SMILES of the corresponding compounds, as in
+    extract_pubchem.py. For duplicate src SMILES, the substance with the
+    highest SID is kept, as there.
+
+    As a later chunk may contain a substance with a higher SID, the pairs are
+    only produced after the last chunk, in the order of the input rows; one
+    pair per unique src SMILES is held in memory until then.
+    """
+
+    def __init__(
+        self,
+        sid_map_file: str,
+        cid_smiles_file: str,
+        chunk_size: int = 100000,
+        **kwargs: Any,
+    ):
+        """
+        Args:
+            sid_map_file: SID-Map file. First column is SID, fourth column is CID.
+            cid_smiles_file: CID-SMILES file. First column is CID, second
+                column is SMILES.
+            chunk_size: number of pairs per chunk produced after the last
+                input chunk.
+            kwargs: see Stage.
+        """
+        super().__init__(**kwargs)
+        self.sid_map_file = sid_map_file
+        self.cid_smiles_file = cid_smiles_file
+        self.chunk_size = chunk_size
+        self._sid_to_smiles: Dict[int, str] = {}
+        # src SMILES -> (SID, tgt SMILES, row number in the source)
+        self._pairs: Dict[str, Tuple[int, str, int]] = {}
+
+    def open(self) -> None:
+        logger.info(f'Loading "{self.sid_map_file}" and "{self.cid_smiles_file}"...')
+        sid_map = pd.read_csv(
+            self.sid_map_file,
+            sep="\t",
+            usecols=[0, 3],
+            header=None,
+            names=["sid", "cid"],
+            dtype={"sid": int, "cid": "Int32"},
+        ).dropna()
+        cid_smiles = pd.read_csv(
+            self.cid_smiles_file,
+            sep="\t",
+            header=None,
+            names=["cid", "smiles"],
+            dtype={"cid": int, "smiles": str},
+        )
+        cid_smiles_dict = dict(zip(cid_smiles.cid, cid_smiles.smiles))
+        self._sid_to_smiles = {
+            sid: cid_smiles_dict[cid]
+            for sid, cid in zip(sid_map.sid, sid_map.cid)
+            if cid in cid_smiles_dict
+        }
+        self._pairs = {}
+
+    def transform(
+        self, chunk: pd.DataFrame, pool: Optional[Pool] = None
+    ) -> TransformResult:
+        tgt = chunk["sid"].map(self._sid_to_smiles)
+        pairs = pd.DataFrame(
+            {"sid": chunk["sid"], "src": chunk["smiles"], "tgt": tgt}
+        ).dropna()
+        for row, sid, src, tgt_smiles in zip(
+            pairs.index, pairs["sid"], pairs["src"], pairs["tgt"]
+        ):
+            kept = self._pairs.get(src)
+            if kept is None or sid > kept[0]:
+                self._pairs[src] = (sid, tgt_smiles, row)
+        return TransformResult(chunk=pd.DataFrame(columns=["src", "tgt"]), rejects=[])
+
+    def finish(self) -> Iterator[TransformResult]:
+        rows = sorted((row, src, tgt) for src, (_, tgt, row) in self._pairs.items())
+        self._pairs = {}
+        for start in range(0, len(rows), self.chunk_size):
+            batch = rows[start : start + self.chunk_size]
+            yield TransformResult(
+                chunk=pd.DataFrame(
+                    {
+                        "src": [src for _, src, _ in batch],
+                        "tgt": [tgt for *_, tgt in batch],
+                    },
+                    index=pd.Index([row for row, *_ in batch]),
+                ),
+                rejects=[],
+            )
+
+
+class RemoveStereo(Transform):
+    """
+    Remove the stereochemistry of SMILES columns; the SMILES that cannot be
+    processed are kept as they are, as in extract_pubchem.py.
+    """
+
+    supports_processes = True
+
+    def __init__(
+        self,
+        columns: Sequence[str] = ("src", "tgt"),
+        fast_columns: Sequence[str] = (),
+        **kwargs: Any,
+    ):
+        """
+        Args:
+            columns: columns to process.
+            fast_columns: columns for which the stereo markers are removed
+                from the SMILES strings directly where possible, keeping
+                them as written (see remove_stereochemistry_fast); the other
+                columns are converted to canonical RDKit SMILES.
+            kwargs: see Stage.
+        """
+        super().__init__(**kwargs)
+        self.columns = list(columns)
+        self.fast_columns = list(fast_columns)
+
+    def transform(
+        self, chunk: pd.DataFrame, pool: Optional[Pool] = None
+    ) -> TransformResult:
+        chunk = chunk.copy()
+        rejects: List[Reject] = []
+        for column in self.columns:
+            fast = column in self.fast_columns
+            result = remove_stereochemistry_many(
+                chunk[column], pool=pool, fast=fast, canonical=not fast
+            )
+            rejects.extend(batch_rejects(result, column=column, rows=chunk.index))
+            chunk[column] = result.results
+        return TransformResult(chunk=chunk, rejects=rejects)
+
+
+class Tokenize(Transform):
+    """
+    Tokenize SMILES columns; the rows that cannot be tokenized are dropped,
+    as in rxn-std-process-csv.
+    """
+
+    supports_processes = True
+
+    def __init__(self, columns: Sequence[str] = ("src", "tgt"), **kwargs: Any):
+        super().__init__(**kwargs)
+        self.columns = list(columns)
+
+    def transform(
+        self, chunk: pd.DataFrame, pool: Optional[Pool] = None
+    ) -> TransformResult:
+        chunk = chunk.copy()
+        rejects: List[Reject] = []
+        failed = np.zeros(len(chunk), dtype=bool)
+        for column in self.columns:
+            result = tokenize_many(chunk[column], pool=pool)
+            rejects.extend(batch_rejects(result, column=column, rows=chunk.index))
+            chunk[column] = result.results
+            failed |= result.failed
+        return TransformResult(chunk=chunk[~failed], rejects=rejects)
+
+
+class TableSink(Sink):
+    """Write the chunks to a CSV, Parquet or Arrow IPC file."""
+
+    def __init__(self, output_file: str, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.output_file = output_file
+        self._writer: Optional[TableWriter] = None
+
+    def open(self) -> None:
+        self._writer = TableWriter(self.output_file)
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        assert self._writer is not None
+        self._writer.write(chunk)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+class SplitSink(Sink):
+    """
+    Split the rows into train, valid and test sets, and write the src/tgt
+    files for each of them, as rxn-std-process-csv.
+
+    As the dataset is streamed, every row is assigned to a split at random
+    (with a fixed seed); the split sizes therefore only match the fractions
+    approximately.
+    """
+
+    SPLITS = ("train", "valid", "test")
+
+    def __init__(
+        self,
+        save_dir: str,
+        src_col: str = "src",
+        tgt_col: str = "tgt",
+        train_frac: float = 0.9,
+        test_frac_of_rest: float = 0.6,
+        prepend_token: Optional[str] = None,
+        output_format: str = "txt",
+        seed: int = 42,
+        **kwargs: Any,
+    ):
+        """
+        Args:
+            save_dir: directory where to save the files.
+            src_col: column with the source SMILES.
+            tgt_col: column with the target SMILES.
+            train_frac: fraction of the rows for the training set.
+            test_frac_of_rest: fraction of the other rows for the test set;
+                the remaining ones are for the validation set.
+            prepend_token: token to prepend to the source SMILES, if any.
+            output_format: "txt" or one of TABLE_FORMATS; see save_src_tgt.
+            seed: seed for the assignment of the rows to the splits.
+            kwargs: see Stage.
+        """
+        super().__init__(**kwargs)
+        if output_format not in ("txt", *TABLE_FORMATS):
+            raise ValueError(f'Unknown output format "{output_format}".')
+        self.save_dir = Path(save_dir)
+        self.src_col = src_col
+        self.tgt_col = tgt_col
+        self.train_frac = train_frac
+        self.test_frac_of_rest = test_frac_of_rest
+        self.prepend_token = prepend_token
+        self.output_format = output_format
+        self.seed = seed
+        self._rng = np.random.default_rng(seed)
+        self._files: Dict[str, Any] = {}
+
+    def open(self) -> None:
+        self.save_dir.mkdir(parents=True, exist_ok=True)
+        for split in self.SPLITS:
+            if self.output_format == "txt":
+                self._files[f"src-{split}"] = open(
+                    self.save_dir / f"src-{split}.txt", "w"
+                )
+                self._files[f"tgt-{split}"] = open(
+                    self.save_dir / f"tgt-{split}.txt", "w"
+                )
+            else:
+                self._files[split] = TableWriter(
+                    self.save_dir / f"{split}{table_suffix(self.output_format)}",
+                    columns=["src", "tgt"],
+                )
+
+    def write(self, chunk: pd.DataFrame) -> None:
+        src = chunk[self.src_col].astype(str)
+        if self.prepend_token is not None:
+            src = self.prepend_token + " " + src
+        tgt = chunk[self.tgt_col].astype(str)
+
+        draws = self._rng.random((2, len(chunk)))
+        is_train = draws[0] < self.train_frac
+        is_test = ~is_train & (draws[1] < self.test_frac_of_rest)
+        masks = {"train": is_train, "test": is_test, "valid": ~is_train & ~is_test}
+
+        for split, mask in masks.items():
+            if not mask.any():
+                continue
+            if self.output_format == "txt":
+                self._files[f"src-{split}"].writelines(s + "\n" for s in src[mask])
+                self._files[f"tgt-{split}"].writelines(t + "\n" for t in tgt[mask])
+            else:
+                self._files[split].write(
+                    pd.DataFrame({"src": src[mask], "tgt": tgt[mask]})
+                )
+
+    def close(self) -> None:
+        for f in self._files.values():
+            f.close()
+        self._files = {}
+
+
+STAGE_TYPES: Dict[str, Type[Stage]] = {
+    "read_sdf": SdfSource,
+    "read_table": TableSource,
+    "pubchem_pairs": PubChemPairs,
+    "remove_stereo": RemoveStereo,
+    "tokenize": Tokenize,
+    "write_table": TableSink,
+    "split": SplitSink,
+}
+
+
+def pipeline_from_config(config: Dict[str, Any]) -> Pipeline:
+    """
+    Create a pipeline from its configuration.
+
+    The configuration has a "stages" list, where every stage has a "type"
+    (one of STAGE_TYPES) and the arguments of the corresponding class, and
+    optionally "queue_size" and "rejects_file" (see Pipeline). Example:
+
+        {
+          "queue_size": 8,
+          "stages": [
+            {"type": "read_table", "input_file": "pubchem.csv"},
+            {"type": "tokenize", "processes": 4},
+            {"type": "split", "save_dir": "data", "prepend_token": "[PUBCHEM]"}
+          ]
+        }
+    """
+    unknown_keys = set(config) - {"stages", "queue_size", "rejects_file"}
+    if unknown_keys:
+        raise ValueError(f"Unknown pipeline settings: {sorted(unknown_keys)}.")
+
+    stages: List[Stage] = []
+    for i, stage_config in enumerate(config.get("stages", [])):
+        stage_config = dict(stage_config)
+        stage_type = stage_config.pop("type", None)
+        if stage_type not in STAGE_TYPES:
+            raise ValueError(
+                f'Invalid type "{stage_type}" for stage {i}; '
+                f"expected one of {sorted(STAGE_TYPES)}."
+            )
+        stage_config.setdefault("name", stage_type)
+        try:
+            stages.append(STAGE_TYPES[stage_type](**stage_config))
+        except TypeError as e:
+            raise ValueError(f'Invalid settings for stage {i} "{stage_type}": {e}')
+
+    return Pipeline(
+        stages,
+        queue_size=config.get("queue_size", 8),
+        rejects_file=config.get("rejects_file"),
+    )
+
+
+def load_pipeline(config_file: PathLike) -> Pipeline:
+    """Create a pipeline from a JSON configuration file; see pipeline_from_config."""
+    with open(config_file) as f:
+        return pipeline_from_config(json.load(f))
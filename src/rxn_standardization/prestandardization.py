@@ -0,0 +1,196 @@
+import logging
+from typing import Iterable, List, NamedTuple, Optional, Sequence
+
+from rdkit import Chem
+from rdkit.Chem import RemoveStereochemistry
+from rdkit.Chem.MolStandardize import rdMolStandardize
+from rdkit.Chem.SaltRemover import SaltRemover
+from rxn.chemutils.conversion import mol_to_smiles, smiles_to_mol
+from rxn.chemutils.exceptions import InvalidSmiles
+from rxn.chemutils.tokenization import detokenize_smiles
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+NEUTRALIZE = "neutralize"
+STRIP_SALTS = "strip_salts"
+REMOVE_STEREO = "remove_stereo"
+RULES = (NEUTRALIZE, STRIP_SALTS, REMOVE_STEREO)
+
+# Classes of molecules, from their tautomerism
+NO_TAUTOMERS = "no_tautomers"
+NON_AROMATIC_TAUTOMERS = "non_aromatic_tautomers"  # f.i. ketones, acids, amides
+AROMATIC_TAUTOMERS = "aromatic_tautomers"  # f.i. hydroxypyridines, imidazoles
+MOLECULE_CLASSES = (NO_TAUTOMERS, NON_AROMATIC_TAUTOMERS, AROMATIC_TAUTOMERS)
+# The standard form of heteroaromatic tautomers is left to the model
+DEFAULT_RESOLVED_CLASSES = (NO_TAUTOMERS, NON_AROMATIC_TAUTOMERS)
+
+DEFAULT_ALLOWED_ELEMENTS = (
+    "H",
+    "B",
+    "C",
+    "N",
+    "O",
+    "F",
+    "Si",
+    "P",
+    "S",
+    "Cl",
+    "Br",
+    "I",
+)
+
+# Common solvents, removed as whole fragments in addition to RDKit's default salts
+SOLVENTS = (
+    "CO",  # methanol
+    "CCO",  # ethanol
+    "CC(C)O",  # isopropanol
+    "CC(C)=O",  # acetone
+    "CC#N",  # acetonitrile
+    "CS(C)=O",  # DMSO
+    "CN(C)C=O",  # DMF
+    "ClCCl",  # dichloromethane
+    "ClC(Cl)Cl",  # chloroform
+    "CCOCC",  # diethyl ether
+    "C1CCOC1",  # THF
+    "C1COCCO1",  # dioxane
+    "c1ccccc1",  # benzene
+    "Cc1ccccc1",  # toluene
+    "c1ccncc1",  # pyridine
+)
+
+
+class PreStandardizationResult(NamedTuple):
+    """
+    Result of the pre-standardization of a batch of SMILES.
+
+    Attributes:
+        smiles: standardized SMILES for the molecules resolved by the rules,
+            None for the ones that must be sent to the model.
+        n_resolved: number of molecules resolved by the rules.
+    """
+
+    smiles: List[Optional[str]]
+    n_resolved: int
+
+    @property
+    def n_for_model(self) -> int:
+        return len(self.smiles) - self.n_resolved
+
+
+class PreStandardizer:
+    """
+    Deterministic, rule-based standardization with RDKit, for the molecules
+    that do not need the transformer model.
+
+    The rules are applied in the order of RULES. A molecule is considered as
+    resolved only if, after applying the rules,
+        - it contains only allowed elements (no metals, by default),
+        - it has no charged atoms left (if neutralization is enabled),
+        - it consists of one single fragment (if salt stripping is enabled),
+        - it has no radicals,
+        - it belongs to one of the resolved classes of MOLECULE_CLASSES (by
+          default, no tautomers involving aromatic atoms),
+        - it is given as its canonical tautomer: the rules do not choose
+          between tautomers, so that f.i. an enol is left to the model.
+    Otherwise, the molecule (as well as any SMILES that cannot be parsed or
+    that contain "~" fragment bonds) is left to the model.
+    """
+
+    def __init__(
+        self,
+        rules: Sequence[str] = RULES,
+        allowed_elements: Iterable[str] = DEFAULT_ALLOWED_ELEMENTS,
+        resolved_classes: Iterable[str] = DEFAULT_RESOLVED_CLASSES,
+    ):
+        """
+        Args:
+            rules: rules to apply, among RULES.
+            allowed_elements: element symbols that the rules can handle.
+            resolved_classes: classes of molecules, among MOLECULE_CLASSES,
+                that the rules can resolve.
+        """
+        unknown_rules = set(rules) - set(RULES)
+        if unknown_rules:
+            raise ValueError(f"Unknown pre-standardization rules: {unknown_rules}.")
+        unknown_classes = set(resolved_classes) - set(MOLECULE_CLASSES)
+        if unknown_classes:
+            raise ValueError(f"Unknown molecule classes: {unknown_classes}.")
+        self.rules = [rule for rule in RULES if rule in rules]
+        self.allowed_elements = set(allowed_elements)
+        self.resolved_classes = set(resolved_classes)
+
+        self._uncharger = rdMolStandardize.Uncharger()
+        self._salt_remover = SaltRemover()
+        self._solvent_remover = SaltRemover(defnData="\n".join(SOLVENTS))
+        self._tautomer_enumerator = rdMolStandardize.TautomerEnumerator()
+
+    def _apply_rules(self, mol: Chem.Mol) -> Chem.Mol:
+        if STRIP_SALTS in self.rules:
+            mol = self._salt_remover.StripMol(mol, dontRemoveEverything=True)
+            mol = self._solvent_remover.StripMol(mol, dontRemoveEverything=True)
+        if NEUTRALIZE in self.rules:
+            mol = self._uncharger.uncharge(mol)
+        if REMOVE_STEREO in self.rules:
+            mol = Chem.Mol(mol)
+            RemoveStereochemistry(mol)
+        return mol
+
+    def _is_resolved(self, mol: Chem.Mol) -> bool:
+        for atom in mol.GetAtoms():
+            if atom.GetSymbol() not in self.allowed_elements:
+                return False
+            if NEUTRALIZE in self.rules and atom.GetFormalCharge() != 0:
+                return False
+            if atom.GetNumRadicalElectrons() != 0:
+                return False
+        if STRIP_SALTS in self.rules and len(Chem.GetMolFrags(mol)) != 1:
+            return False
+        return self._is_canonical_tautomer(mol)
+
+    def _is_canonical_tautomer(self, mol: Chem.Mol) -> bool:
+        tautomers = self._tautomer_enumerator.Enumerate(mol)
+        if tautomers.status != rdMolStandardize.TautomerEnumeratorStatus.Completed:
+            return False
+
+        modified_atoms = [mol.GetAtomWithIdx(i) for i in tautomers.modifiedAtoms]
+        if not modified_atoms:
+            molecule_class = NO_TAUTOMERS
+        elif any(atom.GetIsAromatic() for atom in modified_atoms):
+            molecule_class = AROMATIC_TAUTOMERS
+        else:
+            molecule_class = NON_AROMATIC_TAUTOMERS
+        if molecule_class not in self.resolved_classes:
+            return False
+
+        if len(tautomers) < 2:
+            return True
+        canonical = self._tautomer_enumerator.PickCanonical(tautomers)
+        return mol_to_smiles(canonical) == mol_to_smiles(mol)
+
+    def standardize(self, smiles: str) -> Optional[str]:
+        """
+        Standardize a (possibly tokenized) SMILES with the rules.
+
+        Returns:
+            The standardized SMILES, or None if the rules cannot resolve the
+            molecule with confidence and it must be sent to the model.
+        """
+        smiles = detokenize_smiles(smiles)
+        if not smiles or "~" in smiles:
+            return None
+        try:
+            mol = smiles_to_mol(smiles, sanitize=True)
+        except InvalidSmiles:
+            return None
+
+        mol = self._apply_rules(mol)
+        if not self._is_resolved(mol):
+            return None
+        return mol_to_smiles(mol)
+
+    def standardize_many(self, smiles: Iterable[str]) -> PreStandardizationResult:
+        """Standardize SMILES with the rules, and count how many were resolved."""
+        standardized = [self.standardize(smi) for smi in smiles]
+        n_resolved = sum(smi is not None for smi in standardized)
+        return PreStandardizationResult(smiles=standardized, n_resolved=n_resolved)
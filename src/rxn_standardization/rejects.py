@@ -0,0 +1,163 @@
+import csv
+import gzip
+import logging
+import time
+from collections import Counter
+from types import TracebackType
+from typing import IO, Any, Dict, List, Optional, Sequence, Tuple, Type
+
+from rxn.utilities.files import PathLike
+
+from rxn_standardization.utils import BatchResult
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+# Row index, column, reason, value
+Reject = Tuple[int, str, Any, Any]
+
+
+def batch_rejects(
+    result: BatchResult, column: str, rows: Optional[Sequence[int]] = None
+) -> List[Reject]:
+    """
+    Get the failed items of a batch, to record them later (f.i. from another
+    process than the one that processed the batch).
+
+    Args:
+        result: result of one of the batch functions in utils.
+        column: name of the column the batch was taken from.
+        rows: row index for every item of the batch; defaults to the position
+            in the batch.
+    """
+    rejects = []
+    for i in map(int, result.failed.nonzero()[0]):
+        row = i if rows is None else int(rows[i])
+        rejects.append((row, column, result.reasons[i], result.results[i]))
+    return rejects
+
+
+class RejectsRecorder:
+    """
+    Account for the SMILES strings that could not be processed.
+
+    Instead of one log line per failure, the rejects are counted by column and
+    reason, only a few of them are logged as samples, and the progress is
+    logged at most once every ``warning_interval`` seconds. If a sidecar file
+    is given, every reject is written to it as a CSV row (row index, column,
+    reason, value); the file is gzip-compressed if its name ends with ".gz".
+
+    Example:
+        with RejectsRecorder("rejects.csv.gz") as rejects:
+            result = tokenize_many(df["src"])
+            rejects.record_batch(result, column="src", rows=df.index)
+        # -> the summary is logged when leaving the context
+    """
+
+    def __init__(
+        self,
+        sidecar_file: Optional[PathLike] = None,
+        n_samples: int = 5,
+        warning_interval: float = 60.0,
+    ):
+        """
+        Args:
+            sidecar_file: file where to write the rejects; none written if None.
+            n_samples: number of rejects to log for each reason.
+            warning_interval: minimal time, in seconds, between two log
+                messages with the number of rejects so far.
+        """
+        self.sidecar_file = sidecar_file
+        self.n_samples = n_samples
+        self.warning_interval = warning_interval
+        self.counts: Dict[Tuple[str, str], int] = Counter()
+
+        self._last_warning = time.monotonic()
+        self._file: Optional[IO[str]] = None
+        self._writer: Any = None
+        if sidecar_file is not None:
+            self._open_sidecar(str(sidecar_file))
+
+    def _open_sidecar(self, path: str) -> None:
+        if path.endswith(".gz"):
+            self._file = gzip.open(path, "wt", newline="")
+        else:
+            self._file = open(path, "w", newline="")
+        self._writer = csv.writer(self._file, lineterminator="\n")
+        self._writer.writerow(["row", "column", "reason", "value"])
+
+    @property
+    def total(self) -> int:
+        """Total number of rejects so far."""
+        return sum(self.counts.values())
+
+    def count(self, reason: Optional[str] = None, column: Optional[str] = None) -> int:
+        """Number of rejects so far, optionally for one reason and/or column."""
+        return sum(
+            n
+            for (c, r), n in self.counts.items()
+            if (reason is None or r == reason) and (column is None or c == column)
+        )
+
+    def record(self, row: int, column: str, reason: str, value: Any) -> None:
+        """Record one item that could not be processed."""
+        reason = str(getattr(reason, "value", reason))
+        self.counts[(column, reason)] += 1
+
+        if self._writer is not None:
+            self._writer.writerow([row, column, reason, value])
+
+        if self.count(reason=reason) <= self.n_samples:
+            logger.warning(f'Rejected row {row} ({column}, {reason}): "{value}"')
+        elif time.monotonic() - self._last_warning >= self.warning_interval:
+            logger.warning(f"{self.total} rejected items so far.")
+            self._last_warning = time.monotonic()
+
+    def record_batch(
+        self,
+        result: BatchResult,
+        column: str,
+        rows: Optional[Sequence[int]] = None,
+    ) -> None:
+        """
+        Record the failed items of a batch.
+
+        Args:
+            result: result of one of the batch functions in utils; as failed
+                items are left as is, the results give the original values.
+            column: name of the column the batch was taken from.
+            rows: row index for every item of the batch; defaults to the
+                position in the batch.
+        """
+        for reject in batch_rejects(result, column=column, rows=rows):
+            self.record(*reject)
+
+    def log_summary(self) -> None:
+        """Log the number of rejects by column and reason."""
+        if not self.counts:
+            logger.info("No rejected items.")
+            return
+        logger.warning(f"{self.total} rejected items in total:")
+        for (column, reason), n in sorted(self.counts.items()):
+            logger.warning(f"  {column}, {reason}: {n}")
+        if self.sidecar_file is not None:
+            logger.warning(f'Rejected items saved to "{self.sidecar_file}".')
+
+    def close(self) -> None:
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            self._writer = None
+
+    def __enter__(self) -> "RejectsRecorder":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        self.close()
+        if exc_type is None:
+            self.log_summary()
@@ -0,0 +1,41 @@
+import logging
+from typing import Tuple
+
+import click
+from rxn.utilities.logging import setup_console_logger
+
+from rxn_standardization.partition import merge_partitions
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+@click.group()
+def main() -> None:
+    """
+    Utilities for the runs partitioned with "--partition K/N".
+
+    A script run with "--partition K/N" processes only the K-th of N parts of
+    its input (K from 0 to N-1) and writes partial outputs named like
+    "out.part-K-of-N.csv"; the "merge" command reassembles them in order.
+    """
+    setup_console_logger()
+
+
+@main.command()
+@click.argument("output_files", nargs=-1, required=True)
+@click.option(
+    "--remove_parts/--keep_parts",
+    default=False,
+    help="Whether to delete the partial outputs once merged.",
+)
+def merge(output_files: Tuple[str, ...], remove_parts: bool) -> None:
+    """Merge the partial outputs into OUTPUT_FILES (f.i. "out.csv" for the
+    partial outputs "out.part-K-of-N.csv")."""
+    for output_file in output_files:
+        n_parts = merge_partitions(output_file, remove_parts=remove_parts)
+        logger.info(f'Merged {n_parts} partial outputs into "{output_file}".')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+import json
+import logging
+from typing import Optional
+
+import click
+from rxn.utilities.logging import setup_console_logger
+
+from rxn_standardization.pipeline import STAGE_TYPES, load_pipeline
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+@click.command()
+@click.option(
+    "--config_file",
+    "-c",
+    type=str,
+    required=True,
+    help=f"JSON file with the pipeline configuration. Stage types: {', '.join(STAGE_TYPES)}.",
+)
+@click.option(
+    "--stats_file",
+    type=str,
+    default=None,
+    help="JSON file where to save the throughput and backpressure statistics of every stage.",
+)
+def main(config_file: str, stats_file: Optional[str]) -> None:
+    """
+    Build a dataset with a streaming pipeline, without intermediate files.
+
+    The stages (f.i. read_sdf -> pubchem_pairs -> remove_stereo -> tokenize
+    -> split) run concurrently and exchange chunks of rows through bounded
+    queues; the RDKit stages can use several worker processes ("processes").
+    Example configuration:
+
+    \b
+    {
+      "queue_size": 8,
+      "rejects_file": "rejects.csv.gz",
+      "stages": [
+        {"type": "read_sdf", "input_file": "Substance_000000001_000500000.sdf.gz"},
+        {"type": "pubchem_pairs", "sid_map_file": "SID-Map",
+         "cid_smiles_file": "CID-SMILES"},
+        {"type": "remove_stereo", "processes": 4},
+        {"type": "tokenize", "processes": 4},
+        {"type": "split", "save_dir": "data", "prepend_token": "[PUBCHEM]"}
+      ]
+    }
+    """
+    setup_console_logger()
+
+    pipeline = load_pipeline(config_file)
+    logger.info(
+        f"Running the pipeline {' -> '.join(stage.name for stage in pipeline.stages)}..."
+    )
+    stats = pipeline.run()
+
+    if stats_file is not None:
+        with open(stats_file, "w") as f:
+            json.dump([stage_stats.as_dict() for stage_stats in stats], f, indent=2)
+        logger.info(f'Pipeline statistics saved to "{stats_file}".')
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+import logging
+from typing import Tuple
+
+import click
+from rxn.chemutils.tokenization import detokenize_smiles
+from rxn.utilities.containers import chunker
+from rxn.utilities.files import dump_list_to_file, load_list_from_file
+from rxn.utilities.logging import setup_console_logger
+
+from rxn_standardization.prestandardization import (
+    DEFAULT_ALLOWED_ELEMENTS,
+    DEFAULT_RESOLVED_CLASSES,
+    MOLECULE_CLASSES,
+    RULES,
+    PreStandardizer,
+)
+from rxn_standardization.utils import tokenize_many
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+@click.group()
+def main() -> None:
+    """
+    Rule-based pre-standardization, to send to the model only the molecules
+    that the rules cannot resolve.
+
+    \b
+    1. "route" standardizes what it can with the rules and writes the other
+       molecules, tokenized, to the model input file.
+    2. onmt_translate is run on the model input file.
+    3. "merge" fills in the model predictions for the unresolved molecules.
+    """
+    setup_console_logger()
+
+
+@main.command()
+@click.option(
+    "--input_file",
+    "-i",
+    type=str,
+    required=True,
+    help="File with the SMILES to standardize, one per line.",
+)
+@click.option(
+    "--routed_file",
+    "-o",
+    type=str,
+    required=True,
+    help="Output file with the SMILES standardized by the rules, one line per input; empty lines for the molecules sent to the model.",
+)
+@click.option(
+    "--model_input_file",
+    "-m",
+    type=str,
+    required=True,
+    help="Output file with the tokenized SMILES to standardize with the model.",
+)
+@click.option(
+    "--rule",
+    "-r",
+    "rules",
+    type=click.Choice(RULES),
+    multiple=True,
+    default=RULES,
+    show_default=True,
+    help="Rules to apply; can be given several times.",
+)
+@click.option(
+    "--allowed_elements",
+    type=str,
+    default=",".join(DEFAULT_ALLOWED_ELEMENTS),
+    show_default=True,
+    help="Comma-separated elements that the rules can handle; molecules with other elements are sent to the model.",
+)
+@click.option(
+    "--resolved_class",
+    "resolved_classes",
+    type=click.Choice(MOLECULE_CLASSES),
+    multiple=True,
+    default=DEFAULT_RESOLVED_CLASSES,
+    show_default=True,
+    help="Classes of molecules, from their tautomerism, that the rules can resolve; can be given several times. Molecules of other classes, or not given as their canonical tautomer, are sent to the model.",
+)
+def route(
+    input_file: str,
+    routed_file: str,
+    model_input_file: str,
+    rules: Tuple[str, ...],
+    allowed_elements: str,
+    resolved_classes: Tuple[str, ...],
+) -> None:
+    """Standardize SMILES with rules and collect the ones left for the model."""
+    standardizer = PreStandardizer(
+        rules=rules,
+        allowed_elements=allowed_elements.split(","),
+        resolved_classes=resolved_classes,
+    )
+    smiles = load_list_from_file(input_file)
+
+    logger.info(f"Applying the rules {', '.join(standardizer.rules)}...")
+    result = standardizer.standardize_many(smiles)
+
+    dump_list_to_file(("" if s is None else s for s in result.smiles), routed_file)
+    for_model = [smi for smi, std in zip(smiles, result.smiles) if std is None]
+    dump_list_to_file(tokenize_many(for_model).results, model_input_file)
+
+    n_total = len(result.smiles)
+    logger.info(
+        f"{result.n_resolved}/{n_total} molecules "
+        f"({result.n_resolved / max(n_total, 1):.1%}) resolved without inference; "
+        f'{result.n_for_model} left for the model in "{model_input_file}".'
+    )
+
+
+@main.command()
+@click.option(
+    "--routed_file",
+    "-r",
+    type=str,
+    required=True,
+    help='File generated by the "route" command.',
+)
+@click.option(
+    "--pred_file",
+    "-p",
+    type=str,
+    required=True,
+    help="Model predictions for the model input file. Only the first of the n_best predictions is kept.",
+)
+@click.option(
+    "--output_file",
+    "-o",
+    type=str,
+    required=True,
+    help="Output file with the standardized SMILES, one per line.",
+)
+def merge(routed_file: str, pred_file: str, output_file: str) -> None:
+    """Combine the rule-based results and the model predictions."""
+    routed = load_list_from_file(routed_file)
+    predictions = load_list_from_file(pred_file)
+
+    unresolved = [smi for smi in routed if smi == ""]
+    n_best, remainder = divmod(len(predictions), max(len(unresolved), 1))
+    if remainder or (unresolved and n_best == 0):
+        raise ValueError(
+            f'The {len(predictions)} predictions in "{pred_file}" do not match '
+            f'the {len(unresolved)} molecules left for the model in "{routed_file}".'
+        )
+    top_predictions = (
+        detokenize_smiles(chunk[0]) for chunk in chunker(predictions, max(n_best, 1))
+    )
+
+    dump_list_to_file(
+        (smi if smi != "" else next(top_predictions) for smi in routed), output_file
+    )
+    logger.info(
+        f"Merged {len(routed) - len(unresolved)} rule-based and "
+        f'{len(unresolved)} model results into "{output_file}".'
+    )
+
+
+if __name__ == "__main__":
+    main()
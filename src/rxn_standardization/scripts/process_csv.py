@@ -4,40 +4,27 @@ from pathlib import Path
 from typing import Optional
 
 import click
+import numpy as np
 import pandas as pd
-from rxn.chemutils.tokenization import TokenizationError, tokenize_smiles
 from rxn.utilities.files import is_path_creatable
 from rxn.utilities.logging import setup_console_logger
 
-from rxn_standardization.utils import process_input
+from rxn_standardization.partition import PARTITION, Partition, partition_path
+from rxn_standardization.rejects import RejectsRecorder
+from rxn_standardization.tables import TABLE_FORMATS, iterate_table, save_src_tgt
+from rxn_standardization.utils import process_pool, tokenize_many
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
 
-def smiles_to_tokens(smiles: str) -> Optional[str]:
-    """
-    Tokenizes SMILES and raises a warning in case of TokenizationError.
-    """
-    try:
-        return process_input(tokenize_smiles(smiles))
-    except TokenizationError as e:
-        logger.warning(
-            f"Error during tokenizing {smiles}: {e.title}, {e.detail}. Skipping this entry."
-        )
-        return None
-    except TypeError:
-        logger.warning(f"Error during tokenizing {smiles}. Skipping this entry.")
-        return None
-
-
 @click.command(context_settings={"show_default": True})
 @click.option(
     "--input_csv",
     "-i",
     type=str,
     required=True,
-    help="Path to the input file with non-standardized and standardized SMILES.",
+    help="Path to the input file with non-standardized and standardized SMILES (CSV, Parquet or Arrow IPC, from the extension).",
 )
 @click.option(
     "--src_col",
@@ -74,6 +61,31 @@ def smiles_to_tokens(smiles: str) -> Optional[str]:
     default=0.9,
     help="Fraction of dataset to use for training.",
 )
+@click.option(
+    "--output_format",
+    type=click.Choice(["txt", *TABLE_FORMATS]),
+    default="txt",
+    help='Format of the output: "txt" for the src/tgt files expected by OpenNMT, or one table per split with "src" and "tgt" columns.',
+)
+@click.option(
+    "--rejects_file",
+    type=str,
+    default=None,
+    help="CSV file (gzip-compressed if ending with .gz) where to save the rows that cannot be tokenized, with the reason.",
+)
+@click.option(
+    "--partition",
+    type=PARTITION,
+    default=None,
+    help='Process only the K-th of N parts of the input (K from 0 to N-1), and write partial outputs to merge with "rxn-std-partition merge".',
+)
+@click.option(
+    "--n_jobs",
+    "-j",
+    type=int,
+    default=1,
+    help="Number of worker processes for the tokenization.",
+)
 def main(
     input_csv: str,
     src_col: str,
@@ -81,20 +93,42 @@ def main(
     save_dir: str,
     prepend_token: Optional[str],
     train_frac: float,
+    output_format: str,
+    rejects_file: Optional[str],
+    partition: Optional[Partition],
+    n_jobs: int,
 ):
-    "Tokenize SMILES, split dataset and generate source and target files."
+    """Tokenize SMILES, split dataset and generate source and target files.
+
+    With --partition, every partition is split separately with the same
+    fractions; the row indices in the rejects file are relative to the partition.
+    """
     setup_console_logger()
 
+    if partition is not None and rejects_file is not None:
+        rejects_file = str(partition_path(rejects_file, partition))
+
     if not is_path_creatable(f"{save_dir}/src-train.txt"):
         raise ValueError(f'Permissions insufficient to create file in "{save_dir}".')
 
-    # Read csv
-    df: pd.DataFrame = pd.read_csv(input_csv)
-
-    # Tokenize SMILES
-    df[src_col] = [smiles_to_tokens(smi) for smi in df[src_col].values]
-    df[tgt_col] = [smiles_to_tokens(smi) for smi in df[tgt_col].values]
-    df.dropna(inplace=True)  # Drop the rows where smiles_to_tokens returned None
+    # Read the src and tgt columns chunk by chunk, and tokenize SMILES
+    chunks = []
+    n_rows = 0
+    with RejectsRecorder(rejects_file) as rejects, process_pool(n_jobs) as pool:
+        for chunk in iterate_table(
+            input_csv, columns=[src_col, tgt_col], partition=partition
+        ):
+            chunk.index = pd.RangeIndex(n_rows, n_rows + len(chunk))
+            n_rows += len(chunk)
+            failed = np.zeros(len(chunk), dtype=bool)
+            for col in [src_col, tgt_col]:
+                result = tokenize_many(chunk[col].values, pool=pool)
+                rejects.record_batch(result, column=col, rows=chunk.index)
+                chunk[col] = result.results
+                failed |= result.failed
+            # Drop the rows that could not be tokenized
+            chunks.append(chunk[~failed])
+    df: pd.DataFrame = pd.concat(chunks)
 
     # Prepend token
     if prepend_token is not None:
@@ -109,12 +143,15 @@ def main(
     # Save files
     if not Path(save_dir).exists():
         os.mkdir(save_dir)
-    train[src_col].to_csv(f"{save_dir}/src-train.txt", header=False, index=False)
-    train[tgt_col].to_csv(f"{save_dir}/tgt-train.txt", header=False, index=False)
-    test[src_col].to_csv(f"{save_dir}/src-test.txt", header=False, index=False)
-    test[tgt_col].to_csv(f"{save_dir}/tgt-test.txt", header=False, index=False)
-    valid[src_col].to_csv(f"{save_dir}/src-valid.txt", header=False, index=False)
-    valid[tgt_col].to_csv(f"{save_dir}/tgt-valid.txt", header=False, index=False)
+    for split, split_df in [("train", train), ("test", test), ("valid", valid)]:
+        save_src_tgt(
+            src=split_df[src_col].tolist(),
+            tgt=split_df[tgt_col].tolist(),
+            save_dir=save_dir,
+            split=split,
+            output_format=output_format,
+            partition=partition,
+        )
 
 
 if __name__ == "__main__":
@@ -1,4 +1,7 @@
 import logging
+from itertools import islice
+from multiprocessing.pool import Pool
+from typing import Iterable, Iterator, Optional
 
 import click
 from rxn.chemutils.tokenization import detokenize_smiles
@@ -9,12 +12,52 @@ from rxn.utilities.files import (
 )
 from rxn.utilities.logging import setup_console_logger
 
-from rxn_standardization.utils import canonicalize
+from rxn_standardization.guard import MoleculeGuard
+from rxn_standardization.partition import (
+    PARTITION,
+    Partition,
+    open_partition,
+    partition_path,
+)
+from rxn_standardization.rejects import RejectsRecorder
+from rxn_standardization.utils import canonicalize_many, process_pool
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
 
+def iterate_partition_lines(input_file: str, partition: Partition) -> Iterator[str]:
+    with open_partition(input_file, partition) as f:
+        for line in f:
+            yield line.rstrip("\r\n")
+
+
+def canonicalize_in_batches(
+    smiles: Iterable[str],
+    rejects: RejectsRecorder,
+    batch_size: int = 10000,
+    guard: Optional[MoleculeGuard] = None,
+    pool: Optional[Pool] = None,
+) -> Iterator[str]:
+    """
+    Canonicalize SMILES lazily, batch by batch, recording the invalid ones
+    (and the ones that timed out, with a guard). With a pool, every batch
+    is spread over its worker processes.
+    """
+    iterator = iter(smiles)
+    offset = 0
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        result = canonicalize_many(batch, pool=pool, guard=guard)
+        rejects.record_batch(
+            result, column="smiles", rows=range(offset, offset + len(batch))
+        )
+        offset += len(batch)
+        yield from result.results
+
+
 @click.command()
 @click.option(
     "--input_file",
@@ -36,29 +79,101 @@ logger.addHandler(logging.NullHandler())
     default=False,
     help="Whether to canonicalize the SMILES.",
 )
+@click.option(
+    "--rejects_file",
+    type=str,
+    default=None,
+    help="CSV file (gzip-compressed if ending with .gz) where to save the SMILES that cannot be canonicalized.",
+)
+@click.option(
+    "--max_atoms",
+    type=int,
+    default=None,
+    help="Molecules with more atoms are processed in a separate worker process, with a timeout (see --item_timeout).",
+)
+@click.option(
+    "--max_length",
+    type=int,
+    default=None,
+    help="Molecules with longer SMILES strings are processed in a separate worker process, with a timeout (see --item_timeout).",
+)
+@click.option(
+    "--item_timeout",
+    type=float,
+    default=30.0,
+    show_default=True,
+    help="Time, in seconds, after which the processing of a molecule above --max_atoms or --max_length is aborted; it is then left as is and recorded as rejected.",
+)
+@click.option(
+    "--guard_workers",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Number of worker processes for the molecules above --max_atoms or --max_length; they are processed while the other molecules are.",
+)
+@click.option(
+    "--partition",
+    type=PARTITION,
+    default=None,
+    help='Process only the K-th of N parts of the input (K from 0 to N-1), and write partial outputs to merge with "rxn-std-partition merge".',
+)
+@click.option(
+    "--n_jobs",
+    "-j",
+    type=int,
+    default=1,
+    show_default=True,
+    help="Number of worker processes for the canonicalization.",
+)
 def main(
     input_file: str,
     output_file: str,
     canonicalize_output: bool,
+    rejects_file: Optional[str],
+    max_atoms: Optional[int],
+    max_length: Optional[int],
+    item_timeout: float,
+    guard_workers: int,
+    partition: Optional[Partition],
+    n_jobs: int,
 ):
     "Detokenize SMILES."
     setup_console_logger()
 
+    if partition is not None:
+        output_file = str(partition_path(output_file, partition))
+        if rejects_file is not None:
+            rejects_file = str(partition_path(rejects_file, partition))
+
     if not is_path_creatable(f"{output_file}"):
         raise ValueError(f'Permissions insufficient to create file "{output_file}".')
 
     # Read txt
-    tokenized_smiles = iterate_lines_from_file(input_file)
+    tokenized_smiles = (
+        iterate_lines_from_file(input_file)
+        if partition is None
+        else iterate_partition_lines(input_file, partition)
+    )
 
     # Detokenize SMILES
-    detokenized_smiles = (detokenize_smiles(smi) for smi in tokenized_smiles)
+    detokenized_smiles: Iterable[str] = (
+        detokenize_smiles(smi) for smi in tokenized_smiles
+    )
 
     # Prepend token
-    if canonicalize_output:
-        logger.info("Canonicalizing SMILES...")
-        detokenized_smiles = (canonicalize(smi) for smi in detokenized_smiles)
+    with RejectsRecorder(rejects_file) as rejects, MoleculeGuard(
+        max_atoms=max_atoms,
+        max_length=max_length,
+        timeout=item_timeout,
+        n_workers=guard_workers,
+    ) as guard, process_pool(n_jobs) as pool:
+        if canonicalize_output:
+            logger.info("Canonicalizing SMILES...")
+            detokenized_smiles = canonicalize_in_batches(
+                detokenized_smiles, rejects, guard=guard, pool=pool
+            )
 
-    dump_list_to_file(detokenized_smiles, output_file)
+        dump_list_to_file(detokenized_smiles, output_file)
 
 
 if __name__ == "__main__":
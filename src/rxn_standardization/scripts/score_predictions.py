@@ -1,23 +1,151 @@
 import logging
-from typing import Optional
+from collections import Counter
+from multiprocessing import Pool
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
 
 import click
+import numpy as np
 from rxn.chemutils.tokenization import detokenize_smiles
 from rxn.metrics.metrics import top_n_accuracy
 from rxn.utilities.containers import chunker
-from rxn.utilities.files import load_list_from_file
 from rxn.utilities.logging import setup_console_logger
+from rxn.utilities.misc import get_multiplier
 
-from rxn_standardization.utils import (
-    canonicalize,
-    get_sequence_multiplier,
-    remove_stereochemistry,
-)
+from rxn_standardization.equivalence import EquivalenceEngine, EquivalenceTier
+from rxn_standardization.line_index import load_line_index, read_lines
+from rxn_standardization.rejects import Reject, RejectsRecorder, batch_rejects
+from rxn_standardization.utils import remove_stereochemistry_many
 
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
 
+class ScoringTask(NamedTuple):
+    """
+    Scoring of the targets from ``start`` to ``stop`` (exclusive).
+
+    The offsets are the parts of the line indexes of the files for the chunk
+    (see read_lines): the indexes are only loaded in the main process.
+    """
+
+    pred_file: str
+    pred_offsets: np.ndarray
+    tgt_file: str
+    tgt_offsets: np.ndarray
+    src_file: Optional[str]
+    src_offsets: Optional[np.ndarray]
+    start: int
+    stop: int
+    multiplier: int
+    remove_stereo: bool
+    canonicalize_pred: bool
+
+
+class ChunkScore(NamedTuple):
+    """
+    Attributes:
+        correct_for_topn: for each n, number of targets found in the top-n predictions.
+        n_targets: number of scored targets.
+        rejects: SMILES that could not be processed.
+        tier_counts: number of prediction-target pairs resolved by every tier
+            of the equivalence check, when canonicalizing.
+    """
+
+    correct_for_topn: List[int]
+    n_targets: int
+    rejects: List[Reject]
+    tier_counts: Dict[str, int]
+
+
+def score_chunk(task: ScoringTask) -> ChunkScore:
+    """
+    Score one chunk of targets, with their predictions (and sources if
+    ``task.src_file`` is given, to score only the modified compounds).
+    """
+    m = task.multiplier
+    targets = read_lines(task.tgt_file, task.tgt_offsets)
+    predictions = read_lines(task.pred_file, task.pred_offsets)
+    tgt_rows = list(range(task.start, task.stop))
+    pred_rows = list(range(task.start * m, task.stop * m))
+
+    if task.src_file is not None:
+        assert task.src_offsets is not None
+        source = read_lines(task.src_file, task.src_offsets)
+        modified = [t != s for t, s in zip(targets, source)]
+        # In case of top-n accuracy with n>1, ensure that all n predictions are selected:
+        predictions = [
+            p
+            for p_chunk, is_modified in zip(chunker(predictions, m), modified)
+            if is_modified
+            for p in p_chunk
+        ]
+        pred_rows = [
+            r
+            for r_chunk, is_modified in zip(chunker(pred_rows, m), modified)
+            if is_modified
+            for r in r_chunk
+        ]
+        targets = [t for t, is_modified in zip(targets, modified) if is_modified]
+        tgt_rows = [r for r, is_modified in zip(tgt_rows, modified) if is_modified]
+
+    rejects: List[Reject] = []
+    if task.remove_stereo:
+        # When canonicalizing afterwards, the stereo markers are removed from
+        # the strings where possible instead of converting with RDKit twice
+        canonical = not task.canonicalize_pred
+        result = remove_stereochemistry_many(
+            predictions, fast=True, canonical=canonical
+        )
+        rejects.extend(batch_rejects(result, "pred", pred_rows))
+        predictions = result.results
+        result = remove_stereochemistry_many(targets, fast=True, canonical=canonical)
+        rejects.extend(batch_rejects(result, "tgt", tgt_rows))
+        targets = result.results
+
+    correct_for_topn = [0 for _ in range(m)]
+    tier_counts: Dict[str, int] = {}
+    if task.canonicalize_pred:
+        engine = EquivalenceEngine()
+        for gt, gt_row, p_chunk, p_rows in zip(
+            targets, tgt_rows, chunker(predictions, m), chunker(pred_rows, m)
+        ):
+            # The predictions after the first correct one need not be checked
+            gt_rejected = False
+            for i, (pred, pred_row) in enumerate(zip(p_chunk, p_rows)):
+                comparison = engine.compare(pred, gt)
+                pred_reason, gt_reason = comparison.reasons
+                if pred_reason is not None:
+                    rejects.append(
+                        (pred_row, "pred", pred_reason, detokenize_smiles(pred))
+                    )
+                if gt_reason is not None and not gt_rejected:
+                    rejects.append((gt_row, "tgt", gt_reason, detokenize_smiles(gt)))
+                    gt_rejected = True
+                if comparison.equivalent:
+                    for j in range(i, m):
+                        correct_for_topn[j] += 1
+                    break
+        tier_counts = {tier.value: n for tier, n in engine.tier_counts.items()}
+    elif targets:
+        accuracy = top_n_accuracy(targets, predictions)
+        correct_for_topn = [round(accuracy[i + 1] * len(targets)) for i in range(m)]
+
+    return ChunkScore(
+        correct_for_topn=correct_for_topn,
+        n_targets=len(targets),
+        rejects=rejects,
+        tier_counts=tier_counts,
+    )
+
+
+def score_in_chunks(tasks: Iterable[ScoringTask], n_jobs: int) -> Iterator[ChunkScore]:
+    if n_jobs == 1:
+        yield from map(score_chunk, tasks)
+        return
+    with Pool(n_jobs) as pool:
+        yield from pool.imap(score_chunk, tasks)
+
+
 @click.command()
 @click.option(
     "--pred_file",
@@ -58,6 +186,25 @@ logger.addHandler(logging.NullHandler())
     default=True,
     help="Whether to canonicalize predictions and targets before comparing.",
 )
+@click.option(
+    "--rejects_file",
+    type=str,
+    default=None,
+    help="CSV file (gzip-compressed if ending with .gz) where to save the SMILES that cannot be processed, with the reason.",
+)
+@click.option(
+    "--n_jobs",
+    "-j",
+    type=int,
+    default=1,
+    help="Number of worker processes.",
+)
+@click.option(
+    "--chunk_size",
+    type=int,
+    default=10000,
+    help="Number of targets (with their predictions) scored at once by a worker.",
+)
 def main(
     pred_file: str,
     tgt_file: str,
@@ -65,41 +212,91 @@ def main(
     remove_stereo: bool,
     modified_score: bool,
     canonicalize_pred: bool,
+    rejects_file: Optional[str],
+    n_jobs: int,
+    chunk_size: int,
 ):
+    """
+    Print the top-n accuracy of the predictions.
+
+    The files are not loaded into memory: a line-offset index is built (and
+    cached next to each file, as "<file>.lidx.npy"), and aligned chunks of
+    predictions, targets and sources are scored independently.
+    """
     setup_console_logger()
-    predictions = load_list_from_file(pred_file)
-    targets = load_list_from_file(tgt_file)
 
+    if modified_score and src_file is None:
+        raise ValueError(
+            "The source file must be provided to calculate the modified score"
+        )
+
+    # The indexes are loaded (or built) once, and every task is given the
+    # offsets of its chunk
+    pred_index = load_line_index(pred_file)
+    tgt_index = load_line_index(tgt_file)
+    n_predictions, n_targets = len(pred_index) - 1, len(tgt_index) - 1
+    # In case of top-n accuracy with n>1:
+    multiplier = get_multiplier(n_targets, n_predictions)
+    src_index: Optional[np.ndarray] = None
     if modified_score:
-        if src_file is None:
+        assert src_file is not None
+        src_index = load_line_index(src_file)
+        if len(src_index) - 1 != n_targets:
             raise ValueError(
-                "The source file must be provided to calculate the modified score"
+                f"The source file has {len(src_index) - 1} lines, expected {n_targets}."
             )
-        source = load_list_from_file(src_file)
-        multiplier = get_sequence_multiplier(
-            targets, predictions
-        )  # In case of top-n accuracy with n>1:
-        prediction_chuncks = chunker(predictions, chunk_size=multiplier)
-        # In case of top-n accuracy with n>1, ensure that all n predictions are selected:
-        predictions = [
-            p
-            for p_chunk, t, s in zip(prediction_chuncks, targets, source)
-            if t != s
-            for p in p_chunk
-        ]
-        targets = [t for t, s in zip(targets, source) if t != s]
 
-    if remove_stereo:
-        logger.info("Removing stereochemistry...")
-        predictions = [remove_stereochemistry(smi) for smi in predictions]
-        targets = [remove_stereochemistry(smi) for smi in targets]
+    def make_task(start: int) -> ScoringTask:
+        stop = min(start + chunk_size, n_targets)
+        return ScoringTask(
+            pred_file=pred_file,
+            pred_offsets=np.array(
+                pred_index[start * multiplier : stop * multiplier + 1]
+            ),
+            tgt_file=tgt_file,
+            tgt_offsets=np.array(tgt_index[start : stop + 1]),
+            src_file=src_file if src_index is not None else None,
+            src_offsets=(
+                np.array(src_index[start : stop + 1]) if src_index is not None else None
+            ),
+            start=start,
+            stop=stop,
+            multiplier=multiplier,
+            remove_stereo=remove_stereo,
+            canonicalize_pred=canonicalize_pred,
+        )
+
+    tasks = map(make_task, range(0, n_targets, chunk_size))
+    n_chunks = -(-n_targets // chunk_size)
 
-    if canonicalize_pred:
-        logger.info("Canonicalizing SMILES...")
-        predictions = [canonicalize(detokenize_smiles(smi)) for smi in predictions]
-        targets = [canonicalize(detokenize_smiles(smi)) for smi in targets]
+    logger.info(f"Scoring {n_targets} targets in {n_chunks} chunks...")
+    correct_for_topn = [0 for _ in range(multiplier)]
+    n_scored = 0
+    tier_counts: Dict[str, int] = Counter()
+    with RejectsRecorder(rejects_file) as rejects:
+        for chunk_score in score_in_chunks(tasks, n_jobs=n_jobs):
+            for i, n_correct in enumerate(chunk_score.correct_for_topn):
+                correct_for_topn[i] += n_correct
+            n_scored += chunk_score.n_targets
+            tier_counts.update(chunk_score.tier_counts)
+            for reject in chunk_score.rejects:
+                rejects.record(*reject)
+
+    if tier_counts:
+        logger.info(
+            "Prediction-target pairs resolved by tier: "
+            + ", ".join(
+                f"{tier.value}: {tier_counts[tier.value]}" for tier in EquivalenceTier
+            )
+            + "."
+        )
 
-    print(top_n_accuracy(targets, predictions))
+    if n_scored == 0:
+        raise ValueError("No targets to score.")
+    accuracy: Dict[int, float] = {
+        i + 1: correct_for_topn[i] / n_scored for i in range(multiplier)
+    }
+    print(accuracy)
 
 
 if __name__ == "__main__":
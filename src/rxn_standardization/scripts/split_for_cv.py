@@ -6,10 +6,10 @@ from typing import Optional
 import click
 import pandas as pd
 from rxn.chemutils.tokenization import tokenize_smiles
-from rxn.utilities.files import dump_list_to_file, load_list_from_file
 from rxn.utilities.logging import setup_console_logger
 from sklearn.model_selection import KFold
 
+from rxn_standardization.tables import TABLE_FORMATS, read_table, save_src_tgt
 from rxn_standardization.utils import augment, process_input
 
 logger = logging.getLogger(__name__)
@@ -29,7 +29,21 @@ def smiles_to_tokens(smiles: str) -> str:
     "-i",
     type=str,
     required=True,
-    help="Path to the input file with non-standardized and standardized SMILES.",
+    help="Path to the input file with non-standardized and standardized SMILES (CSV, Parquet or Arrow IPC, from the extension).",
+)
+@click.option(
+    "--src_col",
+    "-sc",
+    type=str,
+    default=None,
+    help="Name of column holding source SMILES strings. Defaults to the first column.",
+)
+@click.option(
+    "--tgt_col",
+    "-tc",
+    type=str,
+    default=None,
+    help="Name of column holding target SMILES strings. Defaults to the second column.",
 )
 @click.option(
     "--save_dir",
@@ -66,22 +80,40 @@ def smiles_to_tokens(smiles: str) -> str:
     required=True,
     help="Size of held-out test set.",
 )
+@click.option(
+    "--output_format",
+    type=click.Choice(["txt", *TABLE_FORMATS]),
+    default="txt",
+    help='Format of the output: "txt" for the src/tgt files expected by OpenNMT, or one table per split with "src" and "tgt" columns.',
+)
 def main(
     input_csv: str,
+    src_col: Optional[str],
+    tgt_col: Optional[str],
     save_dir: str,
     test_size: int,
     prepend_token: Optional[str],
     augmentation: bool,
     augment_for_tautomers: bool,
+    output_format: str,
 ):
     setup_console_logger()
 
-    all_smiles = load_list_from_file(input_csv)[1:]  # skipping the first row
+    if src_col is None or tgt_col is None:
+        # Columns given by their position, as for the CSV files without
+        # "src" and "tgt" headers
+        df = read_table(input_csv)
+        src_values = df[src_col] if src_col is not None else df.iloc[:, 0]
+        tgt_values = df[tgt_col] if tgt_col is not None else df.iloc[:, 1]
+    else:
+        df = read_table(input_csv, columns=[src_col, tgt_col])
+        src_values, tgt_values = df[src_col], df[tgt_col]
+    all_smiles = list(zip(src_values, tgt_values))
     random.shuffle(all_smiles)
 
     test_set = all_smiles[:test_size]
-    src_test = [smiles_to_tokens(s.split(",")[0]) for s in test_set]
-    tgt_test = [smiles_to_tokens(s.split(",")[1]) for s in test_set]
+    src_test = [smiles_to_tokens(s[0]) for s in test_set]
+    tgt_test = [smiles_to_tokens(s[1]) for s in test_set]
 
     if augment_for_tautomers:
         src_test.extend(tgt_test)
@@ -95,11 +127,11 @@ def main(
         valid_set = [train_valid_sets[k] for k in test_index]
 
         # Separate into src, tgt and tokenize
-        src_train = [smiles_to_tokens(s.split(",")[0]) for s in train_set]
-        tgt_train = [smiles_to_tokens(s.split(",")[1]) for s in train_set]
+        src_train = [smiles_to_tokens(s[0]) for s in train_set]
+        tgt_train = [smiles_to_tokens(s[1]) for s in train_set]
 
-        src_valid = [smiles_to_tokens(s.split(",")[0]) for s in valid_set]
-        tgt_valid = [smiles_to_tokens(s.split(",")[1]) for s in valid_set]
+        src_valid = [smiles_to_tokens(s[0]) for s in valid_set]
+        tgt_valid = [smiles_to_tokens(s[1]) for s in valid_set]
 
         # Duplicate each molecule entry by tgt,tgt (for tautomers only)
         if augment_for_tautomers:
@@ -133,12 +165,9 @@ def main(
         save_dir_for_fold = Path(f"{save_dir}-{i}")
         save_dir_for_fold.mkdir(exist_ok=True)
 
-        dump_list_to_file(src_train, save_dir_for_fold / "src-train.txt")
-        dump_list_to_file(tgt_train, save_dir_for_fold / "tgt-train.txt")
-        dump_list_to_file(src_valid, save_dir_for_fold / "src-valid.txt")
-        dump_list_to_file(tgt_valid, save_dir_for_fold / "tgt-valid.txt")
-        dump_list_to_file(src_test, save_dir_for_fold / "src-test.txt")
-        dump_list_to_file(tgt_test, save_dir_for_fold / "tgt-test.txt")
+        save_src_tgt(src_train, tgt_train, save_dir_for_fold, "train", output_format)
+        save_src_tgt(src_valid, tgt_valid, save_dir_for_fold, "valid", output_format)
+        save_src_tgt(src_test, tgt_test, save_dir_for_fold, "test", output_format)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,138 @@
+import json
+import logging
+from typing import Optional, Tuple
+
+import click
+from rxn.utilities.logging import setup_console_logger
+
+from rxn_standardization.line_index import load_line_index
+from rxn_standardization.partition import PARTITION, Partition, partition_path
+from rxn_standardization.stats import DatasetStats, compute_stats
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+
+def _write_stats(stats: DatasetStats, output_file: str) -> None:
+    with open(output_file, "wt") as f:
+        json.dump(
+            {"summary": stats.summary(), "sketches": stats.to_dict()}, f, indent=2
+        )
+    logger.info(f'Statistics saved to "{output_file}".')
+
+
+@click.group()
+def main() -> None:
+    """
+    Statistics of tokenized src / tgt files: token-length distributions,
+    element and charge frequencies, most frequent tokens, number of unique
+    SMILES (estimated), and fraction of modified compounds.
+
+    The results saved by "compute" (for instance for several partitions of
+    the files) can be combined with "merge".
+    """
+    setup_console_logger()
+
+
+@main.command()
+@click.option(
+    "--src_file",
+    "-s",
+    type=str,
+    required=True,
+    help="File with the tokenized source SMILES, one per line.",
+)
+@click.option(
+    "--tgt_file",
+    "-t",
+    type=str,
+    required=False,
+    help="File with the tokenized target SMILES, aligned with the source file.",
+)
+@click.option(
+    "--output_file",
+    "-o",
+    type=str,
+    required=True,
+    help="JSON file where to save the statistics.",
+)
+@click.option(
+    "--prepend_token",
+    type=str,
+    default=None,
+    help="Token prepended to the source SMILES (f.i. [PUBCHEM]), ignored in the statistics.",
+)
+@click.option(
+    "--n_jobs",
+    "-j",
+    type=int,
+    default=1,
+    help="Number of worker processes.",
+)
+@click.option(
+    "--chunk_size",
+    type=int,
+    default=100000,
+    help="Number of lines processed at once by a worker.",
+)
+@click.option(
+    "--partition",
+    type=PARTITION,
+    default=None,
+    help='Only process the partition K/N of the lines (K from 0 to N-1), and write the output to "<output>.part-K-of-N.json".',
+)
+def compute(
+    src_file: str,
+    tgt_file: Optional[str],
+    output_file: str,
+    prepend_token: Optional[str],
+    n_jobs: int,
+    chunk_size: int,
+    partition: Optional[Partition],
+) -> None:
+    """Compute the statistics of the files in one streaming pass."""
+    files = {"src": src_file}
+    if tgt_file is not None:
+        files["tgt"] = tgt_file
+
+    # Loaded once here, both to partition the lines and to compute the stats
+    line_indexes = {column: load_line_index(path) for column, path in files.items()}
+    start, stop = 0, None
+    if partition is not None:
+        n_lines = len(line_indexes["src"]) - 1
+        start = n_lines * partition.part // partition.total
+        stop = n_lines * (partition.part + 1) // partition.total
+        output_file = str(partition_path(output_file, partition))
+
+    stats = compute_stats(
+        files,
+        start=start,
+        stop=stop,
+        chunk_size=chunk_size,
+        n_jobs=n_jobs,
+        prepend_token=prepend_token,
+        line_indexes=line_indexes,
+    )
+    _write_stats(stats, output_file)
+
+
+@main.command()
+@click.argument("input_files", nargs=-1, required=True)
+@click.option(
+    "--output_file",
+    "-o",
+    type=str,
+    required=True,
+    help="JSON file where to save the merged statistics.",
+)
+def merge(input_files: Tuple[str, ...], output_file: str) -> None:
+    """Merge statistics saved by "compute", f.i. for several partitions."""
+    stats = DatasetStats()
+    for input_file in input_files:
+        with open(input_file, "rt") as f:
+            stats.merge(DatasetStats.from_dict(json.load(f)["sketches"]))
+    _write_stats(stats, output_file)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,405 @@
+"""
+Compact column store of SMILES strings, to pass them to process-pool workers
+and to get their results back.
+
+The strings are encoded in one contiguous UTF-8 buffer, each followed by a
+line break, with an int64 array of offsets: item ``i`` starts at byte
+``offsets[i]`` and ends before the line break at ``offsets[i + 1] - 1``. The
+line breaks allow decoding a range of items at once, by splitting the decoded
+range instead of decoding the items one by one. Both buffers are placed in
+one ``multiprocessing.shared_memory`` segment, so that the workers are only
+sent a small handle with a range of indices, and read the strings from the
+segment instead of unpickling them one by one.
+
+The workers write their results to an OutputStore, another segment with one
+region per range of items, and only send back the size of what they wrote;
+the results that do not fit in their region are sent back as usual.
+
+Where shared memory is not available (Python < 3.8, systems without /dev/shm,
+or no space left in it), the stores are kept in the current process, the handles carry a
+copy of the buffers for their range, and the workers send back their results.
+"""
+
+import logging
+import mmap
+import os
+from types import TracebackType
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple, Type
+
+import numpy as np
+
+try:
+    from multiprocessing import shared_memory
+except ImportError:  # Python < 3.8
+    shared_memory = None  # type: ignore[assignment]
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+_OFFSET_SIZE = np.dtype(np.int64).itemsize
+
+# Directory of the POSIX shared-memory segments, on Linux
+_SHM_DIR = "/dev/shm"
+
+
+def _shared_memory_available() -> bool:
+    return shared_memory is not None and os.path.isdir(_SHM_DIR)
+
+
+class StoreHandle(NamedTuple):
+    """
+    Picklable reference to the items ``start`` to ``stop`` (exclusive) of a
+    SmilesStore, to read them in another process with read_strings.
+
+    Attributes:
+        start: first item of the range.
+        stop: item after the last one of the range.
+        n_items: number of items of the store, giving the size of the offsets
+            at the beginning of the shared-memory segment.
+        shm_name: name of the shared-memory segment; None if not shared.
+        data: UTF-8 buffer of the range, if not shared.
+    """
+
+    start: int
+    stop: int
+    n_items: int
+    shm_name: Optional[str] = None
+    data: Optional[bytes] = None
+
+
+def _decode(data: bytes) -> List[str]:
+    """Decode a range of items, including the line break after the last one."""
+    return data[:-1].decode("utf-8").split("\n")
+
+
+class SmilesStore:
+    """
+    SMILES strings in one UTF-8 buffer with int64 offsets, in shared memory
+    if possible.
+
+    The process creating the store owns the shared-memory segment, and
+    releases it on ``close``.
+
+    Example:
+        with SmilesStore.from_strings(smiles) as store:
+            results = pool.map(process_range, [store.handle(0, 1000), ...])
+    """
+
+    def __init__(self, offsets: np.ndarray, data: bytes, shared: bool = True):
+        """
+        Args:
+            offsets: int64 offsets of the items in the data, starting with 0.
+            data: UTF-8 buffer with all the items, each followed by a line break.
+            shared: whether to copy the buffers to a shared-memory segment.
+        """
+        self.n_items = len(offsets) - 1
+        self._shm: Optional[Any] = None
+        self._offsets: np.ndarray = offsets
+        self._data: Any = data
+
+        if shared and _shared_memory_available() and self.n_items > 0:
+            offsets_size = _OFFSET_SIZE * len(offsets)
+            try:
+                self._shm = shared_memory.SharedMemory(
+                    create=True, size=offsets_size + len(data)
+                )
+            except OSError as e:
+                logger.debug(f"Shared memory not available ({e}); store kept local.")
+            else:
+                buf = self._shm.buf
+                assert buf is not None
+                self._offsets = np.ndarray(len(offsets), dtype=np.int64, buffer=buf)
+                self._offsets[:] = offsets
+                self._data = buf[offsets_size : offsets_size + len(data)]
+                self._data[:] = data
+
+    @classmethod
+    def from_strings(cls, smiles: Sequence[str], shared: bool = True) -> "SmilesStore":
+        """
+        Raises:
+            TypeError: if some items are not strings.
+            ValueError: if some items contain line breaks.
+        """
+        data = ("\n".join(smiles) + "\n").encode("utf-8") if smiles else b""
+        line_ends = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord("\n"))
+        if len(line_ends) != len(smiles):
+            raise ValueError("The items of a SmilesStore cannot contain line breaks.")
+        offsets = np.zeros(len(smiles) + 1, dtype=np.int64)
+        offsets[1:] = line_ends + 1
+        return cls(offsets, data, shared=shared)
+
+    @property
+    def shared(self) -> bool:
+        return self._shm is not None
+
+    def __len__(self) -> int:
+        return self.n_items
+
+    def nbytes(self, start: int, stop: int) -> int:
+        """Size of the items from ``start`` to ``stop`` (exclusive), with their line breaks."""
+        stop = min(stop, self.n_items)
+        if start >= stop:
+            return 0
+        return int(self._offsets[stop] - self._offsets[start])
+
+    def __getitem__(self, index: int) -> str:
+        if not -self.n_items <= index < self.n_items:
+            raise IndexError("SmilesStore index out of range")
+        index %= self.n_items
+        return self.slice(index, index + 1)[0]
+
+    def slice(self, start: int, stop: int) -> List[str]:
+        """Get the items from ``start`` to ``stop`` (exclusive)."""
+        if start >= min(stop, self.n_items):
+            return []
+        stop = min(stop, self.n_items)
+        return _decode(bytes(self._data[self._offsets[start] : self._offsets[stop]]))
+
+    def handle(self, start: int = 0, stop: Optional[int] = None) -> StoreHandle:
+        """Get a handle on the items from ``start`` to ``stop`` (exclusive)."""
+        stop = self.n_items if stop is None else min(stop, self.n_items)
+        if self._shm is not None:
+            return StoreHandle(start, stop, self.n_items, shm_name=self._shm.name)
+        data = b""
+        if start < stop:
+            data = bytes(self._data[self._offsets[start] : self._offsets[stop]])
+        return StoreHandle(start, stop, self.n_items, data=data)
+
+    def close(self) -> None:
+        """Release the shared-memory segment, if any."""
+        if self._shm is None:
+            return
+        # The views on the segment must be released before closing it
+        self._offsets = np.zeros(1, dtype=np.int64)
+        self._data.release()
+        self._data = b""
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+    def __enter__(self) -> "SmilesStore":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+
+def _attach(name: str) -> mmap.mmap:
+    """
+    Map the shared-memory segment of a store created by another process.
+
+    The process creating a store owns its segment: it is the only one
+    tracking and unlinking it. The workers therefore map the file of the
+    segment in /dev/shm instead of attaching it with ``SharedMemory``, which
+    registers the segment with their resource tracker (before Python 3.13):
+    the tracker of a worker started before the segment was created unlinks
+    it when the worker exits.
+    """
+    with open(os.path.join(_SHM_DIR, name), "r+b") as f:
+        return mmap.mmap(f.fileno(), 0)
+
+
+def read_strings(handle: StoreHandle) -> List[str]:
+    """Read the items of a handle, f.i. in a worker process."""
+    if handle.start >= handle.stop:
+        return []
+    if handle.shm_name is None:
+        assert handle.data is not None
+        return _decode(handle.data)
+
+    segment = _attach(handle.shm_name)
+    buf = memoryview(segment)
+    try:
+        offsets = np.ndarray(handle.n_items + 1, dtype=np.int64, buffer=buf)
+        start, stop = offsets[handle.start], offsets[handle.stop]
+        del offsets
+        data_start = _OFFSET_SIZE * (handle.n_items + 1)
+        data = bytes(buf[data_start + start : data_start + stop])
+    finally:
+        buf.release()
+        segment.close()
+    return _decode(data)
+
+
+class OutputHandle(NamedTuple):
+    """
+    Picklable reference to the region of an OutputStore where the results for
+    the items ``start`` to ``stop`` (exclusive) are written with write_output.
+
+    Attributes:
+        start: first item of the range.
+        stop: item after the last one of the range.
+        n_items: number of items of the store, giving the size of the codes
+            at the beginning of the shared-memory segment.
+        data_start: start of the region of the range, after the codes.
+        capacity: size of the region of the range, in bytes.
+        shm_name: name of the shared-memory segment; None if not shared.
+    """
+
+    start: int
+    stop: int
+    n_items: int
+    data_start: int
+    capacity: int
+    shm_name: Optional[str] = None
+
+
+class WrittenOutput(NamedTuple):
+    """
+    Returned by write_output, to read the results with OutputStore.read.
+
+    Attributes:
+        n_bytes: size of the results, with their line breaks.
+        data: the results, if they were not written to the shared memory.
+        codes: the codes, if they were not written to the shared memory.
+    """
+
+    n_bytes: int
+    data: Optional[bytes] = None
+    codes: Optional[np.ndarray] = None
+
+
+class OutputStore:
+    """
+    Shared-memory segment in which worker processes write their results for
+    ranges of items: one uint8 code per item (f.i. a failure reason), and the
+    result strings of every range, in the same format as in a SmilesStore,
+    in a region of fixed capacity.
+
+    Example:
+        with OutputStore(n_items, ranges, capacities) as output:
+            written = pool.starmap(process_range, zip(input_handles, output.handles()))
+            for handle, w in zip(output.handles(), written):
+                results, codes = output.read(handle, w)
+    """
+
+    def __init__(
+        self,
+        n_items: int,
+        ranges: Sequence[Tuple[int, int]],
+        capacities: Sequence[int],
+        shared: bool = True,
+    ):
+        """
+        Args:
+            n_items: number of items.
+            ranges: start and stop (exclusive) of the ranges of items.
+            capacities: size of the region of every range, in bytes.
+            shared: whether to allocate a shared-memory segment; without it,
+                the workers send back their results.
+        """
+        self.n_items = n_items
+        self._ranges = list(ranges)
+        self._capacities = list(capacities)
+        self._data_starts = np.concatenate(
+            [[0], np.cumsum(self._capacities, dtype=np.int64)]
+        ).tolist()
+        self._shm: Optional[Any] = None
+        self._codes: np.ndarray = np.zeros(0, dtype=np.uint8)
+        self._data: Any = b""
+
+        if shared and _shared_memory_available() and n_items > 0:
+            try:
+                self._shm = shared_memory.SharedMemory(
+                    create=True, size=n_items + self._data_starts[-1]
+                )
+            except OSError as e:
+                logger.debug(f"Shared memory not available ({e}); results sent back.")
+            else:
+                buf = self._shm.buf
+                assert buf is not None
+                self._codes = np.ndarray(n_items, dtype=np.uint8, buffer=buf)
+                self._data = buf[n_items:]
+
+    @property
+    def shared(self) -> bool:
+        return self._shm is not None
+
+    def handles(self) -> List[OutputHandle]:
+        """Get the handles of the regions of the ranges, in order."""
+        shm_name = None if self._shm is None else self._shm.name
+        return [
+            OutputHandle(start, stop, self.n_items, data_start, capacity, shm_name)
+            for (start, stop), data_start, capacity in zip(
+                self._ranges, self._data_starts, self._capacities
+            )
+        ]
+
+    def read(
+        self, handle: OutputHandle, written: WrittenOutput
+    ) -> Tuple[List[str], np.ndarray]:
+        """Get the results and codes written by write_output for a range."""
+        if handle.start >= handle.stop:
+            return [], np.zeros(0, dtype=np.uint8)
+        if written.data is not None:
+            data = written.data
+        else:
+            data = bytes(
+                self._data[handle.data_start : handle.data_start + written.n_bytes]
+            )
+        if written.codes is not None:
+            codes = written.codes
+        else:
+            codes = self._codes[handle.start : handle.stop].copy()
+        return _decode(data), codes
+
+    def close(self) -> None:
+        """Release the shared-memory segment, if any."""
+        if self._shm is None:
+            return
+        # The views on the segment must be released before closing it
+        self._codes = np.zeros(0, dtype=np.uint8)
+        self._data.release()
+        self._data = b""
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+    def __enter__(self) -> "OutputStore":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+
+def write_output(
+    handle: OutputHandle, results: Sequence[str], codes: np.ndarray
+) -> WrittenOutput:
+    """
+    Write the results and codes for the range of a handle, f.i. in a worker
+    process. The results that do not fit in the region of the range are
+    returned instead.
+
+    Raises:
+        ValueError: if some results contain line breaks.
+    """
+    data = ("\n".join(results) + "\n").encode("utf-8") if results else b""
+    if data.count(b"\n") != len(results):
+        raise ValueError("The items of an OutputStore cannot contain line breaks.")
+    if handle.shm_name is None:
+        return WrittenOutput(len(data), data=data, codes=codes)
+
+    segment = _attach(handle.shm_name)
+    buf = memoryview(segment)
+    try:
+        all_codes = np.ndarray(handle.n_items, dtype=np.uint8, buffer=buf)
+        all_codes[handle.start : handle.stop] = codes
+        del all_codes
+        if len(data) > handle.capacity:
+            return WrittenOutput(len(data), data=data)
+        data_start = handle.n_items + handle.data_start
+        buf[data_start : data_start + len(data)] = data
+    finally:
+        buf.release()
+        segment.close()
+    return WrittenOutput(len(data))
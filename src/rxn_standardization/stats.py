@@ -0,0 +1,513 @@
+"""
+Streaming statistics of tokenized datasets, with mergeable summaries.
+
+The statistics of a dataset are computed chunk by chunk (possibly in several
+processes, or for several partitions of the files) and the partial results
+are merged: the histograms, element / charge counts, HyperLogLog registers
+and count-min tables combine exactly, i.e. merging gives the same result as
+a single pass over the whole dataset.
+"""
+
+import base64
+import math
+import re
+from collections import Counter
+from multiprocessing import Pool
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+import numpy as np
+from rxn.utilities.files import PathLike
+
+from rxn_standardization.line_index import load_line_index, read_lines
+from rxn_standardization.utils import stable_hash
+
+_ORGANIC_ATOM_REGEX = re.compile(r"^(Br|Cl|[BCNOPSFI]|[bcnops])$")
+_BRACKET_ELEMENT_REGEX = re.compile(r"^\[\d*([A-Z][a-z]?|[a-z][a-z]?)")
+_BRACKET_CHARGE_REGEX = re.compile(r"([+-]+\d*)\]$")
+_CHARGE_REGEX = re.compile(r"^[+-]+\d*$")
+_ELEMENT_REGEX = re.compile(r"^([A-Z][a-z]?|[a-z][a-z]?)$")
+
+
+def _encode_array(array: np.ndarray) -> str:
+    return base64.b64encode(array.tobytes()).decode("ascii")
+
+
+def _decode_array(data: str, dtype: str) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(data), dtype=dtype).copy()
+
+
+def _bit_length(values: np.ndarray) -> np.ndarray:
+    """Vectorized ``int.bit_length`` for an array of uint64."""
+    values = values.copy()
+    lengths = np.zeros(len(values), dtype=np.int64)
+    for shift in (32, 16, 8, 4, 2, 1):
+        mask = values >= np.uint64(1 << shift)
+        lengths[mask] += shift
+        values[mask] >>= np.uint64(shift)
+    lengths += (values > 0).astype(np.int64)
+    return lengths
+
+
+class Histogram:
+    """Exact histogram of integer values (f.i. the number of tokens per line)."""
+
+    def __init__(self, counts: Optional[Dict[int, int]] = None):
+        self.counts: "Counter[int]" = Counter(counts or {})
+
+    def add(self, values: Iterable[int]) -> None:
+        self.counts.update(values)
+
+    def merge(self, other: "Histogram") -> None:
+        self.counts.update(other.counts)
+
+    @property
+    def total(self) -> int:
+        return sum(self.counts.values())
+
+    def quantile(self, q: float) -> Optional[int]:
+        """Smallest value such that at least a fraction ``q`` of the values is lower or equal."""
+        total = self.total
+        cumulated = 0
+        for value in sorted(self.counts):
+            cumulated += self.counts[value]
+            if cumulated >= q * total:
+                return value
+        return None
+
+    def summary(self) -> Dict[str, Any]:
+        total = self.total
+        if total == 0:
+            return {"count": 0}
+        return {
+            "count": total,
+            "mean": sum(v * n for v, n in self.counts.items()) / total,
+            "min": min(self.counts),
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "max": max(self.counts),
+        }
+
+    def to_dict(self) -> Dict[str, int]:
+        return {str(value): n for value, n in sorted(self.counts.items())}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, int]) -> "Histogram":
+        return cls({int(value): n for value, n in data.items()})
+
+
+class HyperLogLog:
+    """
+    HyperLogLog sketch for the approximate number of distinct items, with a
+    relative standard error of about 1.04 / sqrt(2 ** precision).
+    """
+
+    def __init__(self, precision: int = 14, registers: Optional[np.ndarray] = None):
+        if not 4 <= precision <= 18:
+            raise ValueError("The HyperLogLog precision must be between 4 and 18.")
+        self.precision = precision
+        self.registers = (
+            np.zeros(1 << precision, dtype=np.uint8) if registers is None else registers
+        )
+
+    def add_hashes(self, hashes: np.ndarray) -> None:
+        """Add items given by their 64-bit hashes (see stable_hash)."""
+        p = self.precision
+        indices = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        remainder = hashes & np.uint64((1 << (64 - p)) - 1)
+        ranks = (64 - p) - _bit_length(remainder) + 1
+        np.maximum.at(self.registers, indices, ranks.astype(np.uint8))
+
+    def add(self, items: Iterable[str]) -> None:
+        self.add_hashes(stable_hash(items))
+
+    def merge(self, other: "HyperLogLog") -> None:
+        if other.precision != self.precision:
+            raise ValueError(
+                "Cannot merge HyperLogLog sketches of different precisions."
+            )
+        np.maximum(self.registers, other.registers, out=self.registers)
+
+    def estimate(self) -> float:
+        m = len(self.registers)
+        alpha = 0.7213 / (1 + 1.079 / m)
+        raw = (
+            alpha * m * m / float(np.sum(np.power(2.0, -self.registers.astype(float))))
+        )
+        n_zeros = int(np.count_nonzero(self.registers == 0))
+        if raw <= 2.5 * m and n_zeros > 0:
+            # Linear counting for small cardinalities
+            return m * math.log(m / n_zeros)
+        return raw
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"precision": self.precision, "registers": _encode_array(self.registers)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HyperLogLog":
+        return cls(data["precision"], _decode_array(data["registers"], "uint8"))
+
+
+class CountMinSketch:
+    """
+    Count-min sketch of item frequencies (overestimated by at most
+    2 * total / width with probability 1 - 0.5 ** depth), tracking the
+    ``top_k`` most frequent items.
+
+    The counts merge exactly; the top items are the most frequent ones among
+    the candidates seen in the merged sketches.
+    """
+
+    def __init__(
+        self,
+        width: int = 2048,
+        depth: int = 4,
+        top_k: int = 50,
+        table: Optional[np.ndarray] = None,
+        candidates: Iterable[str] = (),
+    ):
+        self.width = width
+        self.depth = depth
+        self.top_k = top_k
+        self.table = (
+            np.zeros((depth, width), dtype=np.int64) if table is None else table
+        )
+        self.candidates: List[str] = list(candidates)
+
+    def _indices(self, hashes: np.ndarray) -> np.ndarray:
+        # Double hashing: one index per row, from the two halves of the hash
+        h1 = hashes & np.uint64(0xFFFFFFFF)
+        h2 = hashes >> np.uint64(32)
+        rows = np.arange(self.depth, dtype=np.uint64)[:, None]
+        return ((h1[None, :] + rows * h2[None, :]) % np.uint64(self.width)).astype(
+            np.int64
+        )
+
+    def add_counts(self, counts: Dict[str, int]) -> None:
+        """Add items with their number of occurrences."""
+        if not counts:
+            return
+        items = list(counts)
+        indices = self._indices(stable_hash(items))
+        values = np.array([counts[item] for item in items], dtype=np.int64)
+        for row in range(self.depth):
+            np.add.at(self.table[row], indices[row], values)
+        self._update_candidates(items)
+
+    def estimate(self, items: List[str]) -> np.ndarray:
+        if not items:
+            return np.zeros(0, dtype=np.int64)
+        indices = self._indices(stable_hash(items))
+        return np.min(self.table[np.arange(self.depth)[:, None], indices], axis=0)
+
+    def _update_candidates(self, items: Iterable[str]) -> None:
+        candidates = list(dict.fromkeys([*self.candidates, *items]))
+        estimates = self.estimate(candidates)
+        order = sorted(
+            range(len(candidates)), key=lambda i: (-estimates[i], candidates[i])
+        )
+        self.candidates = [candidates[i] for i in order[: self.top_k]]
+
+    def merge(self, other: "CountMinSketch") -> None:
+        if (other.width, other.depth) != (self.width, self.depth):
+            raise ValueError("Cannot merge count-min sketches of different sizes.")
+        self.table += other.table
+        self._update_candidates(other.candidates)
+
+    def top(self) -> List[Tuple[str, int]]:
+        """The most frequent items, with their estimated counts."""
+        estimates = self.estimate(self.candidates)
+        return [(item, int(n)) for item, n in zip(self.candidates, estimates)]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "width": self.width,
+            "depth": self.depth,
+            "top_k": self.top_k,
+            "table": _encode_array(self.table.astype("<i8")),
+            "candidates": self.candidates,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CountMinSketch":
+        table = _decode_array(data["table"], "<i8").reshape(
+            data["depth"], data["width"]
+        )
+        return cls(
+            width=data["width"],
+            depth=data["depth"],
+            top_k=data["top_k"],
+            table=table.astype(np.int64),
+            candidates=data["candidates"],
+        )
+
+
+def count_elements_and_charges(
+    tokens: List[str],
+) -> Tuple[Dict[str, int], Dict[str, int]]:
+    """
+    Count the elements and charges in the tokens of a SMILES string, for
+    bracket atoms either as single tokens ("[NH4+]") or split by
+    process_token ("[ Na + ]"). Aromatic elements are counted with the
+    aliphatic ones.
+    """
+    elements: Dict[str, int] = Counter()
+    charges: Dict[str, int] = Counter()
+    in_bracket = False
+    for token in tokens:
+        if token == "[":
+            in_bracket = True
+        elif token == "]":
+            in_bracket = False
+        elif in_bracket:
+            if _CHARGE_REGEX.match(token):
+                charges[token] += 1
+            elif _ELEMENT_REGEX.match(token):
+                elements[token.capitalize()] += 1
+        elif token.startswith("[") and len(token) > 1:
+            element = _BRACKET_ELEMENT_REGEX.match(token)
+            if element is not None:
+                elements[element.group(1).capitalize()] += 1
+            charge = _BRACKET_CHARGE_REGEX.search(token)
+            if charge is not None:
+                charges[charge.group(1)] += 1
+        elif _ORGANIC_ATOM_REGEX.match(token):
+            elements[token.capitalize()] += 1
+    return elements, charges
+
+
+class ColumnStats:
+    """Statistics of one file (column) of tokenized SMILES strings."""
+
+    def __init__(
+        self,
+        lengths: Optional[Histogram] = None,
+        distinct: Optional[HyperLogLog] = None,
+        tokens: Optional[CountMinSketch] = None,
+        elements: Optional[Dict[str, int]] = None,
+        charges: Optional[Dict[str, int]] = None,
+    ):
+        self.lengths = lengths or Histogram()
+        self.distinct = distinct or HyperLogLog()
+        self.tokens = tokens or CountMinSketch()
+        self.elements: Dict[str, int] = Counter(elements or {})
+        self.charges: Dict[str, int] = Counter(charges or {})
+
+    def update(self, lines: List[str]) -> None:
+        token_counts: "Counter[str]" = Counter()
+        lengths = []
+        for line in lines:
+            tokens = line.split()
+            lengths.append(len(tokens))
+            token_counts.update(tokens)
+            elements, charges = count_elements_and_charges(tokens)
+            self.elements.update(elements)
+            self.charges.update(charges)
+        self.lengths.add(lengths)
+        # Molecules are identified by their SMILES strings, without spaces
+        self.distinct.add("".join(line.split()) for line in lines)
+        self.tokens.add_counts(token_counts)
+
+    def merge(self, other: "ColumnStats") -> None:
+        self.lengths.merge(other.lengths)
+        self.distinct.merge(other.distinct)
+        self.tokens.merge(other.tokens)
+        self.elements.update(other.elements)
+        self.charges.update(other.charges)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "n_lines": self.lengths.total,
+            "unique_smiles": round(self.distinct.estimate()),
+            "token_length": self.lengths.summary(),
+            "elements": dict(Counter(self.elements).most_common()),
+            "charges": dict(Counter(self.charges).most_common()),
+            "top_tokens": dict(self.tokens.top()),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "lengths": self.lengths.to_dict(),
+            "distinct": self.distinct.to_dict(),
+            "tokens": self.tokens.to_dict(),
+            "elements": dict(self.elements),
+            "charges": dict(self.charges),
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ColumnStats":
+        return cls(
+            lengths=Histogram.from_dict(data["lengths"]),
+            distinct=HyperLogLog.from_dict(data["distinct"]),
+            tokens=CountMinSketch.from_dict(data["tokens"]),
+            elements=data["elements"],
+            charges=data["charges"],
+        )
+
+
+class DatasetStats:
+    """
+    Statistics of a dataset: one ColumnStats per file, and for src / tgt
+    pairs the number of pairs where the target differs from the source.
+    """
+
+    def __init__(
+        self,
+        columns: Optional[Dict[str, ColumnStats]] = None,
+        n_pairs: int = 0,
+        n_modified: int = 0,
+    ):
+        self.columns = columns or {}
+        self.n_pairs = n_pairs
+        self.n_modified = n_modified
+
+    def update(self, lines: Dict[str, List[str]]) -> None:
+        """Add aligned lines for every column (f.i. "src" and "tgt")."""
+        for column, column_lines in lines.items():
+            self.columns.setdefault(column, ColumnStats()).update(column_lines)
+        if "src" in lines and "tgt" in lines:
+            self.n_pairs += len(lines["src"])
+            self.n_modified += sum(
+                s.split() != t.split() for s, t in zip(lines["src"], lines["tgt"])
+            )
+
+    def merge(self, other: "DatasetStats") -> None:
+        for column, column_stats in other.columns.items():
+            if column in self.columns:
+                self.columns[column].merge(column_stats)
+            else:
+                self.columns[column] = column_stats
+        self.n_pairs += other.n_pairs
+        self.n_modified += other.n_modified
+
+    def summary(self) -> Dict[str, Any]:
+        summary: Dict[str, Any] = {
+            column: column_stats.summary()
+            for column, column_stats in self.columns.items()
+        }
+        if self.n_pairs:
+            summary["n_pairs"] = self.n_pairs
+            summary["modified_fraction"] = self.n_modified / self.n_pairs
+        return summary
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "columns": {c: stats.to_dict() for c, stats in self.columns.items()},
+            "n_pairs": self.n_pairs,
+            "n_modified": self.n_modified,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "DatasetStats":
+        return cls(
+            columns={
+                c: ColumnStats.from_dict(stats) for c, stats in data["columns"].items()
+            },
+            n_pairs=data["n_pairs"],
+            n_modified=data["n_modified"],
+        )
+
+
+class StatsTask(NamedTuple):
+    """
+    Statistics of one chunk of lines of aligned files, given by the files and
+    their line offsets for the chunk (see read_lines).
+    """
+
+    files: Dict[str, Tuple[str, np.ndarray]]
+    prepend_token: Optional[str]
+
+
+def compute_chunk(task: StatsTask) -> DatasetStats:
+    lines: Dict[str, List[str]] = {
+        column: read_lines(path, offsets)
+        for column, (path, offsets) in task.files.items()
+    }
+    if task.prepend_token is not None and "src" in lines:
+        prefix = f"{task.prepend_token} "
+        lines["src"] = [
+            line[len(prefix) :] if line.startswith(prefix) else line
+            for line in lines["src"]
+        ]
+    stats = DatasetStats()
+    stats.update(lines)
+    return stats
+
+
+def _map_tasks(tasks: Iterable[StatsTask], n_jobs: int) -> Iterator[DatasetStats]:
+    if n_jobs == 1:
+        yield from map(compute_chunk, tasks)
+        return
+    with Pool(n_jobs) as pool:
+        yield from pool.imap_unordered(compute_chunk, tasks)
+
+
+def compute_stats(
+    files: Mapping[str, PathLike],
+    start: int = 0,
+    stop: Optional[int] = None,
+    chunk_size: int = 100000,
+    n_jobs: int = 1,
+    prepend_token: Optional[str] = None,
+    line_indexes: Optional[Mapping[str, np.ndarray]] = None,
+) -> DatasetStats:
+    """
+    Compute the statistics of aligned files of tokenized SMILES strings.
+
+    Args:
+        files: files by column name; the "src" and "tgt" columns are compared.
+        start: first line to consider.
+        stop: line after the last one to consider; the end of the files if None.
+        chunk_size: number of lines processed at once by a worker.
+        n_jobs: number of worker processes.
+        prepend_token: token prepended to the src SMILES, to ignore.
+        line_indexes: line indexes of the files by column name, if the caller
+            already loaded them (see load_line_index); loaded otherwise.
+
+    Raises:
+        ValueError: if the files have different numbers of lines.
+    """
+    # The workers only receive the offsets of their chunk of lines, so that
+    # they neither load nor build the indexes themselves
+    indexes = {
+        column: (
+            line_indexes[column]
+            if line_indexes is not None and column in line_indexes
+            else load_line_index(path)
+        )
+        for column, path in files.items()
+    }
+    n_lines = {len(index) - 1 for index in indexes.values()}
+    if len(n_lines) > 1:
+        raise ValueError(f"The files have different numbers of lines: {n_lines}.")
+    n_total = n_lines.pop() if n_lines else 0
+    stop = n_total if stop is None else min(stop, n_total)
+
+    def make_task(chunk_start: int) -> StatsTask:
+        chunk_stop = min(chunk_start + chunk_size, stop)
+        return StatsTask(
+            files={
+                column: (
+                    str(files[column]),
+                    np.array(index[chunk_start : chunk_stop + 1]),
+                )
+                for column, index in indexes.items()
+            },
+            prepend_token=prepend_token,
+        )
+
+    tasks = map(make_task, range(start, stop, chunk_size))
+    stats = DatasetStats()
+    for chunk_stats in _map_tasks(tasks, n_jobs):
+        stats.merge(chunk_stats)
+    return stats
@@ -0,0 +1,160 @@
+"""
+Index of the PubChem substances of a build, for the incremental processing of
+new PubChem releases.
+
+The index maps every SID to its CID and to hashes of its src (substance) and
+tgt (compound) SMILES strings, sorted by SID and saved as a npz file with the
+processing options of the build. The index of a new release is compared to
+the one of the previous build, and only the added or changed substances need
+to be processed again.
+"""
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, NamedTuple, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from rxn.utilities.files import PathLike
+
+from rxn_standardization.utils import stable_hash
+
+
+class SubstanceIndex(NamedTuple):
+    """Arrays of the same length, sorted by SID."""
+
+    sid: np.ndarray
+    cid: np.ndarray
+    src_hash: np.ndarray
+    tgt_hash: np.ndarray
+
+    def __len__(self) -> int:  # type: ignore[override]
+        return len(self.sid)
+
+    def take(self, indices: np.ndarray) -> "SubstanceIndex":
+        return SubstanceIndex(*(array[indices] for array in self))
+
+
+class IndexDiff(NamedTuple):
+    """SIDs of the new index compared to the previous one (sorted arrays)."""
+
+    added: np.ndarray
+    changed: np.ndarray
+    removed: np.ndarray
+    unchanged: np.ndarray
+
+    @property
+    def to_process(self) -> np.ndarray:
+        """SIDs to process again: the added and changed ones."""
+        return np.union1d(self.added, self.changed)
+
+
+def build_substance_index(
+    sids: Sequence[int],
+    cids: Sequence[int],
+    src: Sequence[str],
+    tgt: Sequence[str],
+) -> SubstanceIndex:
+    """
+    Build the index of substances given by their SID, CID, and src / tgt SMILES.
+
+    Raises:
+        ValueError: if some SIDs are duplicated.
+    """
+    sid = np.asarray(sids, dtype=np.int64)
+    order = np.argsort(sid, kind="stable")
+    sid = sid[order]
+    if np.any(sid[1:] == sid[:-1]):
+        raise ValueError("The substance index cannot contain duplicate SIDs.")
+    return SubstanceIndex(
+        sid=sid,
+        cid=np.asarray(cids, dtype=np.int64)[order],
+        src_hash=stable_hash(src)[order],
+        tgt_hash=stable_hash(tgt)[order],
+    )
+
+
+def unique_src(index: SubstanceIndex) -> SubstanceIndex:
+    """
+    Keep one substance per src SMILES string: the one with the highest SID,
+    as for the duplicate src SMILES in extract_pubchem.py.
+    """
+    order = np.lexsort((index.sid, index.src_hash))
+    src_hash = index.src_hash[order]
+    is_last = np.append(src_hash[1:] != src_hash[:-1], True)
+    return index.take(np.sort(order[is_last]))
+
+
+def diff_substance_indices(
+    previous: SubstanceIndex, current: SubstanceIndex
+) -> IndexDiff:
+    """Compare the index of a new release to the one of the previous build."""
+    _, previous_pos, current_pos = np.intersect1d(
+        previous.sid, current.sid, assume_unique=True, return_indices=True
+    )
+    is_changed = (
+        (previous.cid[previous_pos] != current.cid[current_pos])
+        | (previous.src_hash[previous_pos] != current.src_hash[current_pos])
+        | (previous.tgt_hash[previous_pos] != current.tgt_hash[current_pos])
+    )
+    common = current.sid[current_pos]
+    return IndexDiff(
+        added=np.setdiff1d(current.sid, previous.sid, assume_unique=True),
+        changed=common[is_changed],
+        removed=np.setdiff1d(previous.sid, current.sid, assume_unique=True),
+        unchanged=common[~is_changed],
+    )
+
+
+def save_substance_index(
+    index: SubstanceIndex, path: PathLike, options: Optional[Dict[str, Any]] = None
+) -> None:
+    """
+    Save an index, with the processing options of the build (see
+    load_index_options).
+
+    The index is written to a temporary file that then replaces the previous
+    one, so that an interrupted write does not leave a truncated index.
+    """
+    tmp_path = Path(f"{path}.tmp")
+    # Written through a file object, as np.savez would otherwise append ".npz"
+    with open(tmp_path, "wb") as f:
+        np.savez(f, options=np.array(json.dumps(options or {})), **index._asdict())
+    os.replace(tmp_path, path)
+
+
+def load_substance_index(path: PathLike) -> SubstanceIndex:
+    with np.load(path) as data:
+        return SubstanceIndex(*(data[field] for field in SubstanceIndex._fields))
+
+
+def load_index_options(path: PathLike) -> Dict[str, Any]:
+    """
+    Get the processing options saved with an index, f.i. to process all the
+    substances again if they changed since the previous build.
+    """
+    with np.load(path) as data:
+        if "options" not in data:
+            return {}
+        return json.loads(str(data["options"]))
+
+
+def merge_delta(
+    previous: pd.DataFrame, delta: pd.DataFrame, diff: IndexDiff
+) -> pd.DataFrame:
+    """
+    Merge the results for the processed substances into the previous results.
+
+    Args:
+        previous: previous results, with a "sid" column.
+        delta: results for the added and changed substances, with a "sid" column.
+        diff: difference between the previous and current indices.
+
+    Returns:
+        The rows of the previous results for the unchanged substances and the
+        rows of the delta, sorted by SID.
+    """
+    kept = previous[previous["sid"].isin(diff.unchanged)]
+    merged = pd.concat([kept, delta], ignore_index=True)
+    return merged.sort_values("sid", kind="stable", ignore_index=True)
@@ -0,0 +1,276 @@
+"""
+Reading and writing of tabular datasets as CSV, Parquet or Arrow IPC files.
+
+The format is determined from the file extension; CSV is the default. Parquet
+and Arrow IPC require pyarrow (``pip install rxn_standardization[arrow]``).
+"""
+
+import logging
+from pathlib import Path
+from types import TracebackType
+from typing import Any, Iterator, List, Optional, Sequence, Type
+
+import pandas as pd
+from rxn.utilities.files import PathLike, dump_list_to_file
+
+from rxn_standardization.partition import Partition, open_partition, partition_path
+
+logger = logging.getLogger(__name__)
+logger.addHandler(logging.NullHandler())
+
+CSV = "csv"
+PARQUET = "parquet"
+ARROW = "arrow"
+TABLE_FORMATS = (CSV, PARQUET, ARROW)
+
+_FORMAT_FROM_SUFFIX = {
+    ".parquet": PARQUET,
+    ".pq": PARQUET,
+    ".arrow": ARROW,
+    ".feather": ARROW,
+    ".ipc": ARROW,
+}
+
+
+def table_format(path: PathLike) -> str:
+    """
+    Get the format of a table from its file extension.
+
+    Files with an unknown extension are considered to be CSV files.
+    """
+    return _FORMAT_FROM_SUFFIX.get(Path(path).suffix.lower(), CSV)
+
+
+def table_suffix(table_format: str) -> str:
+    """Get the file extension for the given table format."""
+    if table_format not in TABLE_FORMATS:
+        raise ValueError(f'Unknown table format "{table_format}".')
+    return f".{table_format}"
+
+
+def _import_pyarrow() -> Any:
+    try:
+        import pyarrow  # noqa: F401
+        import pyarrow.ipc  # noqa: F401
+        import pyarrow.parquet  # noqa: F401
+    except ImportError as e:
+        raise ImportError(
+            "pyarrow is required for Parquet and Arrow files. Install it with "
+            '"pip install rxn_standardization[arrow]".'
+        ) from e
+    return pyarrow
+
+
+def read_table(path: PathLike, columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    Read a CSV, Parquet or Arrow IPC file into a DataFrame.
+
+    Args:
+        path: file to read.
+        columns: columns to read; all of them if None.
+    """
+    fmt = table_format(path)
+    usecols = None if columns is None else list(columns)
+    if fmt == CSV:
+        return pd.read_csv(path, usecols=usecols)
+    if fmt == PARQUET:
+        _import_pyarrow()
+        return pd.read_parquet(path, columns=usecols)
+    pa = _import_pyarrow()
+    with pa.memory_map(str(path), "r") as source:
+        # Read as a whole, so that files without record batches give an
+        # empty DataFrame with the columns of the schema
+        table = pa.ipc.open_file(source).read_all()
+    if usecols is not None:
+        table = table.select(usecols)
+    return table.to_pandas()
+
+
+def _partition_slice(n_items: int, partition: Optional[Partition]) -> range:
+    if partition is None:
+        return range(n_items)
+    return range(
+        n_items * partition.part // partition.total,
+        n_items * (partition.part + 1) // partition.total,
+    )
+
+
+def iterate_table(
+    path: PathLike,
+    columns: Optional[Sequence[str]] = None,
+    chunk_size: int = 100000,
+    partition: Optional[Partition] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Iterate over a CSV, Parquet or Arrow IPC file in chunks.
+
+    Parquet files are read one row group at a time, Arrow IPC files one record
+    batch at a time (memory-mapped); for CSV files, chunks of ``chunk_size``
+    rows are read.
+
+    Args:
+        path: file to read.
+        columns: columns to read; all of them if None.
+        chunk_size: number of rows per chunk, for CSV files only.
+        partition: if given, read only this part of the file: a byte range
+            for CSV files, a contiguous range of row groups (record batches)
+            for Parquet (Arrow) files.
+    """
+    fmt = table_format(path)
+    usecols = None if columns is None else list(columns)
+
+    if fmt == CSV:
+        if partition is None:
+            yield from pd.read_csv(path, usecols=usecols, chunksize=chunk_size)
+        else:
+            with open_partition(path, partition, header=True) as f:
+                yield from pd.read_csv(f, usecols=usecols, chunksize=chunk_size)
+    elif fmt == PARQUET:
+        pa = _import_pyarrow()
+        parquet_file = pa.parquet.ParquetFile(str(path))
+        for i in _partition_slice(parquet_file.num_row_groups, partition):
+            yield parquet_file.read_row_group(i, columns=usecols).to_pandas()
+    else:
+        pa = _import_pyarrow()
+        with pa.memory_map(str(path), "r") as source:
+            reader = pa.ipc.open_file(source)
+            for i in _partition_slice(reader.num_record_batches, partition):
+                batch = reader.get_batch(i)
+                if usecols is not None:
+                    batch = batch.select(usecols)
+                yield batch.to_pandas()
+
+
+def write_table(df: pd.DataFrame, path: PathLike) -> None:
+    """
+    Write a DataFrame (without its index) to a CSV, Parquet or Arrow IPC file.
+    """
+    with TableWriter(path) as writer:
+        writer.write(df)
+
+
+class TableWriter:
+    """
+    Write a table chunk by chunk, to a CSV, Parquet or Arrow IPC file.
+
+    Every chunk becomes a row group (Parquet) or a record batch (Arrow), so
+    that the file can be read back with ``iterate_table`` chunk by chunk.
+    All the chunks must have the same columns. If no chunk is written, the
+    file still gets the header (CSV) or the schema (Parquet, Arrow) of the
+    given columns, as string columns.
+
+    Example:
+        with TableWriter("out.parquet") as writer:
+            for chunk in chunks:
+                writer.write(chunk)
+    """
+
+    def __init__(self, path: PathLike, columns: Optional[Sequence[str]] = None):
+        """
+        Args:
+            path: file to write.
+            columns: columns of the table, for the header or schema of the
+                file when no chunk is written; no column if None.
+        """
+        self.path = path
+        self.columns = [] if columns is None else list(columns)
+        self.format = table_format(path)
+        self.n_rows = 0
+        self._writer: Any = None
+        self._sink: Any = None
+        self._header_written = False
+        self._closed = False
+
+    def write(self, df: pd.DataFrame) -> None:
+        if self.format == CSV:
+            df.to_csv(
+                self.path,
+                index=False,
+                mode="a" if self._header_written else "w",
+                header=not self._header_written,
+            )
+            self._header_written = True
+        else:
+            pa = _import_pyarrow()
+            table = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._open_writer(pa, table.schema)
+            self._writer.write_table(table)
+        self.n_rows += len(df)
+
+    def _open_writer(self, pa: Any, schema: Any) -> None:
+        if self.format == PARQUET:
+            self._writer = pa.parquet.ParquetWriter(str(self.path), schema)
+        else:
+            self._sink = pa.OSFile(str(self.path), "wb")
+            self._writer = pa.ipc.new_file(self._sink, schema)
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        if self.format == CSV and not self._header_written:
+            if self.columns:
+                self.write(pd.DataFrame(columns=self.columns))
+            else:
+                # No columns: create an empty file, as pandas would
+                Path(self.path).write_text("")
+        elif self.format != CSV and self._writer is None:
+            pa = _import_pyarrow()
+            self._open_writer(
+                pa, pa.schema([(column, pa.string()) for column in self.columns])
+            )
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._sink is not None:
+            self._sink.close()
+            self._sink = None
+
+    def __enter__(self) -> "TableWriter":
+        return self
+
+    def __exit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_val: Optional[BaseException],
+        exc_tb: Optional[TracebackType],
+    ) -> None:
+        self.close()
+
+
+def save_src_tgt(
+    src: List[str],
+    tgt: List[str],
+    save_dir: PathLike,
+    split: str,
+    output_format: str = "txt",
+    partition: Optional[Partition] = None,
+) -> None:
+    """
+    Save the source and target SMILES for one split of a dataset.
+
+    Args:
+        src: source SMILES.
+        tgt: target SMILES.
+        save_dir: directory where to save the files.
+        split: name of the split (f.i. "train").
+        output_format: "txt" for the "src-<split>.txt" and "tgt-<split>.txt"
+            files expected by OpenNMT; one of TABLE_FORMATS for a single
+            "<split>.<format>" file with "src" and "tgt" columns.
+        partition: if given, the files are saved as partial outputs for this
+            partition (see partition_path).
+    """
+
+    def output_path(filename: str) -> Path:
+        path = Path(save_dir) / filename
+        return path if partition is None else partition_path(path, partition)
+
+    if output_format == "txt":
+        dump_list_to_file(src, output_path(f"src-{split}.txt"))
+        dump_list_to_file(tgt, output_path(f"tgt-{split}.txt"))
+    else:
+        write_table(
+            pd.DataFrame({"src": src, "tgt": tgt}),
+            output_path(f"{split}{table_suffix(output_format)}"),
+        )
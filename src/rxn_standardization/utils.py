@@ -1,16 +1,53 @@
+import hashlib
 import logging
 import re
-from typing import List, Sequence, TypeVar
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from enum import Enum
+from functools import partial
+from multiprocessing.pool import Pool
+from typing import (
+    TYPE_CHECKING,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
 
+import numpy as np
 from rdkit.Chem import RemoveStereochemistry
 from rxn.chemutils.conversion import canonicalize_smiles, mol_to_smiles, smiles_to_mol
 from rxn.chemutils.exceptions import InvalidSmiles
 from rxn.chemutils.smiles_randomization import randomize_smiles_rotated
-from rxn.chemutils.tokenization import detokenize_smiles, tokenize_smiles
+from rxn.chemutils.tokenization import (
+    TokenizationError,
+    detokenize_smiles,
+    tokenize_smiles,
+)
 from rxn.utilities.misc import get_multiplier
 from rxn.utilities.regex import capturing, optional
 from tqdm import tqdm
 
+from rxn_standardization.smiles_store import (
+    OutputHandle,
+    OutputStore,
+    SmilesStore,
+    StoreHandle,
+    WrittenOutput,
+    read_strings,
+    write_output,
+)
+
+if TYPE_CHECKING:
+    from rxn_standardization.guard import MoleculeGuard
+
 logger = logging.getLogger(__name__)
 logger.addHandler(logging.NullHandler())
 
@@ -21,6 +58,32 @@ full_regex = r"\[" + capturing(element) + charge_block + r"\]"
 T = TypeVar("T")
 
 
+class FailureReason(str, Enum):
+    """Reason why a SMILES string could not be processed."""
+
+    INVALID_SMILES = "invalid_smiles"
+    TOKENIZATION_ERROR = "tokenization_error"
+    TYPE_ERROR = "type_error"
+    TIMEOUT = "timeout"
+    WORKER_CRASHED = "worker_crashed"
+
+
+class BatchResult(NamedTuple):
+    """
+    Result of processing a batch of SMILES strings.
+
+    Attributes:
+        results: processed SMILES, in the same order as the input. Items that
+            could not be processed are left as is.
+        failed: boolean mask, True for the items that could not be processed.
+        reasons: reason of the failure for each item (None if successful).
+    """
+
+    results: List[str]
+    failed: np.ndarray
+    reasons: List[Optional[FailureReason]]
+
+
 def process_token(token: str) -> str:
     """
     Adds a space before and after elements captured by the regex.
@@ -41,6 +104,236 @@ def process_input(tokenized_smiles: str) -> str:
     return " ".join(process_token(token) for token in tokens)
 
 
+def _remove_stereochemistry(smi: str) -> str:
+    mol = smiles_to_mol(detokenize_smiles(smi), sanitize=True)
+    RemoveStereochemistry(mol)
+    return mol_to_smiles(mol)
+
+
+class StereoRemovalTier(str, Enum):
+    """Tier of the fast stereochemistry removal that handles a SMILES string."""
+
+    # No stereo markers: nothing to remove
+    STEREO_FREE = "stereo_free"
+    # Only simple markers, removed from the tokens
+    TOKEN_LEVEL = "token_level"
+    # Parsed and processed with RDKit
+    RDKIT = "rdkit"
+
+
+# Tetrahedral carbons, with the number of single bonds for which their
+# stereo-free form is the organic-subset atom
+_SIMPLE_CHIRAL_TOKENS = {"[C@H]": 3, "[C@@H]": 3, "[C@]": 4, "[C@@]": 4}
+_DOUBLE_BOND_STEREO_TOKENS = {"/", "\\"}
+_BOND_TOKENS = {"-", "=", "#", "$", ":"} | _DOUBLE_BOND_STEREO_TOKENS
+_SINGLE_BOND_TOKENS = {None, "-"} | _DOUBLE_BOND_STEREO_TOKENS
+_AROMATIC_ATOM_REGEX = re.compile(r"^\[?\d*[a-z]")
+
+
+def _has_stereo_markers(smi: str) -> bool:
+    return "@" in smi or "/" in smi or "\\" in smi
+
+
+def _bonds_by_atom(tokens: List[str]) -> Optional[Dict[int, List[Optional[str]]]]:
+    """
+    Get the bonds of the atoms of a tokenized SMILES string, as their bond
+    tokens (None for implicit bonds), by index of the atom token; None if the
+    string is malformed.
+    """
+    bonds: Dict[int, List[Optional[str]]] = {}
+    previous: Optional[int] = None
+    branches: List[Optional[int]] = []
+    rings: Dict[str, Tuple[int, Optional[str]]] = {}
+    bond: Optional[str] = None
+    for i, token in enumerate(tokens):
+        if token in _BOND_TOKENS:
+            bond = token
+            continue
+        if token == "(":
+            branches.append(previous)
+        elif token == ")":
+            if not branches:
+                return None
+            previous = branches.pop()
+        elif token == ".":
+            previous = None
+        elif token.isdigit() or token.startswith("%"):
+            if previous is None:
+                return None
+            if token in rings:
+                opening, opening_bond = rings.pop(token)
+                bond = bond or opening_bond
+                bonds[opening].append(bond)
+                bonds[previous].append(bond)
+            else:
+                rings[token] = (previous, bond)
+        else:
+            bonds[i] = []
+            if previous is not None:
+                bonds[previous].append(bond)
+                bonds[i].append(bond)
+            previous = i
+        bond = None
+    return bonds
+
+
+def _remove_stereo_tokens(smi: str) -> Optional[str]:
+    """
+    Remove the stereo markers of a (detokenized) SMILES string at the token
+    level, or return None if this cannot be done safely.
+
+    Only the chiral tags of tetrahedral carbons are handled, and the
+    directional bonds only for molecules without aromatic atoms (where
+    removing "/" could turn a single bond into an aromatic one). A chiral
+    carbon becomes "C" only if its neighbours account for all its valence, as
+    in "C[C@H](N)O"; otherwise, the brackets are kept, f.i. "[CH](F)Cl" for
+    "[C@H](F)Cl".
+    """
+    try:
+        tokens = tokenize_smiles(smi).split(" ")
+    except TokenizationError:
+        return None
+
+    has_bond_stereo = any(t in _DOUBLE_BOND_STEREO_TOKENS for t in tokens)
+    bonds: Optional[Dict[int, List[Optional[str]]]] = None
+    new_tokens = []
+    for i, token in enumerate(tokens):
+        if token in _DOUBLE_BOND_STEREO_TOKENS:
+            continue
+        if has_bond_stereo and _AROMATIC_ATOM_REGEX.match(token):
+            return None
+        if "@" in token:
+            if token not in _SIMPLE_CHIRAL_TOKENS:
+                return None
+            if bonds is None:
+                bonds = _bonds_by_atom(tokens)
+                if bonds is None:
+                    return None
+            atom_bonds = bonds[i]
+            if len(atom_bonds) == _SIMPLE_CHIRAL_TOKENS[token] and all(
+                bond in _SINGLE_BOND_TOKENS for bond in atom_bonds
+            ):
+                token = "C"
+            else:
+                token = token.replace("@", "")
+        new_tokens.append(token)
+    return "".join(new_tokens)
+
+
+def _to_canonical(smi: str) -> str:
+    # Same conversions as _remove_stereochemistry
+    return mol_to_smiles(smiles_to_mol(smi, sanitize=True))
+
+
+def stereo_removal_tier(smi: str, canonical: bool = False) -> StereoRemovalTier:
+    """Get the tier of remove_stereochemistry_fast that handles a SMILES string."""
+    smi = detokenize_smiles(smi)
+    if not _has_stereo_markers(smi):
+        return StereoRemovalTier.STEREO_FREE
+    if not canonical and _remove_stereo_tokens(smi) is not None:
+        return StereoRemovalTier.TOKEN_LEVEL
+    return StereoRemovalTier.RDKIT
+
+
+def remove_stereochemistry_fast(smi: str, canonical: bool = True) -> str:
+    """
+    Remove stereochemistry from a (possibly tokenized) SMILES string, avoiding
+    RDKit work where possible:
+        - SMILES strings without stereo markers ("@", "/", "\\") are returned
+          as they are, or only canonicalized;
+        - without ``canonical``, simple stereo markers are removed from the
+          tokens;
+        - the other SMILES strings are processed with RDKit, as
+          remove_stereochemistry does.
+
+    Args:
+        smi: SMILES string to process.
+        canonical: whether the results must be canonical SMILES, as with the
+            RDKit path. With False, the results of the first two tiers are
+            neither parsed nor validated; this is meant for results that are
+            canonicalized afterwards anyway.
+
+    Raises:
+        InvalidSmiles: for invalid SMILES strings (only detected in the RDKit
+            tier without ``canonical``).
+    """
+    detokenized = detokenize_smiles(smi)
+    if not _has_stereo_markers(detokenized):
+        return _to_canonical(detokenized) if canonical else detokenized
+    if canonical:
+        # Canonicalizing a token-level result takes as long as the RDKit path
+        return _remove_stereochemistry(detokenized)
+
+    stereo_free = _remove_stereo_tokens(detokenized)
+    if stereo_free is None:
+        return _remove_stereochemistry(detokenized)
+    return stereo_free
+
+
+def _remove_stereochemistry_fast_canonicalized(smi: str) -> str:
+    return _to_canonical(remove_stereochemistry_fast(smi, canonical=False))
+
+
+class StereoValidationReport(NamedTuple):
+    """
+    Comparison of remove_stereochemistry_fast (without ``canonical``, and
+    canonicalized afterwards) with the RDKit path.
+
+    Attributes:
+        n_checked: number of SMILES strings compared.
+        tier_counts: number of the compared SMILES strings handled by each tier.
+        mismatches: SMILES strings with different results, with both results
+            (None for a failure).
+    """
+
+    n_checked: int
+    tier_counts: Dict[StereoRemovalTier, int]
+    mismatches: List[Tuple[str, Optional[str], Optional[str]]]
+
+
+def validate_stereochemistry_removal(
+    smiles: Sequence[str], sample_size: int = 1000, seed: int = 42
+) -> StereoValidationReport:
+    """
+    Check the fast stereochemistry removal against the RDKit path, on a
+    random sample of SMILES strings.
+
+    Args:
+        smiles: SMILES strings to sample from.
+        sample_size: number of SMILES strings to compare; all of them if the
+            sequence is not larger.
+        seed: seed for the sampling.
+    """
+    if len(smiles) > sample_size:
+        rng = np.random.default_rng(seed)
+        indices = np.sort(rng.choice(len(smiles), size=sample_size, replace=False))
+        sample = [smiles[i] for i in indices]
+    else:
+        sample = list(smiles)
+
+    tier_counts: Dict[StereoRemovalTier, int] = Counter()
+    mismatches = []
+    for smi in sample:
+        tier_counts[stereo_removal_tier(smi)] += 1
+        expected, expected_reason = _apply_with_reason(_remove_stereochemistry, smi)
+        actual, actual_reason = _apply_with_reason(
+            _remove_stereochemistry_fast_canonicalized, smi
+        )
+        # Failures are represented by None
+        expected_result = None if expected_reason is not None else expected
+        actual_result = None if actual_reason is not None else actual
+        if expected_result != actual_result:
+            mismatches.append((smi, expected_result, actual_result))
+
+    return StereoValidationReport(
+        n_checked=len(sample), tier_counts=dict(tier_counts), mismatches=mismatches
+    )
+
+
+def _tokenize(smi: str) -> str:
+    return process_input(tokenize_smiles(smi))
+
+
 def remove_stereochemistry(
     smi: str,
 ) -> str:
@@ -48,7 +341,7 @@ def remove_stereochemistry(
     Remove stereochemistry from SMILES.
     """
     try:
-        mol = smiles_to_mol(detokenize_smiles(smi), sanitize=True)
+        return _remove_stereochemistry(smi)
     except InvalidSmiles as e:
         logger.warning(
             f'Invalid SMILES "{e.smiles}"; cannot remove stereochemistry and leaving as is.'
@@ -57,8 +350,6 @@ def remove_stereochemistry(
     except TypeError:
         logger.warning(f"Error during converting {smi}. Leaving as is.")
         return smi
-    RemoveStereochemistry(mol)
-    return mol_to_smiles(mol)
 
 
 def canonicalize(
@@ -75,6 +366,244 @@ def canonicalize(
     return can_smi
 
 
+def _apply_with_reason(
+    fn: Callable[[str], str], smi: str
+) -> Tuple[str, Optional[FailureReason]]:
+    """Apply a function to a SMILES string, returning the failure reason
+    instead of raising."""
+    try:
+        return fn(smi), None
+    except InvalidSmiles:
+        return smi, FailureReason.INVALID_SMILES
+    except TokenizationError:
+        return smi, FailureReason.TOKENIZATION_ERROR
+    except TypeError:
+        return smi, FailureReason.TYPE_ERROR
+
+
+# Failure reasons by code, for the results sent back by the workers
+_REASONS: List[Optional[FailureReason]] = [None, *FailureReason]
+_REASON_CODES = {reason: code for code, reason in enumerate(_REASONS)}
+
+
+def _apply_to_range(
+    fn: Callable[[str], str], handle: StoreHandle, output: OutputHandle
+) -> WrittenOutput:
+    """
+    Apply a function to a range of a SmilesStore, in a worker process, and
+    write the results with the codes of the failure reasons to an OutputStore.
+    """
+    outputs = [_apply_with_reason(fn, smi) for smi in read_strings(handle)]
+    codes = np.fromiter(
+        (_REASON_CODES[reason] for _, reason in outputs),
+        dtype=np.uint8,
+        count=len(outputs),
+    )
+    return write_output(output, [result for result, _ in outputs], codes)
+
+
+def _to_batch_result(
+    outputs: Iterable[Tuple[str, Optional[FailureReason]]],
+) -> BatchResult:
+    results: List[str] = []
+    reasons: List[Optional[FailureReason]] = []
+    for result, reason in outputs:
+        results.append(result)
+        reasons.append(reason)
+
+    failed = np.array([reason is not None for reason in reasons], dtype=bool)
+    return BatchResult(results=results, failed=failed, reasons=reasons)
+
+
+def _map_in_pool(
+    fn: Callable[[str], str], smiles: List[str], pool: Pool, chunk_size: int
+) -> BatchResult:
+    """
+    Apply a function in a process pool. The SMILES strings are placed in a
+    shared-memory SmilesStore, and the workers are sent ranges of indices;
+    they write the results to a shared-memory OutputStore.
+    """
+    try:
+        store = SmilesStore.from_strings(smiles)
+    except (TypeError, ValueError):
+        # Items that are not strings (f.i. NaN from pandas) or with line
+        # breaks cannot be stored: send them as is
+        apply_fn = partial(_apply_with_reason, fn)
+        return _to_batch_result(pool.imap(apply_fn, smiles, chunksize=chunk_size))
+
+    results: List[str] = []
+    codes: List[np.ndarray] = [np.zeros(0, dtype=np.uint8)]
+    ranges = [
+        (start, min(start + chunk_size, len(store)))
+        for start in range(0, len(store), chunk_size)
+    ]
+    # Room for results twice as long as the inputs (f.i. tokenized SMILES);
+    # the longer ones are sent back by the workers
+    capacities = [
+        2 * store.nbytes(start, stop) + (stop - start) for start, stop in ranges
+    ]
+    with store, OutputStore(len(store), ranges, capacities) as output:
+        handles = [store.handle(start, stop) for start, stop in ranges]
+        output_handles = output.handles()
+        for output_handle, written in zip(
+            output_handles,
+            pool.starmap(partial(_apply_to_range, fn), zip(handles, output_handles)),
+        ):
+            chunk_results, chunk_codes = output.read(output_handle, written)
+            results.extend(chunk_results)
+            codes.append(chunk_codes)
+    all_codes = np.concatenate(codes)
+    return BatchResult(
+        results=results,
+        failed=all_codes != 0,
+        reasons=list(map(_REASONS.__getitem__, all_codes.tolist())),
+    )
+
+
+def apply_many(
+    fn: Callable[[str], str],
+    smiles: Iterable[str],
+    pool: Optional[Pool] = None,
+    chunk_size: int = 1000,
+    guard: Optional["MoleculeGuard"] = None,
+) -> BatchResult:
+    """
+    Apply a function to SMILES strings, leaving as is the ones for which it
+    raises InvalidSmiles, TokenizationError or TypeError.
+
+    With a pool, the strings are placed in shared memory and the workers are
+    sent ranges of indices (see SmilesStore).
+
+    Args:
+        fn: function to apply; must be picklable to use a pool or a guard.
+        smiles: SMILES strings to process.
+        pool: process pool to distribute the work on; in the current process if None.
+        chunk_size: number of SMILES processed by a worker process at once.
+        guard: if given, the pathological molecules are processed by the
+            guard, with a timeout.
+    """
+    if guard is not None and guard.enabled:
+        return _to_batch_result(
+            _process_guarded(fn, list(smiles), pool, chunk_size, guard)
+        )
+    if pool is None:
+        return _to_batch_result(map(partial(_apply_with_reason, fn), smiles))
+    return _map_in_pool(fn, list(smiles), pool, chunk_size)
+
+
+def _process_guarded(
+    fn: Callable[[str], str],
+    smiles: List[str],
+    pool: Optional[Pool],
+    chunk_size: int,
+    guard: "MoleculeGuard",
+) -> List[Tuple[str, Optional[FailureReason]]]:
+    """
+    Process the pathological molecules with the guard, the other ones as usual.
+
+    The guard runs in a background thread, so that its workers process the
+    pathological molecules while the other ones are processed.
+    """
+    is_pathological = [guard.is_pathological(smi) for smi in smiles]
+    regular = [smi for smi, p in zip(smiles, is_pathological) if not p]
+    routed = [smi for smi, p in zip(smiles, is_pathological) if p]
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        guarded = executor.submit(guard.run, fn, routed)
+        if pool is None:
+            regular_outputs = iter(list(map(partial(_apply_with_reason, fn), regular)))
+        else:
+            result = _map_in_pool(fn, regular, pool, chunk_size)
+            regular_outputs = zip(result.results, result.reasons)
+        guarded_outputs = iter(guarded.result())
+    return [next(guarded_outputs if p else regular_outputs) for p in is_pathological]
+
+
+def canonicalize_many(
+    smiles: Iterable[str],
+    pool: Optional[Pool] = None,
+    chunk_size: int = 1000,
+    guard: Optional["MoleculeGuard"] = None,
+) -> BatchResult:
+    """
+    Canonicalize SMILES strings, leaving the invalid ones as is.
+
+    Args:
+        smiles: SMILES strings to canonicalize.
+        pool: process pool to distribute the work on; in the current process if None.
+        chunk_size: number of SMILES sent to a worker process at once.
+        guard: if given, the pathological molecules are processed by the
+            guard, with a timeout.
+    """
+    return apply_many(canonicalize_smiles, smiles, pool, chunk_size, guard)
+
+
+def remove_stereochemistry_many(
+    smiles: Iterable[str],
+    pool: Optional[Pool] = None,
+    chunk_size: int = 1000,
+    fast: bool = False,
+    canonical: bool = True,
+    guard: Optional["MoleculeGuard"] = None,
+) -> BatchResult:
+    """
+    Remove stereochemistry from (possibly tokenized) SMILES strings, leaving
+    the invalid ones as is.
+
+    Args:
+        smiles: SMILES strings to process.
+        pool: process pool to distribute the work on; in the current process if None.
+        chunk_size: number of SMILES sent to a worker process at once.
+        fast: whether to use remove_stereochemistry_fast.
+        canonical: see remove_stereochemistry_fast; ignored if not ``fast``.
+        guard: if given, the pathological molecules are processed by the
+            guard, with a timeout.
+    """
+    fn: Callable[[str], str] = _remove_stereochemistry
+    if fast:
+        fn = partial(remove_stereochemistry_fast, canonical=canonical)
+    return apply_many(fn, smiles, pool, chunk_size, guard)
+
+
+def tokenize_many(
+    smiles: Iterable[str], pool: Optional[Pool] = None, chunk_size: int = 1000
+) -> BatchResult:
+    """
+    Tokenize SMILES strings, with spaces around the elements and charges
+    (see process_input). The SMILES that cannot be tokenized are left as is.
+
+    Args:
+        smiles: SMILES strings to tokenize.
+        pool: process pool to distribute the work on; in the current process if None.
+        chunk_size: number of SMILES sent to a worker process at once.
+    """
+    return apply_many(_tokenize, smiles, pool, chunk_size)
+
+
+@contextmanager
+def process_pool(n_jobs: int) -> Iterator[Optional[Pool]]:
+    """
+    Pool of ``n_jobs`` worker processes for the batch functions (f.i.
+    canonicalize_many), or None to process the batches in the current
+    process if ``n_jobs`` is 1.
+    """
+    if n_jobs == 1:
+        yield None
+        return
+    with Pool(n_jobs) as pool:
+        yield pool
+
+
+def stable_hash(strings: Iterable[str]) -> np.ndarray:
+    """
+    Get 64-bit hashes of strings that, unlike ``hash``, are identical across
+    processes and runs.
+    """
+    digests = b"".join(
+        hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest() for s in strings
+    )
+    return np.frombuffer(digests, dtype="<u8")
+
+
 def get_sequence_multiplier(ground_truth: Sequence[T], predictions: Sequence[T]) -> int:
     """
     Get the multiplier for the number of predictions by ground truth sample.
@@ -110,9 +639,7 @@ def augment(
 
     for smi in tqdm(original_smiles, total=len(original_smiles)):
         # append also unmodified smiles:
-        augmented_smiles.append(process_input(tokenize_smiles(smi)))
-        augmented_smiles.append(
-            process_input(tokenize_smiles(randomize_smiles_rotated(smi)))
-        )
+        augmented_smiles.append(_tokenize(smi))
+        augmented_smiles.append(_tokenize(randomize_smiles_rotated(smi)))
 
     return augmented_smiles
@@ -0,0 +1,18 @@
+"""Import of the scripts in the resources directory, which is not a package."""
+
+import importlib.util
+import sys
+from pathlib import Path
+from types import ModuleType
+
+RESOURCES_DIR = Path(__file__).parent.parent / "resources"
+
+
+def load_resource_script(name: str) -> ModuleType:
+    spec = importlib.util.spec_from_file_location(name, RESOURCES_DIR / f"{name}.py")
+    assert spec is not None and spec.loader is not None
+    module = importlib.util.module_from_spec(spec)
+    # Registered, so that its functions can be sent to worker processes
+    sys.modules[name] = module
+    spec.loader.exec_module(module)
+    return module
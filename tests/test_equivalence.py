@@ -0,0 +1,53 @@
+from rxn_standardization.equivalence import (
+    EquivalenceEngine,
+    EquivalenceTier,
+    element_key,
+)
+from rxn_standardization.utils import FailureReason
+
+
+def test_element_key() -> None:
+    assert element_key("OCC") == element_key("CCO") == (("C", 2), ("O", 1))
+    assert element_key("c1ccccc1") == element_key("C1=CC=CC=C1")
+    assert element_key("[nH]1cccc1") == element_key("N1C=CC=C1")
+    assert element_key("[2H]C([2H])Cl") == (("C", 1), ("Cl", 1))
+    assert element_key("CC[Na]") != element_key("CCN")
+    assert element_key("C%%C") is None
+
+
+def test_equivalence_tiers() -> None:
+    engine = EquivalenceEngine()
+
+    result = engine.compare("C C O", "CCO")
+    assert result.equivalent and result.tier == EquivalenceTier.EXACT
+
+    result = engine.compare("CCO", "CCN")
+    assert not result.equivalent and result.tier == EquivalenceTier.ELEMENT_KEY
+
+    result = engine.compare("OCC", "CCO")
+    assert result.equivalent and result.tier == EquivalenceTier.RDKIT
+
+    # Both canonical forms are now cached
+    result = engine.compare("CCO", "O C C")
+    assert result.equivalent and result.tier == EquivalenceTier.CACHED
+
+    result = engine.compare("COC", "CCO")
+    assert not result.equivalent and result.tier == EquivalenceTier.RDKIT
+
+    assert engine.tier_counts == {
+        EquivalenceTier.EXACT: 1,
+        EquivalenceTier.ELEMENT_KEY: 1,
+        EquivalenceTier.RDKIT: 2,
+        EquivalenceTier.CACHED: 1,
+    }
+
+
+def test_equivalence_of_invalid_smiles() -> None:
+    engine = EquivalenceEngine(cache_size=1)
+
+    # Invalid SMILES are only equivalent to themselves, as with canonicalization
+    assert engine.equivalent("C1CC", "C1CC")
+    result = engine.compare("C1CC", "CCC")
+    assert not result.equivalent
+    assert result.reasons == (FailureReason.INVALID_SMILES, None)
+    assert not engine.equivalent("C(", "CC")
@@ -0,0 +1,95 @@
+import json
+from pathlib import Path
+from typing import Any, Tuple
+
+import pytest
+
+from .resource_scripts import load_resource_script
+
+catalysts = load_resource_script("extract_catalysts")
+
+
+@pytest.mark.parametrize(
+    "content",
+    [
+        "[1, 2.5]",
+        "[2.5, 1]",
+        "[1e5, 2]",
+        "[-12.75e-3 ,\n 400 ]",
+        '["abc", "d\\\\e\\"f", "ghij"]',
+        '[{"original_smiles": "CC(=O)O", "decision": "yes"}, [true, null]]',
+        "[]",
+    ],
+)
+@pytest.mark.parametrize("buffer_size", [1, 2, 3, 4, 5, 1 << 16])
+def test_iterate_json_array(tmp_path: Path, content: str, buffer_size: int) -> None:
+    path = tmp_path / "data.json"
+    path.write_text(content)
+
+    values = list(catalysts.iterate_json_array(str(path), buffer_size=buffer_size))
+
+    assert values == json.loads(content)
+
+
+@pytest.mark.parametrize("content", ["{}", "[1 2]", "[1, 2"])
+@pytest.mark.parametrize("buffer_size", [1, 3, 1 << 16])
+def test_iterate_json_array_malformed(
+    tmp_path: Path, content: str, buffer_size: int
+) -> None:
+    path = tmp_path / "data.json"
+    path.write_text(content)
+
+    with pytest.raises(ValueError):
+        list(catalysts.iterate_json_array(str(path), buffer_size=buffer_size))
+
+
+@pytest.mark.parametrize("content", [b"[1 2, ", b'["a"b, ', b"[1, true 3, "])
+def test_iterate_json_array_stops_at_error(tmp_path: Path, content: bytes) -> None:
+    # The end of the file (after the read-ahead of the text decoder) cannot
+    # even be decoded: it must not be read
+    path = tmp_path / "data.json"
+    path.write_bytes(content + b" " * 100000 + b"\xff" * 100 + b"]")
+
+    with pytest.raises(ValueError, match="Malformed JSON array"):
+        list(catalysts.iterate_json_array(str(path), buffer_size=4))
+
+
+def test_sort_by_release() -> None:
+    files = ("data/catalyst-annotation-210826.json", "catalyst-annotation-210428.json")
+    assert catalysts.sort_by_release(files) == files[::-1]
+
+    # Dates with two- and four-digit years
+    files_with_years: Tuple[str, ...] = (
+        "catalyst-annotation-20220101.json",
+        "catalyst-annotation-210826.json",
+        "catalyst-annotation-20210428.json",
+    )
+    expected = files_with_years[::-1]
+    assert catalysts.sort_by_release(files_with_years) == expected
+
+    # Kept in the given order when some names have no date
+    files = ("new.json", "catalyst-annotation-210428.json")
+    assert catalysts.sort_by_release(files) == files
+
+
+def _write(path: Path, entries: Any) -> str:
+    path.write_text(json.dumps(entries))
+    return str(path)
+
+
+def test_merge_annotations_latest_wins(tmp_path: Path) -> None:
+    old = _write(
+        tmp_path / "catalyst-annotation-210428.json",
+        [
+            {"original_smiles": "C", "decision": "no"},
+            {"original_smiles": "O", "decision": "yes", "updated_smiles": "[OH2]"},
+        ],
+    )
+    new = _write(
+        tmp_path / "catalyst-annotation-210826.json",
+        [{"original_smiles": "C", "decision": "yes", "updated_smiles": "[CH4]"}],
+    )
+
+    index = catalysts.merge_annotations(catalysts.sort_by_release((new, old)))
+
+    assert index == {"C": ("yes", "[CH4]"), "O": ("yes", "[OH2]")}
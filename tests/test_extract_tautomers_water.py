@@ -0,0 +1,103 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from click.testing import CliRunner
+
+from .resource_scripts import load_resource_script
+
+tautomers = load_resource_script("extract_tautomers_water")
+
+
+def _entries(log_k: list, percent: list, preferred: list) -> pd.DataFrame:
+    return pd.DataFrame(
+        {"log_K": log_k, "percent_tautomer_1": percent, "preferred": preferred}
+    )
+
+
+def test_to_float() -> None:
+    column = pd.Series(["1.5", ">4", "<<-2", "~0.3", " 60 ", "abc", np.nan])
+    np.testing.assert_array_equal(
+        tautomers.to_float(column), [1.5, 4.0, -2.0, 0.3, 60.0, np.nan, np.nan]
+    )
+
+
+def test_first_tautomer_is_src_priority() -> None:
+    df = _entries(
+        log_k=["-1", "2", np.nan, np.nan, np.nan, np.nan, "1", np.nan],
+        percent=["10", "90", "70", "<30", np.nan, np.nan, np.nan, np.nan],
+        preferred=["2", "1", "2", "1", "1", "2", "Both", "Both"],
+    )
+    result = tautomers.first_tautomer_is_src(df)
+    # log_K wins over the percentage, which wins over the preferred tautomer
+    assert result.tolist() == [True, False, True, False, True, False, False, pd.NA]
+
+
+def test_first_tautomer_is_src_unparseable_values() -> None:
+    # A given but unparseable value does not fall back to the next column
+    df = _entries(log_k=["n/a", np.nan], percent=["70", "n/a"], preferred=["1", "1"])
+    assert tautomers.first_tautomer_is_src(df).tolist() == [pd.NA, pd.NA]
+
+
+def test_log_k_of_zero_is_a_value() -> None:
+    # Unlike earlier versions, which treated 0 as missing and fell back to
+    # the percentage, a log_K of 0 gives the second tautomer as source
+    df = _entries(log_k=["0", "0.0"], percent=["90", np.nan], preferred=["1", "1"])
+    assert tautomers.first_tautomer_is_src(df).tolist() == [False, False]
+
+
+def test_main_outputs(tmp_path: Path) -> None:
+    input_file = tmp_path / "tautobase.txt"
+    rows = [
+        [
+            "[CH3:1][C:2](=[O:3])[CH3:4]>>[CH2:1]=[C:2]([OH:3])[CH3:4]",
+            "x",
+            "-3",
+            "",
+            "",
+            "Water",
+        ],
+        ["[NH2:1][CH:2]=[O:3]>>[NH:1]=[CH:2][OH:3]", "x", "", "", "2", "Water"],
+        ["[NH2:1][CH:2]=[O:3]>>[NH:1]=[CH:2][OH:3]", "x", "", "80", "", "DMSO"],
+        ["[CH3:1][OH:2]>>[CH3:1][OH:2]", "x", "", "", "Both", "Water"],
+    ]
+    input_file.write_text(
+        "smirks\tname\tlog_K\tpercent\tpreferred\tsolvent\n"
+        + "".join("\t".join(row) + "\n" for row in rows)
+    )
+    output_dir = tmp_path / "out"
+    output_file = tmp_path / "water.csv"
+
+    result = CliRunner().invoke(
+        tautomers.main,
+        [
+            "-i",
+            str(input_file),
+            "-o",
+            str(output_dir),
+            "--output_file",
+            str(output_file),
+        ],
+    )
+    assert result.exit_code == 0, result.output
+
+    water = pd.read_csv(output_dir / "Water.csv").sort_values("src")
+    assert water.values.tolist() == [["CC(C)=O", "C=C(C)O"], ["N=CO", "NC=O"]]
+    dmso = pd.read_csv(output_dir / "DMSO.csv")
+    assert dmso.values.tolist() == [["NC=O", "N=CO"]]
+    pd.testing.assert_frame_equal(pd.read_csv(output_file).sort_values("src"), water)
+
+    result = CliRunner().invoke(tautomers.main, ["-i", str(input_file)])
+    assert result.exit_code != 0
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_remove_atom_mapping_in_parallel(n_jobs: int) -> None:
+    smiles = ["[CH3:1][OH:2]", "C1=CC=CC=C1(", "[NH2:1][CH3:2]"] * 5
+
+    unmapped = tautomers.remove_atom_mapping_in_parallel(
+        smiles, n_jobs=n_jobs, chunk_size=4
+    )
+
+    assert unmapped == ["CO", None, "CN"] * 5
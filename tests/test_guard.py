@@ -0,0 +1,93 @@
+import os
+import time
+from multiprocessing import Pool
+
+import pytest
+
+from rxn_standardization import utils
+from rxn_standardization.guard import MoleculeGuard, count_atoms
+from rxn_standardization.utils import (
+    FailureReason,
+    canonicalize_many,
+    remove_stereochemistry_many,
+)
+
+
+def _slow_upper(smiles: str) -> str:
+    if smiles.startswith("slow"):
+        time.sleep(60)
+    if smiles.startswith("wait"):
+        time.sleep(1)
+    if smiles.startswith("crash"):
+        os._exit(1)
+    return smiles.upper()
+
+
+def test_count_atoms() -> None:
+    assert count_atoms("CCO") == 3
+    assert count_atoms("c1ccccc1Cl") == 7
+    assert count_atoms("[Na+].[Cl-]") == 2
+    assert count_atoms("C[C@H](Br)[nH]") == 4
+
+
+def test_is_pathological() -> None:
+    guard = MoleculeGuard(max_atoms=3, max_length=6)
+    assert not guard.is_pathological("CCO")
+    assert guard.is_pathological("C C C C")
+    assert guard.is_pathological("[Na+].[Cl-]")
+    assert not MoleculeGuard().enabled
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_run_with_timeouts(n_workers: int) -> None:
+    smiles = ["a", "slow1", "b", "crash", "c", "slow2", "d"]
+
+    with MoleculeGuard(max_atoms=0, timeout=0.5, n_workers=n_workers) as guard:
+        start = time.monotonic()
+        results = guard.run(_slow_upper, smiles)
+        assert time.monotonic() - start < 10
+
+    assert results == [
+        ("A", None),
+        ("slow1", FailureReason.TIMEOUT),
+        ("B", None),
+        ("crash", FailureReason.WORKER_CRASHED),
+        ("C", None),
+        ("slow2", FailureReason.TIMEOUT),
+        ("D", None),
+    ]
+    assert guard.n_routed == 7
+    assert guard.n_timeouts == 2
+    assert guard.n_crashes == 1
+
+
+def test_batch_functions_with_guard() -> None:
+    smiles = ["OCC", "C1=CC=CC=C1", "invalid", "C[C@H](N)O", "CC"] * 3
+
+    with MoleculeGuard(max_atoms=3) as guard, Pool(2) as pool:
+        result = canonicalize_many(smiles, pool=pool, chunk_size=2, guard=guard)
+        expected = canonicalize_many(smiles)
+        assert result.results == expected.results
+        assert result.reasons == expected.reasons
+        result = remove_stereochemistry_many(smiles, guard=guard)
+        assert result.results == ["CCO", "c1ccccc1", "invalid", "CC(N)O", "CC"] * 3
+    # "C1=CC=CC=C1" and "C[C@H](N)O", three times per call
+    assert guard.n_routed == 12
+
+
+def test_guard_runs_alongside_other_molecules(
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    # "waitlong" is routed to the guard, the other ones are processed in the
+    # current process; both take one second
+    monkeypatch.setattr(utils, "canonicalize_smiles", _slow_upper)
+    smiles = ["a", "waitlong", "wait", "b"]
+
+    with MoleculeGuard(max_length=4, timeout=30.0) as guard:
+        start = time.monotonic()
+        result = canonicalize_many(smiles, guard=guard)
+        elapsed = time.monotonic() - start
+
+    assert result.results == ["A", "WAITLONG", "WAIT", "B"]
+    assert guard.n_routed == 1
+    assert elapsed < 1.9
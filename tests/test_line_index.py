@@ -0,0 +1,74 @@
+import os
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+from rxn_standardization.line_index import (
+    LineIndexedFile,
+    build_line_index,
+    line_index_path,
+    load_line_index,
+    read_lines,
+)
+
+
+@pytest.mark.parametrize(
+    "content",
+    ["", "CCO\n", "CCO", "CCO\nc1ccccc1\n\nC(=O)O\n", "CCO\n\nC(=O)O", "\n\n"],
+)
+def test_lines_match_file(tmp_path: Path, content: str) -> None:
+    path = tmp_path / "smiles.txt"
+    path.write_text(content)
+    expected = content.splitlines()
+
+    # Small block size to check the offsets across blocks
+    index = build_line_index(path, block_size=3)
+    assert index[-1] == len(content)
+    assert len(index) == len(expected) + 1
+
+    with LineIndexedFile(path) as f:
+        assert len(f) == len(expected)
+        assert f.lines(0, len(f)) == expected
+        assert [f[i] for i in range(len(f))] == expected
+        assert f.lines(1, 3) == expected[1:3]
+        assert f.lines(5, 100) == expected[5:100]
+
+    for start, stop in [(0, len(expected)), (1, 3), (2, 2)]:
+        stop = min(stop, len(expected))
+        lines = read_lines(path, index[start : stop + 1])
+        assert lines == expected[start:stop]
+
+
+def test_negative_and_out_of_range_indices(tmp_path: Path) -> None:
+    path = tmp_path / "smiles.txt"
+    path.write_text("A\nB\nC\n")
+
+    with LineIndexedFile(path) as f:
+        assert f[-1] == "C"
+        with pytest.raises(IndexError):
+            _ = f[3]
+
+
+def test_index_is_cached_and_rebuilt(tmp_path: Path) -> None:
+    path = tmp_path / "smiles.txt"
+    path.write_text("CCO\nCCN\n")
+
+    index = load_line_index(path)
+    assert line_index_path(path).exists()
+    np.testing.assert_array_equal(np.load(line_index_path(path)), index)
+
+    # Modify the file; make sure the cache is older, as mtimes may be coarse
+    path.write_text("CCO\nCCN\nCCC\n")
+    os.utime(line_index_path(path), (0, 0))
+    with LineIndexedFile(path) as f:
+        assert f.lines(0, len(f)) == ["CCO", "CCN", "CCC"]
+
+
+def test_no_cache(tmp_path: Path) -> None:
+    path = tmp_path / "smiles.txt"
+    path.write_text("CCO\nCCN\n")
+
+    with LineIndexedFile(path, cache=False) as f:
+        assert len(f) == 2
+    assert not line_index_path(path).exists()
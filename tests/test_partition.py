@@ -0,0 +1,109 @@
+from multiprocessing import Pool
+from pathlib import Path
+from typing import List, Tuple
+
+import pandas as pd
+import pytest
+from rxn.utilities.files import PathLike
+
+from rxn_standardization.partition import (
+    Partition,
+    byte_range,
+    merge_partitions,
+    open_partition,
+    parse_partition,
+    partition_path,
+)
+from rxn_standardization.tables import iterate_table
+
+
+def _read_lines(
+    path: PathLike, partition: Partition, header: bool = False
+) -> List[str]:
+    with open_partition(path, partition, header=header) as f:
+        return f.read().splitlines()
+
+
+def _copy_partition(args: Tuple[str, Partition]) -> None:
+    path, partition = args
+    output_path = partition_path(Path(path).with_name("out.txt"), partition)
+    output_path.write_text(
+        "".join(f"{line}\n" for line in _read_lines(path, partition))
+    )
+
+
+def test_parse_partition() -> None:
+    assert parse_partition("0/4") == Partition(0, 4)
+    assert parse_partition(" 3 / 4 ") == Partition(3, 4)
+    for invalid in ["4/4", "-1/4", "1", "a/b"]:
+        with pytest.raises(ValueError):
+            parse_partition(invalid)
+
+
+@pytest.mark.parametrize("trailing_newline", [True, False])
+def test_partitions_cover_all_lines(tmp_path, trailing_newline: bool) -> None:
+    lines = [f"{'C' * (i % 7 + 1)}O" for i in range(50)] + ["", "CCN"]
+    path = tmp_path / "smiles.txt"
+    path.write_text("\n".join(lines) + ("\n" if trailing_newline else ""))
+
+    for n in [1, 2, 3, 7, 60, 1000]:
+        partitions = [Partition(k, n) for k in range(n)]
+        ranges = [byte_range(path, p) for p in partitions]
+        assert ranges[0][0] == 0
+        assert ranges[-1][1] == path.stat().st_size
+        assert all(r1[1] == r2[0] for r1, r2 in zip(ranges, ranges[1:]))
+
+        read = [line for p in partitions for line in _read_lines(path, p)]
+        assert read == lines
+
+
+def test_partitions_with_header(tmp_path) -> None:
+    df = pd.DataFrame({"src": [f"C{i}" for i in range(20)], "tgt": range(20)})
+    path = tmp_path / "data.csv"
+    df.to_csv(path, index=False)
+
+    chunks = [
+        chunk
+        for k in range(3)
+        for chunk in iterate_table(path, partition=Partition(k, 3), chunk_size=4)
+    ]
+
+    pd.testing.assert_frame_equal(pd.concat(chunks, ignore_index=True), df)
+
+
+def test_partition_path() -> None:
+    assert partition_path("a/out.csv", Partition(2, 8)) == Path("a/out.part-2-of-8.csv")
+    assert partition_path("out", Partition(0, 1)) == Path("out.part-0-of-1")
+
+
+def test_parallel_processes_and_merge(tmp_path) -> None:
+    lines = [f"line {i}" for i in range(1000)]
+    path = tmp_path / "in.txt"
+    path.write_text("\n".join(lines) + "\n")
+    n = 4
+
+    with Pool(n) as pool:
+        pool.map(_copy_partition, [(str(path), Partition(k, n)) for k in range(n)])
+    n_merged = merge_partitions(tmp_path / "out.txt", remove_parts=True)
+
+    assert n_merged == n
+    assert (tmp_path / "out.txt").read_text().splitlines() == lines
+    assert not list(tmp_path.glob("out.part-*"))
+
+
+def test_merge_csv_keeps_one_header(tmp_path) -> None:
+    for k in range(3):
+        pd.DataFrame({"src": [f"C{k}"], "tgt": [k]}).to_csv(
+            partition_path(tmp_path / "out.csv", Partition(k, 3)), index=False
+        )
+
+    merge_partitions(tmp_path / "out.csv")
+
+    assert (tmp_path / "out.csv").read_text() == "src,tgt\nC0,0\nC1,1\nC2,2\n"
+
+
+def test_merge_with_missing_part(tmp_path) -> None:
+    partition_path(tmp_path / "out.txt", Partition(0, 2)).write_text("a\n")
+
+    with pytest.raises(FileNotFoundError):
+        merge_partitions(tmp_path / "out.txt")
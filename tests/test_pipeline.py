@@ -0,0 +1,196 @@
+from multiprocessing.pool import Pool
+from pathlib import Path
+from typing import Iterator, Optional
+
+import pandas as pd
+import pytest
+
+from rxn_standardization.pipeline import (
+    Pipeline,
+    PubChemPairs,
+    RemoveStereo,
+    Source,
+    SplitSink,
+    TableSink,
+    TableSource,
+    Tokenize,
+    Transform,
+    TransformResult,
+    pipeline_from_config,
+)
+
+
+class _FailingTransform(Transform):
+    def transform(
+        self, chunk: pd.DataFrame, pool: Optional[Pool] = None
+    ) -> TransformResult:
+        if chunk.index[0] >= 4:
+            raise RuntimeError("failure in transform")
+        return TransformResult(chunk=chunk, rejects=[])
+
+
+class _EndlessSource(Source):
+    """Source recording whether its generator is closed before the stage."""
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.generator_closed = False
+        self.closed_in_order = False
+
+    def iterate(self) -> Iterator[pd.DataFrame]:
+        try:
+            n_rows = 0
+            while True:
+                yield pd.DataFrame(
+                    {"src": ["CCO", "CCN"]}, index=pd.RangeIndex(n_rows, n_rows + 2)
+                )
+                n_rows += 2
+        finally:
+            self.generator_closed = True
+
+    def close(self) -> None:
+        self.closed_in_order = self.generator_closed
+
+
+@pytest.fixture
+def input_csv(tmp_path: Path) -> Path:
+    path = tmp_path / "input.csv"
+    pd.DataFrame(
+        {
+            "src": ["C[C@H](N)O", "CCO", "C!", "F/C=C/F", "c1ccccc1", "CCN"] * 3,
+            "tgt": ["CC(N)O", "CCO", "C", "FC=CF", "c1ccccc1", "CCN"] * 3,
+        }
+    ).to_csv(path, index=False)
+    return path
+
+
+@pytest.mark.parametrize("processes", [0, 2])
+def test_pipeline_output(tmp_path: Path, input_csv: Path, processes: int) -> None:
+    output_csv = tmp_path / "output.csv"
+    rejects_csv = tmp_path / "rejects.csv"
+    pipeline = Pipeline(
+        [
+            TableSource(str(input_csv), chunk_size=4),
+            RemoveStereo(processes=processes),
+            Tokenize(processes=processes),
+            TableSink(str(output_csv)),
+        ],
+        queue_size=1,
+        rejects_file=rejects_csv,
+    )
+    stats = pipeline.run()
+
+    # The rows with "C!" cannot be tokenized, and are dropped
+    expected = pd.DataFrame(
+        {
+            "src": ["C C ( N ) O", "C C O", "F C = C F", "c 1 c c c c c 1", "C C N"]
+            * 3,
+            "tgt": ["C C ( N ) O", "C C O", "F C = C F", "c 1 c c c c c 1", "C C N"]
+            * 3,
+        }
+    )
+    pd.testing.assert_frame_equal(pd.read_csv(output_csv), expected)
+    assert [s.rows_out for s in stats] == [18, 18, 15, 15]
+    assert [s.chunks for s in stats] == [5, 5, 5, 5]
+
+    # Rejected once by each transform
+    rejects = pd.read_csv(rejects_csv)
+    assert sorted(rejects["row"]) == [2, 2, 8, 8, 14, 14]
+    assert set(rejects["reason"]) == {"invalid_smiles", "tokenization_error"}
+
+
+def test_split_sink(tmp_path: Path, input_csv: Path) -> None:
+    save_dir = tmp_path / "data"
+    Pipeline(
+        [
+            TableSource(str(input_csv)),
+            SplitSink(str(save_dir), train_frac=0.5, prepend_token="[PUBCHEM]"),
+        ]
+    ).run()
+
+    src = []
+    for split in ["train", "valid", "test"]:
+        split_src = (save_dir / f"src-{split}.txt").read_text().splitlines()
+        split_tgt = (save_dir / f"tgt-{split}.txt").read_text().splitlines()
+        assert len(split_src) == len(split_tgt)
+        src.extend(split_src)
+    assert len(src) == 18
+    assert all(smi.startswith("[PUBCHEM] ") for smi in src)
+
+
+def test_failing_stage_stops_pipeline(tmp_path: Path, input_csv: Path) -> None:
+    pipeline = Pipeline(
+        [
+            TableSource(str(input_csv), chunk_size=2),
+            _FailingTransform(),
+            Tokenize(processes=2),
+            TableSink(str(tmp_path / "output.csv")),
+        ],
+        queue_size=1,
+    )
+    with pytest.raises(RuntimeError, match="failure in transform"):
+        pipeline.run()
+
+
+def test_failing_stage_closes_source(tmp_path: Path) -> None:
+    source = _EndlessSource()
+    pipeline = Pipeline(
+        [source, _FailingTransform(), TableSink(str(tmp_path / "output.csv"))],
+        queue_size=1,
+    )
+    with pytest.raises(RuntimeError, match="failure in transform"):
+        pipeline.run()
+    assert source.closed_in_order
+
+
+def test_pipeline_from_config(tmp_path: Path, input_csv: Path) -> None:
+    pipeline = pipeline_from_config(
+        {
+            "queue_size": 3,
+            "stages": [
+                {"type": "read_table", "input_file": str(input_csv)},
+                {"type": "tokenize", "name": "tok", "processes": 2},
+                {"type": "write_table", "output_file": str(tmp_path / "out.csv")},
+            ],
+        }
+    )
+    assert [stage.name for stage in pipeline.stages] == [
+        "read_table",
+        "tok",
+        "write_table",
+    ]
+    assert pipeline.queue_size == 3
+
+    with pytest.raises(ValueError, match="Invalid type"):
+        pipeline_from_config({"stages": [{"type": "unknown"}]})
+    with pytest.raises(ValueError, match="Invalid settings"):
+        pipeline_from_config({"stages": [{"type": "tokenize", "typo": 1}]})
+    with pytest.raises(ValueError, match="not a source"):
+        pipeline_from_config(
+            {"stages": [{"type": "tokenize"}, {"type": "split", "save_dir": "."}]}
+        )
+
+
+def test_pubchem_pairs_keep_the_highest_sid(tmp_path: Path) -> None:
+    sid_map_file = tmp_path / "SID-Map"
+    sid_map_file.write_text("1\tx\tx\t10\n2\tx\tx\t20\n3\tx\tx\t30\n4\tx\tx\t40\n")
+    cid_smiles_file = tmp_path / "CID-SMILES"
+    cid_smiles_file.write_text("10\tCCO\n20\tCCN\n30\tOCC\n40\tC\n")
+    input_csv = tmp_path / "sid_smiles.csv"
+    # The duplicate of "OCC" (SID 3) is in a later chunk than SID 1
+    pd.DataFrame({"sid": [1, 2, 3, 4], "smiles": ["OCC", "NCC", "OCC", "C"]}).to_csv(
+        input_csv, index=False
+    )
+    output_csv = tmp_path / "output.csv"
+
+    Pipeline(
+        [
+            TableSource(str(input_csv), chunk_size=2),
+            PubChemPairs(str(sid_map_file), str(cid_smiles_file), chunk_size=2),
+            TableSink(str(output_csv)),
+        ]
+    ).run()
+
+    output = pd.read_csv(output_csv)
+    assert output["src"].tolist() == ["NCC", "OCC", "C"]
+    assert output["tgt"].tolist() == ["CCN", "OCC", "C"]
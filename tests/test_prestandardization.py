@@ -0,0 +1,127 @@
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from rxn_standardization.prestandardization import (
+    AROMATIC_TAUTOMERS,
+    MOLECULE_CLASSES,
+    NEUTRALIZE,
+    PreStandardizer,
+)
+from rxn_standardization.scripts import prestandardize
+
+
+def test_standardize_resolved() -> None:
+    standardizer = PreStandardizer()
+
+    # Salt and solvent stripping, neutralization, stereo removal
+    assert standardizer.standardize("CC[O-].[Na+]") == "CCO"
+    assert standardizer.standardize("CCC(=O)O.O.CS(C)=O") == "CCC(=O)O"
+    assert standardizer.standardize("C[C@H](N)O") == "CC(N)O"
+    # Tokenized input
+    assert standardizer.standardize("C C [ O - ] . [ Na + ]") == "CCO"
+
+
+def test_standardize_left_for_model() -> None:
+    standardizer = PreStandardizer()
+
+    # Invalid SMILES
+    assert standardizer.standardize("CC(") is None
+    # Metals
+    assert standardizer.standardize("CC(=O)O[Zn]OC(C)=O") is None
+    # "~" bonds
+    assert standardizer.standardize("CC(C)(C)[Zn+]~[Br-]") is None
+    # Several fragments that are not salts or solvents
+    assert standardizer.standardize("CCCCCC.c1ccc2ccccc2c1") is None
+    # Charges that cannot be neutralized
+    assert standardizer.standardize("C[N+](C)(C)C") is None
+
+
+def test_tautomers_left_for_model() -> None:
+    standardizer = PreStandardizer()
+
+    # Neutral organic molecules whose standard form is a choice of tautomer
+    assert standardizer.standardize("Oc1ccccn1") is None
+    assert standardizer.standardize("O=c1cccc[nH]1") is None
+    assert standardizer.standardize("C=C(O)C") is None
+    # Tautomers of non-aromatic atoms, given as their canonical tautomer
+    assert standardizer.standardize("CC(C)=O") == "CC(C)=O"
+    assert standardizer.standardize("CC(=O)Nc1ccccc1") == "CC(=O)Nc1ccccc1"
+
+
+def test_configurable_resolved_classes() -> None:
+    standardizer = PreStandardizer(resolved_classes=MOLECULE_CLASSES)
+
+    assert standardizer.standardize("O=c1cccc[nH]1") == "O=c1cccc[nH]1"
+    # Not the canonical tautomer
+    assert standardizer.standardize("Oc1ccccn1") is None
+    assert standardizer.standardize("C=C(O)C") is None
+
+    standardizer = PreStandardizer(resolved_classes=[AROMATIC_TAUTOMERS])
+    assert standardizer.standardize("CCO") is None
+
+    with pytest.raises(ValueError):
+        PreStandardizer(resolved_classes=["unknown"])
+
+
+def test_configurable_rules() -> None:
+    standardizer = PreStandardizer(rules=[NEUTRALIZE])
+
+    assert standardizer.standardize("C[C@H](N)O") == "C[C@H](N)O"
+    assert standardizer.standardize("CC[O-]") == "CCO"
+    # No salt stripping: several fragments are accepted
+    assert standardizer.standardize("CC(=O)O.O") == "CC(=O)O.O"
+
+    with pytest.raises(ValueError):
+        PreStandardizer(rules=["unknown"])
+
+
+def test_standardize_many() -> None:
+    result = PreStandardizer().standardize_many(["CC[O-].[Na+]", "[Pd]", "CCN"])
+
+    assert result.smiles == ["CCO", None, "CCN"]
+    assert result.n_resolved == 2
+    assert result.n_for_model == 1
+
+
+def test_merge_checks_number_of_predictions(tmp_path: Path) -> None:
+    routed_file = tmp_path / "routed.txt"
+    routed_file.write_text("CCO\n\nCCN\n\n")
+    pred_file = tmp_path / "pred.txt"
+    output_file = tmp_path / "out.txt"
+    args = [
+        "merge",
+        "-r",
+        str(routed_file),
+        "-p",
+        str(pred_file),
+        "-o",
+        str(output_file),
+    ]
+
+    pred_file.write_text("C C C\nC C C C\nC O\nC O C\n")
+    result = CliRunner().invoke(prestandardize.main, args)
+    assert result.exit_code == 0, result.output
+    assert output_file.read_text().split() == ["CCO", "CCC", "CCN", "CO"]
+
+    for predictions in ["C C C\n", "C C C\nC O\nC C\n", ""]:
+        pred_file.write_text(predictions)
+        result = CliRunner().invoke(prestandardize.main, args)
+        assert isinstance(result.exception, ValueError)
+
+
+def test_route_sends_tautomers_to_model(tmp_path: Path) -> None:
+    input_file = tmp_path / "smiles.txt"
+    input_file.write_text("CC[O-].[Na+]\nOc1ccccn1\nCCN\n")
+    routed_file = tmp_path / "routed.txt"
+    model_input_file = tmp_path / "model_input.txt"
+    args = ["route", "-i", str(input_file), "-o", str(routed_file)]
+
+    result = CliRunner().invoke(
+        prestandardize.main, [*args, "-m", str(model_input_file)]
+    )
+
+    assert result.exit_code == 0, result.output
+    assert routed_file.read_text().split("\n") == ["CCO", "", "CCN", ""]
+    assert model_input_file.read_text() == "O c 1 c c c c n 1\n"
@@ -0,0 +1,37 @@
+import gzip
+import logging
+
+from rxn_standardization.rejects import RejectsRecorder
+from rxn_standardization.utils import canonicalize_many, tokenize_many
+
+
+def test_record_batch_to_sidecar(tmp_path) -> None:
+    sidecar = tmp_path / "rejects.csv.gz"
+
+    with RejectsRecorder(sidecar) as rejects:
+        result = canonicalize_many(["CCO", "invalid", "C1CC"])
+        rejects.record_batch(result, column="tgt", rows=[10, 11, 12])
+        result = tokenize_many(["C%%C"])
+        rejects.record_batch(result, column="src")
+
+    assert rejects.total == 3
+    assert rejects.count(reason="invalid_smiles") == 2
+    assert rejects.count(column="src") == 1
+    with gzip.open(sidecar, "rt") as f:
+        assert f.read().splitlines() == [
+            "row,column,reason,value",
+            "11,tgt,invalid_smiles,invalid",
+            "12,tgt,invalid_smiles,C1CC",
+            "0,src,tokenization_error,C%%C",
+        ]
+
+
+def test_warnings_are_sampled(caplog) -> None:
+    rejects = RejectsRecorder(n_samples=2, warning_interval=3600)
+
+    with caplog.at_level(logging.WARNING):
+        for i in range(100):
+            rejects.record(i, "src", "invalid_smiles", "X")
+
+    assert rejects.total == 100
+    assert len(caplog.records) == 2
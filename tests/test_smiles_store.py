@@ -0,0 +1,122 @@
+import multiprocessing
+import os
+import time
+from multiprocessing import Pool
+from typing import List
+
+import numpy as np
+import pytest
+
+from rxn_standardization.smiles_store import (
+    OutputHandle,
+    OutputStore,
+    SmilesStore,
+    StoreHandle,
+    WrittenOutput,
+    read_strings,
+    write_output,
+)
+
+SMILES = ["CCO", "", "c1ccccc1", "[Na+].[Cl-]", "CΩ", "F/C=C/F"]
+
+
+@pytest.mark.parametrize("shared", [True, False])
+def test_smiles_store(shared: bool) -> None:
+    with SmilesStore.from_strings(SMILES, shared=shared) as store:
+        assert store.shared == shared
+        assert len(store) == 6
+        assert store.slice(0, 6) == SMILES
+        assert store.slice(2, 5) == SMILES[2:5]
+        assert store.slice(4, 10) == SMILES[4:]
+        assert store.slice(3, 3) == []
+        assert store[4] == "CΩ"
+        assert store[-1] == "F/C=C/F"
+        with pytest.raises(IndexError):
+            store[6]
+
+        assert read_strings(store.handle()) == SMILES
+        assert read_strings(store.handle(1, 4)) == SMILES[1:4]
+        assert read_strings(store.handle(5, 100)) == SMILES[5:]
+        assert read_strings(store.handle(2, 2)) == []
+
+
+def test_empty_store() -> None:
+    with SmilesStore.from_strings([]) as store:
+        assert len(store) == 0
+        assert read_strings(store.handle()) == []
+
+
+def test_invalid_items() -> None:
+    with pytest.raises(ValueError):
+        SmilesStore.from_strings(["CC", "C\nC"])
+    with pytest.raises(TypeError):
+        SmilesStore.from_strings(["CC", None])  # type: ignore[list-item]
+
+
+def _read_range(handle: StoreHandle) -> str:
+    return ".".join(read_strings(handle))
+
+
+def test_read_in_workers() -> None:
+    smiles = [f"C{'C' * i}O" for i in range(100)]
+    with SmilesStore.from_strings(smiles) as store, Pool(2) as pool:
+        handles = [store.handle(start, start + 7) for start in range(0, 100, 7)]
+        joined = pool.map(_read_range, handles)
+    assert ".".join(joined) == ".".join(smiles)
+
+
+@pytest.mark.skipif(not os.path.isdir("/dev/shm"), reason="POSIX shared memory")
+def test_workers_do_not_release_the_store() -> None:
+    smiles = [f"C{'C' * i}O" for i in range(100)]
+    # Workers forked before any segment exists have resource trackers of their
+    # own, which must not unlink the segments of the parent when they exit
+    pool = multiprocessing.get_context("fork").Pool(2)
+    with SmilesStore.from_strings(smiles) as store:
+        with pool:
+            handles = [store.handle(start, start + 7) for start in range(0, 100, 7)]
+            pool.map(_read_range, handles)
+        pool.join()
+        time.sleep(0.5)
+        assert read_strings(store.handle()) == smiles
+
+
+def _upper_range(handle: StoreHandle, output: OutputHandle) -> WrittenOutput:
+    smiles = read_strings(handle)
+    codes = np.array([len(smi) % 3 for smi in smiles], dtype=np.uint8)
+    return write_output(output, [smi.upper() for smi in smiles], codes)
+
+
+@pytest.mark.parametrize("shared", [True, False])
+def test_output_store_in_workers(shared: bool) -> None:
+    smiles = [f"c{'c' * (i % 7)}o" for i in range(100)]
+    ranges = [(start, min(start + 7, 100)) for start in range(0, 100, 7)]
+    # The last ranges have no room: their results are sent back
+    capacities = [40] * 10 + [0] * 5
+
+    results: List[str] = []
+    codes = []
+    with SmilesStore.from_strings(smiles) as store, OutputStore(
+        100, ranges, capacities, shared=shared
+    ) as output, Pool(2) as pool:
+        assert output.shared == shared
+        handles = [store.handle(start, stop) for start, stop in ranges]
+        written = pool.starmap(_upper_range, zip(handles, output.handles()))
+        for handle, w in zip(output.handles(), written):
+            assert (w.data is None) == (shared and w.n_bytes <= handle.capacity)
+            chunk_results, chunk_codes = output.read(handle, w)
+            results.extend(chunk_results)
+            codes.extend(chunk_codes.tolist())
+
+    assert results == [smi.upper() for smi in smiles]
+    assert codes == [len(smi) % 3 for smi in smiles]
+
+
+def test_output_store_invalid_results() -> None:
+    with OutputStore(2, [(0, 2)], [100]) as output:
+        handle = output.handles()[0]
+        with pytest.raises(ValueError):
+            write_output(handle, ["C\nC", "C"], np.zeros(2, dtype=np.uint8))
+        written = write_output(handle, ["", "CC"], np.array([1, 0], dtype=np.uint8))
+        results, codes = output.read(handle, written)
+    assert results == ["", "CC"]
+    assert codes.tolist() == [1, 0]
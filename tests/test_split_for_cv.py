@@ -0,0 +1,23 @@
+import pytest
+from click.testing import CliRunner
+
+from rxn_standardization.scripts.split_for_cv import main
+
+
+@pytest.mark.parametrize("header", ["src,tgt", "smiles,standardized"])
+def test_split_for_cv_takes_the_first_two_columns_by_default(
+    tmp_path, header: str
+) -> None:
+    input_file = tmp_path / "pairs.csv"
+    rows = [f"{'C' * n}O,{'C' * n}O" for n in range(1, 13)]
+    input_file.write_text("\n".join([header, *rows]) + "\n")
+
+    result = CliRunner().invoke(
+        main,
+        ["-i", str(input_file), "-s", str(tmp_path / "split"), "-t", "2"],
+    )
+
+    assert result.exit_code == 0, result.output
+    src_test = (tmp_path / "split-0" / "src-test.txt").read_text().splitlines()
+    assert len(src_test) == 2
+    assert all(line.endswith("O") for line in src_test)
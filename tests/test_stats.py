@@ -0,0 +1,110 @@
+import json
+from pathlib import Path
+
+import numpy as np
+import pytest
+from click.testing import CliRunner
+
+from rxn_standardization.scripts.stats import main
+from rxn_standardization.stats import (
+    CountMinSketch,
+    DatasetStats,
+    HyperLogLog,
+    compute_stats,
+    count_elements_and_charges,
+)
+
+SRC = [
+    "[PUBCHEM] C C ( = O ) [O-] . [ Na + ]",
+    "[PUBCHEM] C [C@H] ( N ) O",
+    "[PUBCHEM] c 1 c c [nH] c 1",
+    "[PUBCHEM] [NH4+] . [ Cl - ]",
+]
+TGT = ["C C ( = O ) O", "C C ( N ) O", "c 1 c c [nH] c 1", "N"]
+
+
+@pytest.fixture
+def files(tmp_path: Path) -> dict:
+    src_file, tgt_file = tmp_path / "src.txt", tmp_path / "tgt.txt"
+    src_file.write_text("\n".join(SRC * 25) + "\n")
+    tgt_file.write_text("\n".join(TGT * 25) + "\n")
+    return {"src": src_file, "tgt": tgt_file}
+
+
+def test_count_elements_and_charges() -> None:
+    elements, charges = count_elements_and_charges(SRC[0].split()[1:])
+    assert elements == {"C": 2, "O": 2, "Na": 1}
+    assert charges == {"-": 1, "+": 1}
+
+    elements, charges = count_elements_and_charges("[NH4+] . [ Cl - ]".split())
+    assert elements == {"N": 1, "Cl": 1}
+    assert charges == {"+": 1, "-": 1}
+
+    elements, _ = count_elements_and_charges("c 1 c c [nH] c 1".split())
+    assert elements == {"C": 4, "N": 1}
+
+
+def test_hyperloglog() -> None:
+    hll = HyperLogLog(precision=12)
+    hll.add(str(i) for i in range(20000))
+    hll.add(str(i) for i in range(10000))
+    assert hll.estimate() == pytest.approx(20000, rel=0.05)
+
+    small = HyperLogLog()
+    small.add(["a", "b", "c", "a"])
+    assert round(small.estimate()) == 3
+
+    with pytest.raises(ValueError):
+        hll.merge(small)
+
+
+def test_count_min_sketch_merge() -> None:
+    a, b, single = (
+        CountMinSketch(top_k=2),
+        CountMinSketch(top_k=2),
+        CountMinSketch(top_k=2),
+    )
+    a.add_counts({"C": 10, "O": 3, "N": 1})
+    b.add_counts({"O": 9, "Cl": 2})
+    single.add_counts({"C": 10, "O": 3, "N": 1})
+    single.add_counts({"O": 9, "Cl": 2})
+    a.merge(b)
+    np.testing.assert_array_equal(a.table, single.table)
+    assert a.top() == [("O", 12), ("C", 10)]
+
+
+def test_partial_stats_merge_exactly(files: dict) -> None:
+    single = compute_stats(files, prepend_token="[PUBCHEM]")
+    merged = DatasetStats()
+    for start, stop in [(0, 33), (33, 60), (60, 100)]:
+        part = compute_stats(
+            files, start=start, stop=stop, chunk_size=7, prepend_token="[PUBCHEM]"
+        )
+        merged.merge(DatasetStats.from_dict(json.loads(json.dumps(part.to_dict()))))
+    assert merged.to_dict() == single.to_dict()
+
+    summary = single.summary()
+    assert summary["n_pairs"] == 100
+    assert summary["modified_fraction"] == pytest.approx(0.75)
+    assert summary["src"]["unique_smiles"] == 4
+    assert summary["tgt"]["unique_smiles"] == 4
+    assert summary["src"]["elements"]["Na"] == 25
+    assert summary["src"]["charges"] == {"-": 50, "+": 50}
+    assert summary["tgt"]["token_length"]["max"] == 7
+
+
+def test_compute_and_merge_commands(files: dict, tmp_path: Path) -> None:
+    runner = CliRunner()
+    output = tmp_path / "stats.json"
+    args = ["-s", str(files["src"]), "-t", str(files["tgt"]), "-o", str(output)]
+    for k in range(3):
+        result = runner.invoke(main, ["compute", *args, "--partition", f"{k}/3"])
+        assert result.exit_code == 0, result.output
+    parts = [str(tmp_path / f"stats.part-{k}-of-3.json") for k in range(3)]
+    result = runner.invoke(main, ["merge", *parts, "-o", str(output)])
+    assert result.exit_code == 0, result.output
+
+    merged = json.loads(output.read_text())
+    single = compute_stats(files)
+    assert merged["sketches"] == single.to_dict()
+    assert merged["summary"]["n_pairs"] == 100
@@ -0,0 +1,79 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from rxn_standardization.substance_index import (
+    build_substance_index,
+    diff_substance_indices,
+    load_index_options,
+    load_substance_index,
+    merge_delta,
+    save_substance_index,
+    unique_src,
+)
+
+
+def test_build_substance_index() -> None:
+    index = build_substance_index(
+        [3, 1, 2], [30, 10, 20], ["C", "O", "N"], ["C", "O", "N"]
+    )
+    np.testing.assert_array_equal(index.sid, [1, 2, 3])
+    np.testing.assert_array_equal(index.cid, [10, 20, 30])
+    assert index.src_hash[0] == index.tgt_hash[0]
+    assert len(index) == 3
+
+    with pytest.raises(ValueError):
+        build_substance_index([1, 1], [1, 2], ["C", "O"], ["C", "O"])
+
+
+def test_unique_src() -> None:
+    index = build_substance_index(
+        [1, 2, 3, 4], [1, 2, 3, 4], ["C", "O", "C", "N"], ["C", "O", "C", "N"]
+    )
+    np.testing.assert_array_equal(unique_src(index).sid, [2, 3, 4])
+
+
+def test_diff_substance_indices() -> None:
+    previous = build_substance_index(
+        [1, 2, 3, 4], [1, 2, 3, 4], ["C", "O", "N", "S"], ["C", "O", "N", "S"]
+    )
+    current = build_substance_index(
+        [1, 2, 4, 5], [1, 7, 4, 5], ["C", "O", "[S]", "P"], ["C", "O", "S", "P"]
+    )
+    diff = diff_substance_indices(previous, current)
+    np.testing.assert_array_equal(diff.added, [5])
+    np.testing.assert_array_equal(diff.changed, [2, 4])
+    np.testing.assert_array_equal(diff.removed, [3])
+    np.testing.assert_array_equal(diff.unchanged, [1])
+    np.testing.assert_array_equal(diff.to_process, [2, 4, 5])
+
+
+def test_save_and_load(tmp_path: Path) -> None:
+    index = build_substance_index([2, 1], [20, 10], ["N", "C"], ["N", "C"])
+    path = tmp_path / "index.npz"
+    save_substance_index(index, path, options={"fast_stereo_removal": True})
+    loaded = load_substance_index(path)
+    for expected, actual in zip(index, loaded):
+        np.testing.assert_array_equal(expected, actual)
+    assert load_index_options(path) == {"fast_stereo_removal": True}
+    assert not Path(f"{path}.tmp").exists()
+
+
+def test_merge_delta() -> None:
+    previous = pd.DataFrame(
+        {"sid": [1, 2, 3], "src": ["C", "O", "N"], "tgt": ["C", "O", "N"]}
+    )
+    delta = pd.DataFrame({"sid": [5, 2], "src": ["P", "O"], "tgt": ["P", "[OH2]"]})
+    diff = diff_substance_indices(
+        build_substance_index([1, 2, 3], [1, 2, 3], ["C", "O", "N"], ["C", "O", "N"]),
+        build_substance_index(
+            [1, 2, 5], [1, 2, 5], ["C", "O", "P"], ["C", "[OH2]", "P"]
+        ),
+    )
+    merged = merge_delta(previous, delta, diff)
+    expected = pd.DataFrame(
+        {"sid": [1, 2, 5], "src": ["C", "O", "P"], "tgt": ["C", "[OH2]", "P"]}
+    )
+    pd.testing.assert_frame_equal(merged, expected)
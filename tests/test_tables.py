@@ -0,0 +1,72 @@
+import pandas as pd
+import pytest
+
+from rxn_standardization.tables import (
+    TableWriter,
+    iterate_table,
+    read_table,
+    save_src_tgt,
+    table_format,
+    write_table,
+)
+
+
+def test_table_format() -> None:
+    assert table_format("data.csv") == "csv"
+    assert table_format("data.txt") == "csv"
+    assert table_format("data.parquet") == "parquet"
+    assert table_format("data.PQ") == "parquet"
+    assert table_format("data.arrow") == "arrow"
+    assert table_format("data.feather") == "arrow"
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet", ".arrow"])
+def test_write_and_read_table(tmp_path, suffix: str) -> None:
+    pytest.importorskip("pyarrow")
+    df = pd.DataFrame({"src": ["CCO", "C(=O)O"], "tgt": ["OCC", "OC=O"], "sid": [3, 4]})
+    path = tmp_path / f"table{suffix}"
+
+    write_table(df, path)
+
+    pd.testing.assert_frame_equal(read_table(path), df)
+    pd.testing.assert_frame_equal(
+        read_table(path, columns=["src", "tgt"]), df[["src", "tgt"]]
+    )
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet", ".arrow"])
+def test_table_writer_chunks(tmp_path, suffix: str) -> None:
+    pytest.importorskip("pyarrow")
+    chunks = [
+        pd.DataFrame({"src": ["C", "CC"], "tgt": ["C", "CC"]}),
+        pd.DataFrame({"src": ["CCC"], "tgt": ["CCC"]}),
+    ]
+    path = tmp_path / f"table{suffix}"
+
+    with TableWriter(path) as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+
+    read_chunks = list(iterate_table(path, columns=["src"], chunk_size=2))
+    assert [len(chunk) for chunk in read_chunks] == [2, 1]
+    assert pd.concat(read_chunks)["src"].tolist() == ["C", "CC", "CCC"]
+
+
+def test_save_src_tgt(tmp_path) -> None:
+    save_src_tgt(["C C", "O"], ["C", "O"], tmp_path, "train")
+
+    assert (tmp_path / "src-train.txt").read_text() == "C C\nO\n"
+    assert (tmp_path / "tgt-train.txt").read_text() == "C\nO\n"
+
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet", ".arrow"])
+def test_table_writer_without_rows(tmp_path, suffix: str) -> None:
+    pytest.importorskip("pyarrow")
+    path = tmp_path / f"table{suffix}"
+
+    with TableWriter(path, columns=["src", "tgt"]):
+        pass
+
+    df = read_table(path)
+    assert df.columns.tolist() == ["src", "tgt"]
+    assert len(df) == 0
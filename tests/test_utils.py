@@ -1,7 +1,21 @@
+from multiprocessing import Pool
+
+import numpy as np
+
 from rxn_standardization.utils import (
+    FailureReason,
+    StereoRemovalTier,
+    canonicalize,
+    canonicalize_many,
     process_input,
     process_token,
     remove_stereochemistry,
+    remove_stereochemistry_fast,
+    remove_stereochemistry_many,
+    stable_hash,
+    stereo_removal_tier,
+    tokenize_many,
+    validate_stereochemistry_removal,
 )
 
 
@@ -49,3 +63,109 @@ def test_remove_stereochemistry() -> None:
 
     for smi, exp in zip(smiles, expected):
         assert remove_stereochemistry(smi) == exp
+
+
+def test_canonicalize_many() -> None:
+    smiles = ["OCC", "C1=CC=CC=C1", "invalid", "C(C)(C)(C)(C)C"]
+
+    result = canonicalize_many(smiles)
+
+    assert result.results == ["CCO", "c1ccccc1", "invalid", "C(C)(C)(C)(C)C"]
+    assert result.failed.tolist() == [False, False, True, True]
+    assert result.reasons == [
+        None,
+        None,
+        FailureReason.INVALID_SMILES,
+        FailureReason.INVALID_SMILES,
+    ]
+
+
+def test_remove_stereochemistry_many_with_pool() -> None:
+    smiles = (smi for smi in ["C [C@H] ( N ) O", "F/C=C/F", "C1CC", "CC[C@@H](C)O"] * 5)
+
+    with Pool(2) as pool:
+        result = remove_stereochemistry_many(smiles, pool=pool, chunk_size=3)
+
+    assert result.results == ["CC(N)O", "FC=CF", "C1CC", "CCC(C)O"] * 5
+    assert result.failed.tolist() == [False, False, True, False] * 5
+
+
+def test_remove_stereochemistry_fast() -> None:
+    # SMILES, tier, result without canonicalization
+    cases = [
+        ("OCC", StereoRemovalTier.STEREO_FREE, "OCC"),
+        ("C [C@@H] ( N ) O", StereoRemovalTier.TOKEN_LEVEL, "CC(N)O"),
+        ("N[C@@H](C)C(=O)O", StereoRemovalTier.TOKEN_LEVEL, "NC(C)C(=O)O"),
+        ("C/C=C\\C", StereoRemovalTier.TOKEN_LEVEL, "CC=CC"),
+        ("C/1=C/CCCCCC1", StereoRemovalTier.TOKEN_LEVEL, "C1=CCCCCCC1"),
+        # Directional bonds next to aromatic atoms, other chiral atoms
+        ("F/C=C/c1ccccc1", StereoRemovalTier.RDKIT, "FC=Cc1ccccc1"),
+        ("C[N@+](F)(Cl)Br", StereoRemovalTier.RDKIT, "C[N+](F)(Cl)Br"),
+        ("[13CH3][C@H](O)Cl", StereoRemovalTier.TOKEN_LEVEL, "[13CH3]C(O)Cl"),
+        ("C[13C@H](O)Cl", StereoRemovalTier.RDKIT, "C[13CH](O)Cl"),
+        # Chiral carbons with implicit hydrogens once stereo-free
+        ("[C@H](F)Cl", StereoRemovalTier.TOKEN_LEVEL, "[CH](F)Cl"),
+        ("C[C@](F)Cl", StereoRemovalTier.TOKEN_LEVEL, "C[C](F)Cl"),
+        ("C[C@@]1(F)CC1", StereoRemovalTier.TOKEN_LEVEL, "CC1(F)CC1"),
+        ("C[C@H]1CC1.F", StereoRemovalTier.TOKEN_LEVEL, "CC1CC1.F"),
+        ("C=[C@](F)Cl", StereoRemovalTier.TOKEN_LEVEL, "C=[C](F)Cl"),
+    ]
+
+    for smi, tier, expected in cases:
+        assert stereo_removal_tier(smi) == tier
+        assert remove_stereochemistry_fast(smi, canonical=False) == expected
+        # Canonical results are identical to the RDKit path
+        assert remove_stereochemistry_fast(smi) == remove_stereochemistry(smi)
+        assert canonicalize(expected) == remove_stereochemistry(smi)
+
+
+def test_remove_stereochemistry_many_fast() -> None:
+    smiles = ["C [C@H] ( N ) O", "F/C=C/F", "C1CC", "OCC"]
+
+    result = remove_stereochemistry_many(smiles, fast=True)
+    assert result.results == ["CC(N)O", "FC=CF", "C1CC", "CCO"]
+    assert result.failed.tolist() == [False, False, True, False]
+
+    # Without canonicalization, stereo-free SMILES are not validated
+    result = remove_stereochemistry_many(smiles, fast=True, canonical=False)
+    assert result.results == ["CC(N)O", "FC=CF", "C1CC", "OCC"]
+    assert result.failed.tolist() == [False, False, False, False]
+
+
+def test_validate_stereochemistry_removal() -> None:
+    smiles = ["C[C@H](N)O", "F/C=C/F", "C(", "CCO", "C[C@@](F)(Cl)Br"] * 10
+
+    report = validate_stereochemistry_removal(smiles, sample_size=20)
+
+    assert report.n_checked == 20
+    assert sum(report.tier_counts.values()) == 20
+    assert report.mismatches == []
+
+
+def test_tokenize_many() -> None:
+    result = tokenize_many(["CC[O-].[Na+]", "C%%C", "ClC"])
+
+    assert result.results == ["C C [ O - ] . [ Na + ]", "C%%C", "Cl C"]
+    assert result.failed.tolist() == [False, True, False]
+    assert result.reasons == [None, FailureReason.TOKENIZATION_ERROR, None]
+
+
+def test_canonicalize_many_with_pool_and_non_strings() -> None:
+    # Items that are not strings cannot go through the shared-memory store
+    smiles = ["OCC", float("nan"), "invalid"]
+
+    with Pool(2) as pool:
+        result = canonicalize_many(smiles, pool=pool, chunk_size=2)  # type: ignore[arg-type]
+
+    assert result.results[0] == "CCO"
+    assert result.reasons == [
+        None,
+        FailureReason.TYPE_ERROR,
+        FailureReason.INVALID_SMILES,
+    ]
+
+
+def test_stable_hash() -> None:
+    hashes = stable_hash(["C", "CC", "C"])
+    assert hashes.dtype == np.uint64
+    assert hashes[0] == hashes[2] != hashes[1]